@@ -0,0 +1,103 @@
+// SPDX-License-Identifier: MIT
+pragma solidity 0.8.18;
+
+import {RLPReader} from "hamdiallam/Solidity-RLP@2.0.7/contracts/RLPReader.sol";
+import {MerklePatriciaProofVerifier} from "../libs/MerklePatriciaProofVerifier.sol";
+import {ReceiptProofVerifier} from "../libs/ReceiptProofVerifier.sol";
+import {StateProofVerifier} from "../libs/StateProofVerifier.sol";
+
+/// @title Proof Verifier Harness
+/// @notice Exposes the proof verification libraries together with the gas each
+///     verification used, for `scripts/fuzz_verifiers.py`. Not meant to be deployed
+///     outside of a local network.
+contract ProofVerifierHarness {
+    using RLPReader for bytes;
+    using RLPReader for RLPReader.RLPItem;
+
+    uint8 constant KIND_VALUE = 0; // MerklePatriciaProofVerifier.extractProofValue
+    uint8 constant KIND_ACCOUNT = 1; // StateProofVerifier.extractAccountFromProof
+    uint8 constant KIND_SLOT = 2; // StateProofVerifier.extractSlotValueFromProof
+    uint8 constant KIND_RECEIPT = 3; // ReceiptProofVerifier.extractReceiptFromProof
+
+    struct Case {
+        uint8 kind;
+        bytes32 key; // address hash, slot hash or receipt index
+        bytes32 root;
+        bytes path; // only used by KIND_VALUE
+        bytes proof; // rlp encoded list of the proof nodes
+    }
+
+    struct Result {
+        bool success;
+        bytes data; // abi encoded result, or the revert data
+        uint256 gasUsed;
+    }
+
+    /// Verify a single proof.
+    /// @return result The extracted value, abi encoded per kind
+    /// @return gasUsed Gas of decoding the proof list and verifying it
+    function verify(
+        uint8 _kind,
+        bytes32 _key,
+        bytes32 _root,
+        bytes memory _path,
+        bytes memory _proof
+    ) external view returns (bytes memory result, uint256 gasUsed) {
+        uint256 gasStart = gasleft();
+        RLPReader.RLPItem[] memory proof = _proof.toRlpItem().toList();
+
+        if (_kind == KIND_VALUE) {
+            result = MerklePatriciaProofVerifier.extractProofValue(
+                _root,
+                _path,
+                proof
+            );
+        } else if (_kind == KIND_ACCOUNT) {
+            StateProofVerifier.Account memory account = StateProofVerifier
+                .extractAccountFromProof(_key, _root, proof);
+            result = abi.encode(
+                account.exists,
+                account.nonce,
+                account.balance,
+                account.storageRoot,
+                account.codeHash
+            );
+        } else if (_kind == KIND_SLOT) {
+            StateProofVerifier.SlotValue memory value = StateProofVerifier
+                .extractSlotValueFromProof(_key, _root, proof);
+            result = abi.encode(value.exists, value.value);
+        } else if (_kind == KIND_RECEIPT) {
+            ReceiptProofVerifier.Receipt memory receipt = ReceiptProofVerifier
+                .extractReceiptFromProof(uint256(_key), _root, proof);
+            result = abi.encode(
+                receipt.status,
+                receipt.cumulativeGasUsed,
+                keccak256(receipt.bloom),
+                receipt.logs.length
+            );
+        } else {
+            revert();
+        }
+
+        gasUsed = gasStart - gasleft();
+    }
+
+    /// Verify many proofs in one call, a reverting case does not stop the others.
+    /// @param _cases The proofs to verify
+    function verifyMany(
+        Case[] memory _cases
+    ) external view returns (Result[] memory results) {
+        results = new Result[](_cases.length);
+        for (uint256 i = 0; i < _cases.length; i++) {
+            Case memory c = _cases[i];
+            try this.verify(c.kind, c.key, c.root, c.path, c.proof) returns (
+                bytes memory data,
+                uint256 gasUsed
+            ) {
+                results[i] = Result(true, data, gasUsed);
+            } catch (bytes memory reason) {
+                results[i] = Result(false, reason, 0);
+            }
+        }
+    }
+}
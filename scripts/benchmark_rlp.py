@@ -0,0 +1,65 @@
+import json
+import os
+import time
+
+import rlp
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from scripts.rlp_encoding import BLOCK_HEADER, serialize_block
+
+HEADERS = "headers.json"  # ALTER: recorded raw `eth_getBlockByNumber` responses
+# one block per header variant: legacy, london, shanghai, dencun, pectra
+BLOCK_NUMBERS = (12_000_000, 15_000_000, 17_100_000, 19_500_000, 22_500_000)
+
+
+def record_headers(block_numbers=BLOCK_NUMBERS, count=200, path=HEADERS):
+    from brownie import web3
+
+    headers = []
+    for start in block_numbers:
+        for number in range(start, start + count):
+            response = web3.provider.make_request("eth_getBlockByNumber", [hex(number), False])
+            headers.append(response["result"])
+    with open(path, "w") as f:
+        json.dump(headers, f)
+    return headers
+
+
+def legacy_serialize_block(block):
+    # the per-field HexBytes implementation the keeper scripts used before `rlp_encoding`
+    return rlp.encode(
+        [
+            HexBytes("0x") if block[k] == "0x0" else HexBytes(block[k])
+            for k in BLOCK_HEADER
+            if k in block
+        ]
+    )
+
+
+def _measure(func, headers, rounds):
+    best = None
+    for _ in range(rounds):
+        start = time.perf_counter()
+        for header in headers:
+            func(header)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / len(headers) * 1e6
+
+
+def main(path=HEADERS, rounds=5):
+    if os.path.exists(path):
+        with open(path) as f:
+            headers = json.load(f)
+    else:
+        headers = record_headers(path=path)
+
+    for header in headers:
+        assert "0x" + keccak(serialize_block(header)).hex() == header["hash"], header["number"]
+
+    print(f"{len(headers)} headers, best of {rounds} rounds")
+    new = _measure(serialize_block, headers, rounds)
+    legacy = _measure(legacy_serialize_block, headers, rounds)
+    print(f"  rlp_encoding.serialize_block: {new:.2f} us/header")
+    print(f"  HexBytes + rlp.encode:        {legacy:.2f} us/header")
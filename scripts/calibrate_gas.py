@@ -0,0 +1,114 @@
+import json
+import os
+
+from brownie import BlockHashOracle, GaugeTypeOracle, GaugeTypeVerifier, accounts
+from eth_utils import keccak
+
+from scripts.gas_model import (
+    MODEL_PATH,
+    apply_features,
+    calibrated,
+    calldata_gas,
+    fit,
+    proof_features,
+    save,
+)
+
+PAYLOADS = "gas_payloads.json"  # ALTER: recorded gauge type payloads, see `record_payloads`
+MAX_COMMITTERS = 32
+
+
+def record_payloads(eth_web3, block_number, gauge_sets, path=PAYLOADS):
+    # run against mainnet (outside of brownie) to capture payloads to replay on hardhat
+    from scripts.sync_gauge_types import generate_proof
+
+    payloads = []
+    for gauges in gauge_sets:
+        block_header_rlp, proof_rlp = generate_proof(eth_web3, gauges, block_number)
+        payloads.append(
+            {
+                "number": block_number,
+                "hash": "0x" + keccak(block_header_rlp).hex(),
+                "gauges": gauges,
+                "header": "0x" + block_header_rlp.hex(),
+                "proof": "0x" + proof_rlp.hex(),
+            }
+        )
+    with open(path, "w") as f:
+        json.dump(payloads, f)
+    return payloads
+
+
+def _execution_gas(tx):
+    return tx.gas_used - calldata_gas(bytes.fromhex(tx.input[2:]))
+
+
+def calibrate_apply(deployer):
+    oracle = BlockHashOracle.deploy(1, {"from": deployer})
+    committers = [accounts.add() for _ in range(MAX_COMMITTERS)]
+    for committer in committers:
+        oracle.add_committer(committer, {"from": deployer})
+        deployer.transfer(committer, 10**18)
+
+    samples = []
+    for n in range(1, MAX_COMMITTERS + 1):
+        block_hash = keccak(n.to_bytes(32, "big"))
+        for committer in committers[:n]:
+            oracle.commit(n, block_hash, {"from": committer})
+        signers = sorted((c.address for c in committers[:n]), key=lambda s: int(s, 16))
+        tx = oracle.apply(n, block_hash, signers, {"from": deployer})
+        samples.append((apply_features(signers), _execution_gas(tx)))
+    return samples
+
+
+def calibrate_gauge_type(deployer, payloads):
+    block_hash_oracle = BlockHashOracle.deploy(1, {"from": deployer})
+
+    samples = []
+    for payload in payloads:
+        block_hash_oracle.set_block_hash(payload["number"], payload["hash"], {"from": deployer})
+        # fresh oracle every time so each gauge type is a new SSTORE, as in production
+        gauge_type_oracle = GaugeTypeOracle.deploy({"from": deployer})
+        verifier = GaugeTypeVerifier.deploy(
+            block_hash_oracle, gauge_type_oracle, {"from": deployer}
+        )
+        gauge_type_oracle.set_verifier(verifier, {"from": deployer})
+
+        tx = verifier.verifyGaugeTypeByBlockHash(
+            payload["gauges"], payload["header"], payload["proof"], {"from": deployer}
+        )
+        features = proof_features(
+            bytes.fromhex(payload["header"][2:]), bytes.fromhex(payload["proof"][2:])
+        )
+        samples.append((features, _execution_gas(tx)))
+    return samples
+
+
+def _report(kind, samples, coefficients):
+    worst = 0
+    for features, gas in samples:
+        predicted = sum(coefficients.get(name, 0) * value for name, value in features.items())
+        worst = max(worst, abs(predicted - gas) / gas)
+    print(f"  {kind}: {len(samples)} samples, worst error {worst:.1%}")
+
+
+def main(path=PAYLOADS, output=MODEL_PATH):
+    deployer = accounts[0]
+    fitted = {}
+
+    samples = calibrate_apply(deployer)
+    fitted["apply"] = fit(samples)
+    _report("apply", samples, fitted["apply"])
+
+    if os.path.exists(path):
+        with open(path) as f:
+            samples = calibrate_gauge_type(deployer, json.load(f))
+        fitted["gauge_type"] = fit(samples)
+        _report("gauge_type", samples, fitted["gauge_type"])
+    elif "gauge_type" in calibrated(output):
+        print(f"  gauge_type: no payloads at {path}, keeping the calibrated coefficients")
+    else:
+        print(f"  gauge_type: no payloads at {path}, left uncalibrated")
+
+    # uncalibrated kinds stay out of the file, their gas limits keep coming from estimateGas
+    save(fitted, output)
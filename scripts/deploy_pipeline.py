@@ -0,0 +1,670 @@
+import glob
+import json
+import os
+import subprocess
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from getpass import getpass
+
+from eth_account import Account
+from eth_utils import keccak, to_checksum_address
+from web3 import HTTPProvider, Web3
+from web3.exceptions import TransactionNotFound
+
+from scripts.registry import ROOT
+from scripts.rlp_encoding import encode_list, to_bytes
+
+CHECKPOINT = "deployments.json"
+SIDECHAIN = "http://127.0.0.1:8545"  # ALTER
+MAINNET = "http://127.0.0.1:8546"  # ALTER
+VYPER = os.environ.get("VYPER", "vyper")  # ALTER: compiler for `vyper_artifacts`
+
+CRV = "0xD533a949740bb3306d119CC777fa900bA034cd52"
+CRV_MINTER = "0xd061D61a4d941c39E5453435B6345Dc261C2fcE0"
+LZ_ENDPOINT_ETH = "0x66A71Dcef29A0fFBDBE3c6a460a3B5BC225Cd675"
+BRIDGE_OWNERSHIP_PROXY = "0x5a02d537fE0044E3eF506ccfA08f370425d1408C"
+SENDER_OWNER = "0x40907540d8a6C65c637785e8f8B742ae6b0b9968"
+
+GAS_MULTIPLIER = 1.2
+TRANSFER_GAS = 21_000
+FUND_MARGIN = 1.3
+GAS_PRICE_MULTIPLIER = 1.1
+
+# step arguments: "@name" is the address of a deployment or account
+Funding = namedtuple("Funding", ["account", "kinds"])  # gas of the `kinds` steps of `account`
+REFUND = "refund"  # the balance left after the transfer itself
+
+
+def create_address(sender, nonce):
+    return to_checksum_address(keccak(encode_list([to_bytes(sender), to_bytes(nonce)]))[12:])
+
+
+def deploy(name, chain, account, contract, *args, after=()):
+    return {
+        "name": name,
+        "chain": chain,
+        "account": account,
+        "kind": "deploy",
+        "contract": contract,
+        "args": list(args),
+        "after": list(after),
+    }
+
+
+def call(name, chain, account, target, method, *args, after=()):
+    return {
+        "name": name,
+        "chain": chain,
+        "account": account,
+        "kind": "call",
+        "target": target,
+        "method": method,
+        "args": list(args),
+        "after": list(after),
+    }
+
+
+def transfer(name, chain, account, to, value, after=()):
+    return {
+        "name": name,
+        "chain": chain,
+        "account": account,
+        "kind": "transfer",
+        "to": to,
+        "value": value,
+        "after": list(after),
+    }
+
+
+def plan(gauge_type, lz_endpoint, lz_chain_id, owner=None, verifier=True):
+    """
+    The steps of `deploy.main` for the contracts in this repository, in nonce order per
+    (chain, account). Addresses are referred to by name, `after` lists the steps of other
+    lanes which must be mined first. The temp account deploys at the same nonces on both
+    chains, so the bridges and the LayerZero receiver/sender pair share their addresses
+    across chains. It is funded for its deployments first and topped up for its calls once
+    they can be estimated.
+
+    Sidechain ownership is committed to `owner` when given and stays with the deployer
+    otherwise. `verifier` adds the GaugeTypeVerifier, which needs the Solidity artifacts.
+    """
+    sidechain = [
+        deploy("block_hash_oracle", "sidechain", "deployer", "BlockHashOracle", 1),
+        deploy("gauge_type_oracle", "sidechain", "deployer", "GaugeTypeOracle"),
+    ]
+    if verifier:
+        sidechain += [
+            deploy(
+                "gauge_type_verifier",
+                "sidechain",
+                "deployer",
+                "GaugeTypeVerifier",
+                "@block_hash_oracle",
+                "@gauge_type_oracle",
+            ),
+            call(
+                "set_verifier",
+                "sidechain",
+                "deployer",
+                "gauge_type_oracle",
+                "set_verifier",
+                "@gauge_type_verifier",
+            ),
+        ]
+    sidechain += [
+        deploy("crv_token", "sidechain", "deployer", "Token", "Curve DAO Token", "CRV", 18),
+        deploy(
+            "minter",
+            "sidechain",
+            "deployer",
+            "Minter",
+            "@crv_token",
+            "@gauge_type_oracle",
+            gauge_type,
+        ),
+        call("set_crv_minter", "sidechain", "deployer", "crv_token", "set_minter", "@minter"),
+        deploy(
+            "crvusd_token",
+            "sidechain",
+            "deployer",
+            "Token",
+            "Curve.fi USD Stablecoin",
+            "crvUSD",
+            18,
+        ),
+        deploy("minter_proxy", "sidechain", "deployer", "MinterProxy", "@crvusd_token"),
+        call(
+            "set_crvusd_minter",
+            "sidechain",
+            "deployer",
+            "crvusd_token",
+            "set_minter",
+            "@minter_proxy",
+        ),
+        transfer("fund_temp", "sidechain", "deployer", "@temp", Funding("temp", ("deploy",))),
+        call(
+            "set_bridge_minter",
+            "sidechain",
+            "deployer",
+            "minter_proxy",
+            "set_minter",
+            "@crvusd_bridge",
+            True,
+        ),
+        call(
+            "add_committer",
+            "sidechain",
+            "deployer",
+            "block_hash_oracle",
+            "add_committer",
+            "@receiver",
+        ),
+    ]
+    if owner is not None:
+        sidechain += [
+            call(
+                f"transfer_{name}",
+                "sidechain",
+                "deployer",
+                name,
+                "commit_transfer_ownership",
+                owner,
+            )
+            for name in ("block_hash_oracle", "gauge_type_oracle", "minter_proxy")
+        ]
+    sidechain += [
+        transfer(
+            "top_up_temp", "sidechain", "deployer", "@temp", Funding("temp", ("call", "transfer"))
+        ),
+        # sidechain, temp: bridges and receiver
+        deploy(
+            "crv_bridge",
+            "sidechain",
+            "temp",
+            "LayerZeroBridgeCRV",
+            86400,
+            0,
+            500_000,
+            "@crv_token",
+            "@minter",
+            lz_endpoint,
+            CRV,
+            101,
+            after=["fund_temp"],
+        ),
+        deploy(
+            "crvusd_bridge",
+            "sidechain",
+            "temp",
+            "CRVUSDLayerZeroBridge",
+            86400,
+            0,
+            101,
+            lz_endpoint,
+            "@crvusd_token",
+            "@minter_proxy",
+        ),
+        deploy(
+            "receiver", "sidechain", "temp", "LayerZeroReceiver", "@block_hash_oracle", lz_endpoint
+        ),
+    ]
+    if owner is not None:
+        sidechain += [
+            call(
+                f"transfer_{name}",
+                "sidechain",
+                "temp",
+                name,
+                "commit_transfer_ownership",
+                owner,
+                after=["top_up_temp"],
+            )
+            for name in ("crv_bridge", "crvusd_bridge")
+        ]
+    sidechain.append(transfer("refund_temp", "sidechain", "temp", "@deployer", REFUND))
+
+    # mainnet: the other side of the bridges, deployed by temp at the same nonces
+    mainnet = [
+        transfer("fund_temp_eth", "mainnet", "deployer", "@temp", Funding("temp", ("deploy",))),
+        transfer(
+            "top_up_temp_eth", "mainnet", "deployer", "@temp", Funding("temp", ("call", "transfer"))
+        ),
+        deploy(
+            "crv_bridge_eth",
+            "mainnet",
+            "temp",
+            "LayerZeroBridgeCRV",
+            86400,
+            0,
+            500_000,
+            CRV,
+            CRV_MINTER,
+            LZ_ENDPOINT_ETH,
+            "@crv_token",
+            lz_chain_id,
+            after=["fund_temp_eth"],
+        ),
+        deploy(
+            "crvusd_bridge_eth",
+            "mainnet",
+            "temp",
+            "CRVUSDLayerZeroBridgeETH",
+            86400,
+            0,
+            lz_chain_id,
+        ),
+        deploy("sender", "mainnet", "temp", "LayerZeroSender", 300_000, lz_chain_id),
+    ]
+    mainnet += [
+        call(
+            f"transfer_{name}",
+            "mainnet",
+            "temp",
+            name,
+            "commit_transfer_ownership",
+            new_owner,
+            after=["top_up_temp_eth"],
+        )
+        for name, new_owner in (
+            ("crv_bridge_eth", BRIDGE_OWNERSHIP_PROXY),
+            ("crvusd_bridge_eth", BRIDGE_OWNERSHIP_PROXY),
+            ("sender", SENDER_OWNER),
+        )
+    ]
+    mainnet.append(transfer("refund_temp_eth", "mainnet", "temp", "@deployer", REFUND))
+    return sidechain + mainnet
+
+
+# pairs which must land on the same address, LayerZero trusts the remote as its own address
+SAME_ADDRESS = [
+    ("crv_bridge", "crv_bridge_eth"),
+    ("crvusd_bridge", "crvusd_bridge_eth"),
+    ("receiver", "sender"),
+]
+
+
+class DeployPipeline:
+    """
+    Run a `plan` on two chains at once with pre-assigned nonces.
+
+    Every (chain, account) pair is a lane whose transactions are signed and broadcast back to
+    back, lanes run in parallel and only wait on each other where a step needs the result of
+    another (`after`, the target of a call, the final refunds). Deployments are estimated up
+    front, calls once their target is mined. All addresses are known in advance, so nothing
+    else waits for a receipt. Every estimate, signed transaction and receipt goes to
+    `checkpoint`; a rerun rebroadcasts what is not mined and skips what is.
+
+    `artifacts(name)` returns (abi, bytecode) of a contract. The temp account is kept in the
+    checkpoint as a keystore encrypted with `password`, never as a plain key.
+    """
+
+    def __init__(
+        self,
+        web3s,
+        keys,
+        steps,
+        artifacts,
+        checkpoint=CHECKPOINT,
+        *,
+        password,
+        poll_interval=1,
+        log=False,
+    ):
+        self.web3s = web3s  # chain -> Web3
+        self.steps = steps
+        self.artifacts = artifacts
+        self.checkpoint = checkpoint
+        self.poll_interval = poll_interval
+        self.log = log
+        self.lock = threading.Lock()
+        self.failed = threading.Event()
+
+        self.state = {"steps": {}}
+        if os.path.exists(checkpoint):
+            with open(checkpoint) as f:
+                self.state = json.load(f)
+        # the temp account is part of the checkpoint, it deploys the cross-chain addresses
+        if "seed" in self.state:
+            # checkpoints of earlier versions held the plain key
+            temp = Account.from_key(self.state.pop("seed"))
+            self.state["temp"] = Account.encrypt(temp.key, password)
+        elif "temp" not in self.state:
+            temp = Account.create()
+            self.state["temp"] = Account.encrypt(temp.key, password)
+        else:
+            temp = Account.from_key(Account.decrypt(self.state["temp"], password))
+        self.accounts = {"deployer": Account.from_key(keys["deployer"]), "temp": temp}
+        self.by_name = {step["name"]: step for step in steps}
+
+        self.lanes = {}
+        for step in steps:
+            self.lanes.setdefault((step["chain"], step["account"]), []).append(step)
+
+    def _print(self, message):
+        if self.log:
+            print(message, flush=True)
+
+    def _save(self):
+        tmp = f"{self.checkpoint}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp, self.checkpoint)
+
+    def _record(self, name, **values):
+        with self.lock:
+            self.state["steps"].setdefault(name, {}).update(values)
+            self._save()
+
+    def _assign_nonces(self):
+        # nonces and gas prices are fixed on the first run, a resume signs the same transactions
+        nonces = self.state.setdefault("nonces", {})
+        gas_prices = self.state.setdefault("gas_prices", {})
+        for chain, account in self.lanes:
+            if f"{chain}:{account}" not in nonces:
+                address = self.accounts[account].address
+                nonces[f"{chain}:{account}"] = self.web3s[chain].eth.get_transaction_count(address)
+        for chain, web3 in self.web3s.items():
+            if chain not in gas_prices:
+                gas_prices[chain] = int(web3.eth.gas_price * GAS_PRICE_MULTIPLIER)
+        self._save()
+
+        self.nonces = {}
+        for (chain, account), lane in self.lanes.items():
+            base = self.state["nonces"][f"{chain}:{account}"]
+            for i, step in enumerate(lane):
+                self.nonces[step["name"]] = base + i
+
+        self.addresses = {f"@{name}": account.address for name, account in self.accounts.items()}
+        for step in self.steps:
+            if step["kind"] == "deploy":
+                sender = self.accounts[step["account"]].address
+                self.addresses[f"@{step['name']}"] = create_address(
+                    sender, self.nonces[step["name"]]
+                )
+        for a, b in SAME_ADDRESS:
+            if a in self.by_name and b in self.by_name:
+                assert (
+                    self.addresses[f"@{a}"] == self.addresses[f"@{b}"]
+                ), f"{a} and {b} would deploy to different addresses"
+
+    def _funded(self, step):
+        funding = step["value"]
+        lane = self.lanes.get((step["chain"], funding.account), [])
+        return [s for s in lane if s["kind"] in funding.kinds]
+
+    def _dependencies(self, step):
+        deps = list(step["after"])
+        if step["kind"] == "call" and step["target"] in self.by_name:
+            deps.append(step["target"])  # calls are estimated against the deployed target
+        value = step.get("value")
+        if isinstance(value, Funding):
+            deps += [s["target"] for s in self._funded(step) if s["kind"] == "call"]
+        if value == REFUND:
+            lane = self.lanes[(step["chain"], step["account"])]
+            deps += [s["name"] for s in lane if s is not step]
+        return deps
+
+    def _resolve(self, arg):
+        if isinstance(arg, str) and arg.startswith("@"):
+            return self.addresses[arg]
+        return arg
+
+    def _function(self, step, web3):
+        args = [self._resolve(arg) for arg in step["args"]]
+        if step["kind"] == "deploy":
+            abi, bytecode = self.artifacts(step["contract"])
+            return web3.eth.contract(abi=abi, bytecode=bytecode).constructor(*args)
+        abi, _ = self.artifacts(self.by_name[step["target"]]["contract"])
+        target = web3.eth.contract(address=self.addresses[f"@{step['target']}"], abi=abi)
+        return getattr(target.functions, step["method"])(*args)
+
+    def _estimate(self, step):
+        # made once and kept in the checkpoint, a resume funds and signs with the same gas
+        name = step["name"]
+        if step["kind"] == "transfer" or "gas" in self.state["steps"].get(name, {}):
+            return
+        web3 = self.web3s[step["chain"]]
+        sender = self.accounts[step["account"]].address
+        # at a zero gas price, temp is estimated before it is funded for what it estimates
+        gas = self._function(step, web3).estimate_gas({"from": sender, "gasPrice": 0})
+        self._record(name, gas=int(gas * GAS_MULTIPLIER))
+
+    def _gas(self, step):
+        if step["kind"] == "transfer":
+            return TRANSFER_GAS
+        return self.state["steps"][step["name"]]["gas"]
+
+    def _value(self, step, web3, gas_price):
+        value = step["value"]
+        if isinstance(value, Funding):
+            funded = self._funded(step)
+            for s in funded:
+                self._estimate(s)
+            return int(sum(self._gas(s) for s in funded) * gas_price * FUND_MARGIN)
+        if value == REFUND:
+            balance = web3.eth.get_balance(self.accounts[step["account"]].address)
+            return max(balance - TRANSFER_GAS * gas_price, 0)
+        return value
+
+    def _sign(self, step):
+        web3 = self.web3s[step["chain"]]
+        account = self.accounts[step["account"]]
+        gas_price = self.state["gas_prices"][step["chain"]]
+        if step["kind"] == "transfer":
+            to, value = self._resolve(step["to"]), self._value(step, web3, gas_price)
+        else:
+            self._estimate(step)
+        params = {
+            "from": account.address,
+            "chainId": web3.eth.chain_id,
+            "nonce": self.nonces[step["name"]],
+            "gas": self._gas(step),
+            "gasPrice": gas_price,
+        }
+        if step["kind"] == "transfer":
+            tx = {**params, "to": to, "value": value}
+        else:
+            tx = self._function(step, web3).build_transaction(params)
+        return Web3.to_hex(account.sign_transaction(tx).raw_transaction)
+
+    def _receipt(self, name):
+        record = self.state["steps"].get(name, {})
+        if record.get("status") is None:
+            if record.get("hash") is None:
+                return None
+            web3 = self.web3s[self.by_name[name]["chain"]]
+            try:
+                receipt = web3.eth.get_transaction_receipt(record["hash"])
+            except TransactionNotFound:
+                return None
+            self._record(
+                name,
+                status=receipt["status"],
+                block=receipt["blockNumber"],
+                gas_used=receipt["gasUsed"],
+            )
+            record = self.state["steps"][name]
+        if record["status"] != 1:
+            # a revert needs a look before anything else goes out, reruns stop here as well
+            raise RuntimeError(f"Step {name} reverted in {record['hash']}")
+        return record
+
+    def _wait(self, names):
+        while True:
+            if self.failed.is_set():
+                raise RuntimeError(f"Stopped waiting for {names}, another lane failed")
+            pending = [name for name in names if self._receipt(name) is None]
+            if not pending:
+                return
+            time.sleep(self.poll_interval)
+
+    def _run_lane(self, lane):
+        try:
+            self._broadcast_lane(lane)
+        except Exception:
+            # the other lanes may be waiting on this one, they stop instead of polling forever
+            self.failed.set()
+            raise
+
+    def _broadcast_lane(self, lane):
+        for step in lane:
+            name = step["name"]
+            if self._receipt(name) is not None:
+                continue
+            record = self.state["steps"].get(name, {})
+            raw = record.get("raw")
+            if raw is None:
+                self._wait(self._dependencies(step))
+                raw = self._sign(step)
+                self._record(name, raw=raw, hash=Web3.to_hex(keccak(bytes.fromhex(raw[2:]))))
+            web3 = self.web3s[step["chain"]]
+            try:
+                web3.eth.send_raw_transaction(raw)
+            except Exception as e:
+                # rebroadcast on resume, the node may already have it (or have mined it)
+                message = str(e).lower()
+                if "already known" not in message and "nonce too low" not in message:
+                    raise
+            self._print(f"  {step['chain']}:{step['account']} {self.nonces[name]} {name}")
+        self._wait([step["name"] for step in lane])
+
+    def run(self):
+        self._assign_nonces()
+        # constructors only store their arguments, so every deployment estimates up front
+        deploys = [
+            s for s in self.steps if s["kind"] == "deploy" and self._receipt(s["name"]) is None
+        ]
+        with ThreadPoolExecutor(max_workers=len(self.lanes)) as executor:
+            list(executor.map(self._estimate, deploys))
+            for future in [executor.submit(self._run_lane, lane) for lane in self.lanes.values()]:
+                future.result()
+
+        # the original summary: deployed addresses by chain id
+        for chain, web3 in self.web3s.items():
+            deployed = [s for s in self.steps if s["chain"] == chain and s["kind"] == "deploy"]
+            self.state[str(web3.eth.chain_id)] = [self.addresses[f"@{s['name']}"] for s in deployed]
+        with self.lock:
+            self._save()
+        return {name: address for name, address in self.addresses.items()}
+
+
+def brownie_artifacts(name):
+    import brownie
+
+    container = getattr(brownie, name)
+    return container.abi, container.bytecode
+
+
+@lru_cache()
+def vyper_artifacts(name):
+    # without brownie: compile the Vyper source of `name`, Solidity contracts are not found
+    paths = glob.glob(os.path.join(ROOT, "contracts", "**", f"{name}.vy"), recursive=True)
+    if not paths:
+        raise FileNotFoundError(f"No Vyper source for {name}")
+    output = subprocess.check_output([VYPER, "-f", "abi,bytecode", paths[0]], text=True)
+    abi, bytecode = output.splitlines()
+    return json.loads(abi), bytecode
+
+
+def has_artifacts(artifacts, name):
+    try:
+        artifacts(name)
+    except (AttributeError, FileNotFoundError):
+        return False
+    return True
+
+
+def main(
+    gauge_type,
+    lz_endpoint,
+    lz_chain_id,
+    owner=None,
+    sidechain=SIDECHAIN,
+    mainnet=MAINNET,
+    checkpoint=CHECKPOINT,
+):
+    from brownie import accounts
+
+    web3s = {"sidechain": Web3(HTTPProvider(sidechain)), "mainnet": Web3(HTTPProvider(mainnet))}
+    keys = {"deployer": accounts.load("dev").private_key}
+    verifier = has_artifacts(brownie_artifacts, "GaugeTypeVerifier")
+    if not verifier:
+        print("GaugeTypeVerifier is not compiled, skipping it and `set_verifier`")
+    steps = plan(gauge_type, lz_endpoint, lz_chain_id, owner, verifier)
+    password = getpass(f"Password of the temp deployer in {checkpoint}: ")
+    pipeline = DeployPipeline(
+        web3s, keys, steps, brownie_artifacts, checkpoint, password=password, log=True
+    )
+    for name, address in pipeline.run().items():
+        print(f"{name[1:]}: {address}")
+
+
+def verify_pipeline(
+    web3s, key, artifacts, checkpoint, owner=None, interrupt=5, password="verify", log=False
+):
+    """
+    Deploy the whole plan to `web3s` twice over: the first run stops after `interrupt` steps
+    of the sidechain deployer, the second has to finish from the checkpoint without signing
+    them again. Then every deployment must have code, the temp deployments must match across
+    chains, every estimate must be in the checkpoint and every ownership committed.
+    """
+    lz_endpoint = Account.create().address
+    verifier = has_artifacts(artifacts, "GaugeTypeVerifier")
+    steps = plan(8, lz_endpoint, 101, owner, verifier)
+    if os.path.exists(checkpoint):
+        os.remove(checkpoint)
+
+    lane = [s for s in steps if (s["chain"], s["account"]) == ("sidechain", "deployer")]
+    DeployPipeline(
+        web3s, {"deployer": key}, lane[:interrupt], artifacts, checkpoint, password=password
+    ).run()
+    with open(checkpoint) as f:
+        signed = {name: record["raw"] for name, record in json.load(f)["steps"].items()}
+
+    pipeline = DeployPipeline(
+        web3s, {"deployer": key}, steps, artifacts, checkpoint, password=password, log=log
+    )
+    addresses = pipeline.run()
+    records = pipeline.state["steps"]
+    for name, raw in signed.items():
+        assert records[name]["raw"] == raw, f"{name} was signed again"
+    for step in steps:
+        web3, name = web3s[step["chain"]], step["name"]
+        assert records[name]["status"] == 1, f"{name} did not go through"
+        if step["kind"] == "deploy":
+            assert len(web3.eth.get_code(addresses[f"@{name}"])) > 0, f"{name} has no code"
+        if step["kind"] != "transfer":
+            assert records[name]["gas"] >= records[name]["gas_used"], f"{name} is not estimated"
+        if step["kind"] == "call" and step["method"] == "commit_transfer_ownership":
+            abi, _ = artifacts(pipeline.by_name[step["target"]]["contract"])
+            contract = web3.eth.contract(address=addresses[f"@{step['target']}"], abi=abi)
+            assert contract.functions.future_owner().call() == step["args"][0]
+    for a, b in SAME_ADDRESS:
+        assert addresses[f"@{a}"] == addresses[f"@{b}"]
+    with open(checkpoint) as f:
+        assert pipeline.accounts["temp"].key.hex()[-64:] not in f.read(), "temp key in plain"
+    return addresses
+
+
+def verify(
+    sidechain=SIDECHAIN,
+    mainnet=MAINNET,
+    key=None,
+    checkpoint="deployments-verify.json",
+    interrupt=5,
+):
+    """
+    End to end run against two local nodes (`anvil`, `npx hardhat node --port 8546`), see
+    `verify_pipeline`. tests/test_deploy_pipeline.py runs the same check in-process.
+    """
+    # first prefunded account of anvil and hardhat
+    key = key or "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+    web3s = {"sidechain": Web3(HTTPProvider(sidechain)), "mainnet": Web3(HTTPProvider(mainnet))}
+    owner = Account.create().address
+    addresses = verify_pipeline(
+        web3s, key, brownie_artifacts, checkpoint, owner, interrupt, log=True
+    )
+    print(f"Deployed {len(addresses) - 2} contracts on two chains, resumed from {checkpoint}")
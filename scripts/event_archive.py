@@ -0,0 +1,456 @@
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from eth_utils import keccak
+from web3 import HTTPProvider, Web3
+
+from scripts.log_scanner import _is_too_many_results
+from scripts.registry import registry
+from scripts.status_query import block_timestamps
+
+NETWORKS = {  # ALTER
+    1: "https://eth-mainnet.alchemyapi.io/v2/"
+    f"{os.environ.get('WEB3_ETHEREUM_MAINNET_ALCHEMY_API_KEY')}",
+    43114: "https://api.avax.network/ext/bc/C/rpc",  # avax
+    250: "https://rpc.ftm.tools",  # ftm
+    56: "https://bscrpc.com",  # bsc
+    2222: "https://evm.kava.io",  # kava
+}
+ROOT = "archive"  # ALTER: <root>/<event>/chain_id=<id>/<address>-<from>-<to>.parquet
+CONFIRMATIONS = 64  # only final blocks are archived, a part file is never rewritten
+WEEK = 7 * 86400
+
+# event -> (signature, [(field, column type, indexed)]), only static types. uint256 values
+# bounded by their meaning (block numbers, gauge types) are stored as "uint64", amounts as
+# "uint256" which maps to decimal128(38, 0).
+EVENTS = {
+    "CommitBlockHash": (
+        "CommitBlockHash(address,uint256,bytes32)",
+        [("committer", "address", True), ("number", "uint64", True), ("hash", "bytes32", False)],
+    ),
+    "ApplyBlockHash": (
+        "ApplyBlockHash(uint256,bytes32)",
+        [("number", "uint64", True), ("hash", "bytes32", False)],
+    ),
+    "Delayed": (
+        "Delayed(uint64,address,uint256)",
+        [("nonce", "uint64", True), ("receiver", "address", True), ("amount", "uint256", False)],
+    ),
+    "BridgeReceived": (
+        "BridgeReceived(address,uint256)",
+        [("receiver", "address", True), ("amount", "uint256", False)],
+    ),
+    "SetGaugeType": (
+        "SetGaugeType(address,uint256)",
+        [("gauge", "address", True), ("type", "uint64", False)],
+    ),
+    "SetVerifier": ("SetVerifier(address)", [("verifier", "address", False)]),
+    "Transmission": ("Transmission(bytes32)", [("message_id", "bytes32", False)]),
+}
+TOPICS = {"0x" + keccak(text=signature).hex(): name for name, (signature, _) in EVENTS.items()}
+
+# deployment key -> events archived for it, see `sources`
+CONTRACT_EVENTS = {
+    "block_hash_oracle": ("CommitBlockHash", "ApplyBlockHash"),
+    "gauge_type_oracle": ("SetGaugeType", "SetVerifier"),
+    "bridge": ("Delayed", "BridgeReceived"),
+    "ccip_sender": ("Transmission",),
+}
+
+COLUMN_TYPES = {
+    "address": pa.binary(20),
+    "bytes32": pa.binary(32),
+    "uint64": pa.uint64(),
+    "uint256": pa.decimal128(38, 0),
+}
+# leading byte of 10**38 as a uint128, anything above may not fit decimal128(38)
+DECIMAL_LIMIT = 0x4B
+
+
+def _words(hex_strings, n_words):
+    # one buffer for the whole column, no per-log bytes objects
+    raw = bytes.fromhex("".join(s[2:] for s in hex_strings))
+    return np.frombuffer(raw, dtype=np.uint8).reshape(-1, n_words, 32)
+
+
+def _column(words, kind):
+    n = len(words)
+    if kind in ("address", "bytes32"):
+        width = 20 if kind == "address" else 32
+        buffer = pa.py_buffer(np.ascontiguousarray(words[:, 32 - width :]).tobytes())
+        return pa.Array.from_buffers(COLUMN_TYPES[kind], n, [None, buffer])
+    if kind == "uint64":
+        if words[:, :24].any():
+            raise ValueError("Value does not fit uint64")
+        return pa.array(np.ascontiguousarray(words[:, 24:]).view(">u8").ravel().astype(np.uint64))
+    if kind == "uint256":
+        if words[:, :16].any() or (words[:, 16] >= DECIMAL_LIMIT).any():
+            raise ValueError("Value does not fit decimal128(38)")
+        # decimal128 is a little endian 16 byte integer
+        buffer = pa.py_buffer(np.ascontiguousarray(words[:, :15:-1]).tobytes())
+        return pa.Array.from_buffers(COLUMN_TYPES[kind], n, [None, buffer])
+    raise ValueError(f"Unknown column type {kind}")
+
+
+def decode_logs(event, logs):
+    """
+    Raw `eth_getLogs` results of one event as an Arrow table, every column decoded at once
+    from the hex of all logs. `timestamp` comes from `blockTimestamp` of the logs if the node
+    sets it and is null otherwise.
+    """
+    _, fields = EVENTS[event]
+    n_topics = sum(indexed for _, _, indexed in fields)
+    n_data = len(fields) - n_topics
+
+    topics = (
+        _words([topic for log in logs for topic in log["topics"][1:]], n_topics)
+        if n_topics
+        else None
+    )
+    data = _words([log["data"] for log in logs], n_data) if n_data else None
+    columns = {
+        "block_number": pa.array([int(log["blockNumber"], 16) for log in logs], pa.uint64()),
+        "log_index": pa.array([int(log["logIndex"], 16) for log in logs], pa.uint32()),
+        "transaction_hash": _column(
+            _words([log["transactionHash"] for log in logs], 1)[:, 0], "bytes32"
+        ),
+        "address": _column(
+            _words(["0x" + log["address"][2:].rjust(64, "0") for log in logs], 1)[:, 0], "address"
+        ),
+        "timestamp": pa.array(
+            [int(log["blockTimestamp"], 16) if log.get("blockTimestamp") else None for log in logs],
+            pa.uint64(),
+        ),
+    }
+    topic, word = 0, 0
+    for name, kind, indexed in fields:
+        if indexed:
+            columns[name] = _column(topics[:, topic], kind)
+            topic += 1
+        else:
+            columns[name] = _column(data[:, word], kind)
+            word += 1
+    return pa.table(columns)
+
+
+def schema(event):
+    _, fields = EVENTS[event]
+    return pa.schema(
+        [
+            ("block_number", pa.uint64()),
+            ("log_index", pa.uint32()),
+            ("transaction_hash", pa.binary(32)),
+            ("address", pa.binary(20)),
+            ("timestamp", pa.uint64()),
+        ]
+        + [(name, COLUMN_TYPES[kind]) for name, kind, _ in fields]
+    )
+
+
+def sources(chain_id):
+    """
+    Archived contracts of a chain from the registry as address -> events. Mainnet sides are
+    deployed per network, e.g. "avalanche.bridge".
+    """
+    result = {}
+    for key, events in CONTRACT_EVENTS.items():
+        for (deployed_chain, name), address in registry.index["addresses"].items():
+            if deployed_chain == chain_id and name.rsplit(".", 1)[-1] == key:
+                result.setdefault(Web3.to_checksum_address(address), set()).update(events)
+    return {address: sorted(events) for address, events in result.items()}
+
+
+def _request(web3, method, params):
+    response = web3.provider.make_request(method, params)
+    if response.get("error"):
+        raise ValueError(response["error"])
+    return response["result"]
+
+
+class EventArchive:
+    """
+    Contract events as Parquet files under `root`, one directory per event partitioned by
+    chain id, appended to incrementally.
+
+    Logs are fetched raw through `eth_getLogs` in concurrent windows, one request per
+    contract for all its events, and decoded column-wise with numpy instead of per log
+    through web3. Every flush writes one part file per event and then moves the contract's
+    cursor in `<root>/state.json`; parts beyond the cursor, left by an interrupted export, are
+    removed before exporting again.
+    """
+
+    def __init__(self, root=ROOT):
+        self.root = root
+        self.state_path = os.path.join(root, "state.json")
+
+    def state(self):
+        if not os.path.exists(self.state_path):
+            return {}
+        with open(self.state_path) as f:
+            return json.load(f)
+
+    def _save_state(self, state):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f, indent=2, sort_keys=True)
+        os.replace(tmp, self.state_path)
+
+    def _parts(self, event, chain_id, address="*"):
+        return glob.glob(
+            os.path.join(self.root, event, f"chain_id={chain_id}", f"{address}-*.parquet")
+        )
+
+    def _drop_uncommitted(self, chain_id, address, next_block):
+        for event in EVENTS:
+            for path in self._parts(event, chain_id, address):
+                if int(os.path.basename(path).split("-")[1]) >= next_block:
+                    os.remove(path)
+
+    def _write(self, event, chain_id, address, from_block, to_block, table):
+        directory = os.path.join(self.root, event, f"chain_id={chain_id}")
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"{address}-{from_block}-{to_block}.parquet")
+        pq.write_table(table, f"{path}.tmp", compression="zstd")
+        os.replace(f"{path}.tmp", path)
+
+    def _fetch(self, web3, address, topics, from_block, to_block, min_window):
+        params = {
+            "address": address,
+            "topics": [topics],
+            "fromBlock": hex(from_block),
+            "toBlock": hex(to_block),
+        }
+        try:
+            return _request(web3, "eth_getLogs", [params])
+        except Exception as e:
+            if not _is_too_many_results(e) or to_block - from_block + 1 <= min_window:
+                raise
+            middle = (from_block + to_block) // 2
+            return self._fetch(web3, address, topics, from_block, middle, min_window) + self._fetch(
+                web3, address, topics, middle + 1, to_block, min_window
+            )
+
+    def export(
+        self,
+        web3,
+        chain_id,
+        contracts=None,
+        start_block=None,
+        head=None,
+        window=2048,
+        min_window=16,
+        max_in_flight=4,
+        flush_every=64,
+    ):
+        """
+        Append the events of `contracts` (address -> event names, `sources(chain_id)` by
+        default) up to `head - CONFIRMATIONS`, a contract without a cursor yet from
+        `start_block`, its deployment block by default. Returns the number of rows written per
+        event.
+        """
+        if contracts is None:
+            contracts = sources(chain_id)
+        if head is None:
+            head = web3.eth.block_number
+        last = head - CONFIRMATIONS
+        state = self.state()
+        cursors = state.setdefault(str(chain_id), {})
+        written = {}
+
+        for address, events in contracts.items():
+            address = Web3.to_checksum_address(address)
+            topics = ["0x" + keccak(text=EVENTS[event][0]).hex() for event in events]
+            next_block = cursors.get(address, start_block)
+            if next_block is None:
+                # the windows before the deployment are empty, skip them
+                next_block = registry.deployment_block(web3, address)
+            self._drop_uncommitted(chain_id, address, next_block)
+
+            ranges = [
+                (lo, min(lo + window - 1, last)) for lo in range(next_block, last + 1, window)
+            ]
+            for i in range(0, len(ranges), flush_every):
+                chunk = ranges[i : i + flush_every]
+                with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+                    results = executor.map(
+                        lambda r: self._fetch(web3, address, topics, *r, min_window), chunk
+                    )
+                    logs = [log for result in results for log in result if not log.get("removed")]
+
+                from_block, to_block = chunk[0][0], chunk[-1][1]
+                timestamps = {}
+                if any(not log.get("blockTimestamp") for log in logs):
+                    timestamps = block_timestamps(
+                        web3, [int(log["blockNumber"], 16) for log in logs]
+                    )
+
+                by_event = {}
+                for log in logs:
+                    by_event.setdefault(TOPICS[log["topics"][0]], []).append(log)
+                for event, event_logs in by_event.items():
+                    table = decode_logs(event, event_logs)
+                    if timestamps:
+                        column = pa.array(
+                            [timestamps[n] for n in table["block_number"].to_pylist()], pa.uint64()
+                        )
+                        table = table.set_column(
+                            table.schema.get_field_index("timestamp"), "timestamp", column
+                        )
+                    self._write(event, chain_id, address, from_block, to_block, table)
+                    written[event] = written.get(event, 0) + len(table)
+
+                cursors[address] = to_block + 1
+                self._save_state(state)
+        return written
+
+    def table(self, event, chain_id=None, columns=None, filter=None):
+        """
+        Archived rows of `event` as one Arrow table with a `chain_id` column, optionally for
+        a single chain (only its partition is read) and filtered by a dataset expression.
+        """
+        # `chain_id` is the partition key, not a column of the files: it is dropped from the
+        # columns read and added back, rows are ordered by (block_number, log_index)
+        read = None
+        if columns is not None:
+            read = [c for c in columns if c != "chain_id"]
+            read += [c for c in ("block_number", "log_index") if c not in read]
+
+        path = os.path.join(self.root, event)
+        if chain_id is not None:
+            path = os.path.join(path, f"chain_id={chain_id}")
+        if not glob.glob(os.path.join(path, "**", "*.parquet"), recursive=True):
+            table = schema(event).empty_table()
+            table = table.append_column("chain_id", pa.array([], pa.int64()))
+            return table if columns is None else table.select(columns)
+
+        if chain_id is None:
+            dataset = ds.dataset(
+                path,
+                format="parquet",
+                partitioning=ds.partitioning(pa.schema([("chain_id", pa.int64())]), flavor="hive"),
+            )
+            table = dataset.to_table(
+                columns=None if read is None else read + ["chain_id"], filter=filter
+            )
+        else:
+            dataset = ds.dataset(path, schema=schema(event), format="parquet")
+            table = dataset.to_table(columns=read, filter=filter)
+            chain_ids = pa.array(np.full(len(table), chain_id, dtype=np.int64))
+            table = table.append_column("chain_id", chain_ids)
+        table = table.sort_by([("block_number", "ascending"), ("log_index", "ascending")])
+        return table if columns is None else table.select(columns)
+
+
+def _week(table):
+    return pc.multiply(
+        pc.divide(table["timestamp"], pa.scalar(WEEK, pa.uint64())), pa.scalar(WEEK, pa.uint64())
+    )
+
+
+def commit_latency(archive, chain_id=None):
+    """
+    Per chain and committer: commits, and the mean and max seconds each commit trailed the
+    first commit of the same block number.
+    """
+    commits = archive.table(
+        "CommitBlockHash", chain_id, ["chain_id", "committer", "number", "timestamp"]
+    )
+    first = commits.group_by(["chain_id", "number"]).aggregate([("timestamp", "min")])
+    joined = commits.join(first, ["chain_id", "number"])
+    delay = pc.subtract(joined["timestamp"], joined["timestamp_min"])
+    joined = joined.append_column("delay", delay)
+    return (
+        joined.group_by(["chain_id", "committer"])
+        .aggregate([("delay", "count"), ("delay", "mean"), ("delay", "max")])
+        .rename_columns(["chain_id", "committer", "commits", "mean_delay", "max_delay"])
+    )
+
+
+def apply_latency(archive, chain_id=None):
+    """
+    Per chain: applied block hashes, and the mean and max seconds from the first commit of a
+    block number to its hash being applied.
+    """
+    commits = archive.table("CommitBlockHash", chain_id, ["chain_id", "number", "timestamp"])
+    applies = archive.table("ApplyBlockHash", chain_id, ["chain_id", "number", "timestamp"])
+    first = commits.group_by(["chain_id", "number"]).aggregate([("timestamp", "min")])
+    joined = applies.join(first, ["chain_id", "number"], join_type="inner")
+    joined = joined.append_column(
+        "latency", pc.subtract(joined["timestamp"], joined["timestamp_min"])
+    )
+    return (
+        joined.group_by("chain_id")
+        .aggregate([("latency", "count"), ("latency", "mean"), ("latency", "max")])
+        .rename_columns(["chain_id", "applied", "mean_latency", "max_latency"])
+    )
+
+
+def delayed_volume(archive, chain_id=None):
+    """
+    Per chain, bridge and week (unix timestamp of its start): delayed transfers and amount.
+    """
+    delayed = archive.table("Delayed", chain_id, ["chain_id", "address", "amount", "timestamp"])
+    delayed = delayed.append_column("week", _week(delayed))
+    return (
+        delayed.group_by(["chain_id", "address", "week"])
+        .aggregate([("amount", "count"), ("amount", "sum")])
+        .rename_columns(["chain_id", "address", "week", "transfers", "amount"])
+        .sort_by([("chain_id", "ascending"), ("week", "ascending")])
+    )
+
+
+def gauge_types(archive, chain_id=None):
+    """
+    Per chain, week and gauge type: gauge types proven, and distinct gauges among them.
+    """
+    proven = archive.table("SetGaugeType", chain_id, ["chain_id", "gauge", "type", "timestamp"])
+    proven = proven.append_column("week", _week(proven))
+    return (
+        proven.group_by(["chain_id", "week", "type"])
+        .aggregate([("gauge", "count"), ("gauge", "count_distinct")])
+        .rename_columns(["chain_id", "week", "type", "proven", "gauges"])
+        .sort_by([("chain_id", "ascending"), ("week", "ascending"), ("type", "ascending")])
+    )
+
+
+def main():
+    archive = EventArchive()
+    for chain_id, url in NETWORKS.items():
+        web3 = Web3(HTTPProvider(url))
+        written = archive.export(web3, chain_id)
+        print(f"{chain_id}: {written}")
+    report(archive)
+
+
+def _fmt(value):
+    return "0x" + value.hex() if isinstance(value, bytes) else str(value)
+
+
+def report(archive):
+    for title, query in [
+        ("Committer latency", commit_latency),
+        ("Apply latency", apply_latency),
+        ("Delayed volume per week", delayed_volume),
+        ("Gauge types proven per week", gauge_types),
+    ]:
+        table = query(archive)
+        print(f"\n{title}")
+        print("  ".join(f"{name:>14}" for name in table.column_names))
+        for row in table.to_pylist():
+            print("  ".join(f"{_fmt(value):>14}" for value in row.values()))
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["report"]:
+        report(EventArchive())
+    else:
+        main()
@@ -0,0 +1,456 @@
+import json
+import os
+import random
+import sys
+
+import eth_abi
+from eth_utils import keccak
+from web3 import Web3
+
+from scripts.mpt_trie import Trie
+from scripts.mpt_verifier import ProofError, ProofVerifier
+from scripts.receipt_proof import ReceiptTrie, receipt_key
+from scripts.registry import ROOT
+from scripts.rlp_encoding import encode_raw_list, encode_string, payload, split_list, to_bytes
+
+SEED = 1  # ALTER: cases are generated from it, keep it fixed so gas stays comparable between runs
+ROUNDS = 8  # ALTER: tries generated per case group
+BATCH_SIZE = 32  # cases per `verifyMany` call, well below the block gas limit
+BASELINE = os.path.join(os.path.dirname(__file__), "verifier_gas.json")  # regression table
+TOLERANCE = 0.0  # ALTER: relative gas increase of a row allowed before failing
+
+# compiling without brownie, see `compile_harness`
+HARNESS = os.path.join(ROOT, "contracts", "testing", "ProofVerifierHarness.sol")
+SOLC_VERSION = "0.8.18"
+RLP_REMAPPING = "hamdiallam/Solidity-RLP@2.0.7"
+SOLIDITY_RLP = os.environ.get(  # ALTER: checkout of the release, brownie installs it here
+    "SOLIDITY_RLP",
+    os.path.expanduser(os.path.join("~", ".brownie", "packages", *RLP_REMAPPING.split("/"))),
+)
+
+KIND_VALUE, KIND_ACCOUNT, KIND_SLOT, KIND_RECEIPT = range(4)
+KIND_NAMES = {
+    KIND_VALUE: "value",
+    KIND_ACCOUNT: "account",
+    KIND_SLOT: "slot",
+    KIND_RECEIPT: "receipt",
+}
+
+
+def _bytes(rng, length):
+    return bytes(rng.getrandbits(8) for _ in range(length))
+
+
+def _uint_rlp(value):
+    return encode_string(to_bytes(value, True))
+
+
+def _case(group, kind, root, stack, key=b"\x00" * 32, path=b""):
+    return {
+        "group": group,
+        "kind": kind,
+        "key": key,
+        "root": root,
+        "path": path,
+        "stack": list(stack),
+    }
+
+
+def _inclusion_and_exclusion(group, trie, present, absent):
+    for key in present:
+        yield _case(group, KIND_VALUE, trie.root, trie.proof(key), path=key)
+    for key in absent:
+        yield _case(f"{group}_exclusion", KIND_VALUE, trie.root, trie.proof(key), path=key)
+
+
+def random_tries(rng):
+    # storage-like tries of 32 byte keys, depth grows with the log16 of the size
+    for n in (1, 2, 16, 256, 4096):
+        for _ in range(max(ROUNDS // 4, 1)):
+            items = {
+                _bytes(rng, 32): _uint_rlp(rng.getrandbits(8 * rng.randint(1, 32)))
+                for _ in range(n)
+            }
+            trie = Trie(items.items())
+            present = rng.sample(sorted(items), min(n, 8))
+            absent = [_bytes(rng, 32) for _ in range(4)]
+            # same path as a stored key up to the last nibble: a divergent leaf
+            absent += [key[:-1] + bytes([key[-1] ^ 0x01]) for key in present[:4]]
+            yield from _inclusion_and_exclusion("random", trie, present, absent)
+
+
+def deep_tries(rng):
+    # key j leaves the all zero path at nibble j, a chain of `depth` branch nodes
+    for depth in (4, 8, 16, 32, 48, 63):
+        for _ in range(max(ROUNDS // 4, 1)):
+            keys = [bytes(32)]
+            for j in range(depth):
+                nibbles = "0" * j + rng.choice("123456789abcdef") + _bytes(rng, 32).hex()
+                keys.append(bytes.fromhex(nibbles[:64]))
+            items = {key: _bytes(rng, rng.randint(1, 64)) for key in keys}
+            trie = Trie(items.items())
+            absent = [bytes(31) + b"\x01", bytes.fromhex("0" * depth + "f" * (64 - depth))]
+            yield from _inclusion_and_exclusion("deep", trie, [bytes(32), keys[-1]], absent)
+
+
+def extension_tries(rng):
+    # groups of keys behind long shared prefixes, next to keys branching off at the root
+    for prefix_length in (2, 8, 24, 48, 60):
+        for _ in range(max(ROUNDS // 4, 1)):
+            prefix = _bytes(rng, 32).hex()[:prefix_length]
+            keys = [
+                bytes.fromhex((prefix + _bytes(rng, 32).hex())[:64])
+                for _ in range(rng.randint(2, 16))
+            ]
+            keys += [_bytes(rng, 32) for _ in range(rng.randint(0, 4))]
+            items = {key: _uint_rlp(rng.getrandbits(64)) for key in keys}
+            trie = Trie(items.items())
+            # diverging inside the shared prefix ends the proof at the extension node
+            diverging = bytes.fromhex(
+                (prefix[:-1] + ("0" if prefix[-1] != "0" else "1") + "0" * 64)[:64]
+            )
+            absent = [diverging, bytes.fromhex((prefix + "0" * 64)[:64])]
+            present = rng.sample(keys, min(len(keys), 4))
+            yield from _inclusion_and_exclusion("extension", trie, present, absent)
+
+
+def inline_tries(rng):
+    # short keys and values make nodes under 32 bytes, embedded into their parents
+    for n in (2, 4, 8, 16, 64):
+        for _ in range(max(ROUNDS // 4, 1)):
+            items = {
+                _bytes(rng, rng.randint(1, 2)): _bytes(rng, rng.randint(1, 4)) for _ in range(n)
+            }
+            trie = Trie(items.items())
+            present = rng.sample(sorted(items), min(len(items), 6))
+            absent = [_bytes(rng, rng.randint(1, 3)) for _ in range(4)]
+            absent = [key for key in absent if key not in items]
+            yield from _inclusion_and_exclusion("inline", trie, present, absent)
+
+
+def branch_value_tries(rng):
+    # keys that are prefixes of other keys keep their value in the 17th item of a branch
+    for _ in range(ROUNDS):
+        keys = [_bytes(rng, rng.randint(1, 4)) for _ in range(rng.randint(1, 6))]
+        keys += [
+            key + _bytes(rng, rng.randint(1, 28)) for key in keys for _ in range(rng.randint(1, 3))
+        ]
+        items = {key: _bytes(rng, rng.randint(1, 48)) for key in keys}
+        trie = Trie(items.items())
+        # a prefix ending at a branch without a value of its own, or running past a leaf
+        absent = [key[:-1] for key in keys if len(key) > 1 and key[:-1] not in items][:2]
+        absent += [key + b"\x00" for key in keys if key + b"\x00" not in items][:2]
+        present = rng.sample(keys, min(len(keys), 6))
+        yield from _inclusion_and_exclusion("branch_value", trie, present, absent)
+
+
+def state_tries(rng):
+    for n in (1, 64, 2048):
+        for _ in range(max(ROUNDS // 4, 1)):
+            storage = {
+                keccak(i.to_bytes(32, "big")): _uint_rlp(rng.getrandbits(8 * rng.randint(1, 32)))
+                for i in range(n)
+            }
+            storage_trie = Trie(storage.items())
+            for slot_hash in rng.sample(sorted(storage), min(n, 4)) + [keccak(b"missing")]:
+                proof = storage_trie.proof(slot_hash)
+                yield _case("slot", KIND_SLOT, storage_trie.root, proof, key=slot_hash)
+
+            state = {}
+            for _ in range(n):
+                account = [
+                    to_bytes(rng.randint(0, 10**6), True),
+                    to_bytes(rng.getrandbits(rng.choice((0, 64, 96))), True),
+                    rng.choice((storage_trie.root, _bytes(rng, 32))),
+                    _bytes(rng, 32),
+                ]
+                state[keccak(_bytes(rng, 20))] = encode_raw_list(
+                    [encode_string(f) for f in account]
+                )
+            state_trie = Trie(state.items())
+            for address_hash in rng.sample(sorted(state), min(n, 4)) + [keccak(b"missing")]:
+                proof = state_trie.proof(address_hash)
+                yield _case("account", KIND_ACCOUNT, state_trie.root, proof, key=address_hash)
+
+
+def _receipt(rng, cumulative_gas_used):
+    logs = [
+        {
+            "address": "0x" + _bytes(rng, 20).hex(),
+            "topics": ["0x" + _bytes(rng, 32).hex() for _ in range(rng.randint(0, 4))],
+            "data": "0x" + _bytes(rng, rng.choice((0, 32, 64, 320))).hex(),
+        }
+        for _ in range(rng.choice((0, 1, 1, 2, 4)))
+    ]
+    return {
+        "status": hex(rng.random() < 0.9),
+        "cumulativeGasUsed": hex(cumulative_gas_used),
+        "logsBloom": "0x" + _bytes(rng, 256).hex(),
+        "logs": logs,
+        "type": hex(rng.choice((0, 2))),
+    }
+
+
+def receipt_tries(rng):
+    for n in (1, 16, 128, 300):
+        for _ in range(max(ROUNDS // 4, 1)):
+            receipts = [_receipt(rng, 21_000 * (i + 1)) for i in range(n)]
+            trie = ReceiptTrie(receipts)
+            for index in rng.sample(range(n), min(n, 4)) + [n]:
+                key = index.to_bytes(32, "big")
+                yield _case("receipt", KIND_RECEIPT, trie.root, trie.proof(index), key=key)
+
+
+def tampered(rng, cases):
+    # adversarial variants of valid proofs, expected to revert with the same error
+    for case in cases:
+        stack = case["stack"]
+        if not stack:
+            continue
+        mutation = rng.choice(("root", "swap", "truncate", "extend", "flip"))
+        if mutation == "root":
+            yield {**case, "group": "tampered_root", "root": keccak(case["root"])}
+        elif mutation == "swap" and len(stack) > 1:
+            i = rng.randrange(1, len(stack))
+            yield {
+                **case,
+                "group": "tampered_swap",
+                "stack": stack[:i] + [stack[i - 1]] + stack[i + 1 :],
+            }
+        elif mutation == "truncate" and len(stack) > 1:
+            yield {**case, "group": "tampered_truncate", "stack": stack[:-1]}
+        elif mutation == "extend":
+            yield {**case, "group": "tampered_extend", "stack": stack + [stack[-1]]}
+        elif mutation == "flip":
+            node = bytearray(stack[-1])
+            node[-1] ^= 0x01
+            yield {**case, "group": "tampered_flip", "stack": stack[:-1] + [bytes(node)]}
+
+
+GENERATORS = (
+    random_tries,
+    deep_tries,
+    extension_tries,
+    inline_tries,
+    branch_value_tries,
+    state_tries,
+    receipt_tries,
+)
+
+
+def generate(seed=SEED):
+    rng = random.Random(seed)
+    cases = []
+    for generator in GENERATORS:
+        cases.extend(generator(rng))
+    cases.extend(tampered(rng, rng.sample(cases, len(cases) // 4)))
+    return cases
+
+
+def _receipt_result(receipt_rlp):
+    if len(receipt_rlp) == 0:
+        return eth_abi.encode(["bool", "uint256", "bytes32", "uint256"], [False, 0, keccak(b""), 0])
+    if receipt_rlp[0] <= 0x7F:
+        receipt_rlp = receipt_rlp[1:]
+    status, cumulative_gas_used, bloom, logs = split_list(receipt_rlp)
+    return eth_abi.encode(
+        ["bool", "uint256", "bytes32", "uint256"],
+        [
+            status not in (b"\x80", b"\x00"),  # RLPReader.toBoolean
+            int.from_bytes(payload(cumulative_gas_used), "big"),
+            keccak(payload(bloom)),
+            len(split_list(logs)),
+        ],
+    )
+
+
+def expected(case, verifier):
+    """
+    What `ProofVerifierHarness.verify` has to return for `case`: (True, abi encoded result)
+    or (False, revert data), with None standing for a revert without a known error.
+    """
+    kind, stack = case["kind"], case["stack"]
+    try:
+        if kind == KIND_VALUE:
+            return True, verifier.extract_proof_value(case["root"], case["path"], stack)
+        if kind == KIND_ACCOUNT:
+            account = verifier.extract_account(case["key"], case["root"], stack)
+            return True, eth_abi.encode(
+                ["bool", "uint256", "uint256", "bytes32", "bytes32"], list(account)
+            )
+        if kind == KIND_SLOT:
+            value = verifier.extract_slot_value(case["key"], case["root"], stack)
+            return True, eth_abi.encode(["bool", "uint256"], list(value))
+        index = int.from_bytes(case["key"], "big")
+        return True, _receipt_result(
+            verifier.extract_proof_value(case["root"], receipt_key(index), stack)
+        )
+    except ProofError as e:
+        return False, keccak(text=f"{type(e).__name__}()")[:4]
+    except (ValueError, IndexError):
+        return False, None
+
+
+def row_key(case):
+    # proof depth and the largest node rounded up to a power of two
+    size = max((len(node) for node in case["stack"]), default=0)
+    bucket = max(32, 1 << (size - 1).bit_length())
+    return f"{case['group']}/{KIND_NAMES[case['kind']]}/depth={len(case['stack'])}/node<={bucket}"
+
+
+def run(harness, cases, batch_size=BATCH_SIZE):
+    results = []
+    for i in range(0, len(cases), batch_size):
+        batch = cases[i : i + batch_size]
+        results.extend(
+            harness.verifyMany(
+                [
+                    (c["kind"], c["key"], c["root"], c["path"], encode_raw_list(c["stack"]))
+                    for c in batch
+                ]
+            )
+        )
+    return [(success, bytes(data), gas_used) for success, data, gas_used in results]
+
+
+def check(cases, results):
+    verifier = ProofVerifier()
+    mismatches, table = [], {}
+    for case, (success, data, gas_used) in zip(cases, results):
+        want_success, want_data = expected(case, verifier)
+        if success != want_success or (want_data is not None and data != want_data):
+            mismatches.append((case, (success, data), (want_success, want_data)))
+        if success:
+            row = table.setdefault(row_key(case), {"cases": 0, "total": 0, "max": 0})
+            row["cases"] += 1
+            row["total"] += gas_used
+            row["max"] = max(row["max"], gas_used)
+    for key, row in table.items():
+        table[key] = {
+            "cases": row["cases"],
+            "mean": row["total"] // row["cases"],
+            "max": row["max"],
+        }
+    return mismatches, table
+
+
+def compare(table, baseline, tolerance=TOLERANCE):
+    """
+    Print the gas table next to the baseline and return the rows that got more expensive.
+    """
+    regressions = []
+    print(f"{'case':72} {'cases':>5} {'mean':>9} {'max':>9} {'baseline':>9} {'change':>8}")
+    for key in sorted(table):
+        row, base = table[key], baseline.get(key)
+        change = ""
+        if base is not None:
+            change = f"{row['mean'] / base['mean'] - 1:+.2%}"
+            limit = 1 + tolerance
+            if row["mean"] > base["mean"] * limit or row["max"] > base["max"] * limit:
+                regressions.append(key)
+                change += " !"
+        base_mean = base["mean"] if base else "-"
+        print(
+            f"{key:72} {row['cases']:5} {row['mean']:9} {row['max']:9} {base_mean:>9} {change:>8}"
+        )
+    return regressions
+
+
+def fuzz(harness, update=False, baseline_path=BASELINE):
+    """
+    Run every generated case through `harness`, compare the results with the Python verifier
+    and the gas with the baseline. Return True when both agree. A missing baseline fails the
+    run unless `update` is set, which (re)writes it from the gas measured here.
+    """
+    cases = generate()
+    print(f"Verifying {len(cases)} proofs")
+    mismatches, table = check(cases, run(harness, cases))
+
+    for case, got, want in mismatches[:20]:
+        print(f"MISMATCH {row_key(case)}: harness {got}, python {want}")
+
+    baseline = {}
+    if os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+    regressions = compare(table, baseline)
+
+    if update:
+        with open(baseline_path, "w") as f:
+            json.dump(table, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"Wrote {len(table)} rows to {baseline_path}")
+        regressions = []
+    elif not baseline:
+        print(
+            f"No baseline at {baseline_path}, create it with `brownie run fuzz_verifiers update`"
+            " or `python -m scripts.fuzz_verifiers update`"
+        )
+        return False
+
+    if mismatches or regressions:
+        print(f"{len(mismatches)} mismatches, {len(regressions)} gas regressions")
+        return False
+    return True
+
+
+def compile_harness(solidity_rlp=SOLIDITY_RLP):
+    """
+    (abi, bytecode) of ProofVerifierHarness compiled through py-solc-x with brownie's settings
+    (optimizer on, 200 runs), to run the fuzzer without brownie.
+    """
+    import solcx
+
+    output = solcx.compile_files(
+        [HARNESS],
+        output_values=["abi", "bin"],
+        import_remappings={RLP_REMAPPING: solidity_rlp},
+        allow_paths=[os.path.join(ROOT, "contracts"), solidity_rlp],
+        optimize=True,
+        optimize_runs=200,
+        solc_version=SOLC_VERSION,
+    )
+    harness = next(value for key, value in output.items() if key.endswith(":ProofVerifierHarness"))
+    return harness["abi"], harness["bin"]
+
+
+class LocalHarness:
+    """
+    ProofVerifierHarness deployed to an in-process eth-tester chain.
+    """
+
+    def __init__(self, abi, bytecode):
+        from eth_tester import EthereumTester
+
+        self.web3 = Web3(Web3.EthereumTesterProvider(EthereumTester()))
+        deployer = self.web3.eth.accounts[0]
+        tx_hash = (
+            self.web3.eth.contract(abi=abi, bytecode=bytecode)
+            .constructor()
+            .transact({"from": deployer})
+        )
+        address = self.web3.eth.wait_for_transaction_receipt(tx_hash)["contractAddress"]
+        self.contract = self.web3.eth.contract(address=address, abi=abi)
+        self.gas = self.web3.eth.get_block("latest")["gasLimit"]
+
+    def verifyMany(self, cases):
+        return self.contract.functions.verifyMany(cases).call({"gas": self.gas})
+
+
+def main(update=False, baseline_path=BASELINE):
+    from brownie import ProofVerifierHarness, accounts
+
+    harness = ProofVerifierHarness.deploy({"from": accounts[0]})
+    if not fuzz(harness, update, baseline_path):
+        sys.exit(1)
+
+
+def update():
+    # accept the current gas as the new baseline: `brownie run fuzz_verifiers update`
+    main(update=True)
+
+
+if __name__ == "__main__":
+    # without brownie: `python -m scripts.fuzz_verifiers [update]`
+    harness = LocalHarness(*compile_harness())
+    sys.exit(0 if fuzz(harness, update="update" in sys.argv[1:]) else 1)
@@ -0,0 +1,157 @@
+import json
+import os
+
+from hexbytes import HexBytes
+
+from scripts.rlp_encoding import split_list
+
+MODEL_PATH = os.path.join(os.path.dirname(__file__), "gas_model.json")
+
+TX_BASE_GAS = 21_000
+MARGIN = 1.2
+
+# execution gas per feature, excluding the intrinsic and calldata cost which are computed
+# exactly. these are rough starting points, good enough to compare payloads with each other
+# but not for gas limits: `estimate` only predicts kinds `calibrate_gas` fitted against the
+# contracts and wrote to `gas_model.json`
+COEFFICIENTS = {
+    # BlockHashOracle.apply: one `commitments` lookup per committer, then a fresh SSTORE
+    "apply": {"const": 32_000, "committers": 4_600},
+    # MerklePatriciaProofVerifier based verifiers: hashing and RLP parsing of every node,
+    # quadratic memory expansion, one slot extraction (and oracle write) per storage proof
+    "gauge_type": {
+        "const": 35_000,
+        "header_bytes": 12,
+        "proof_nodes": 2_500,
+        "proof_bytes": 28,
+        "proof_words_sq": 1,
+        "storage_proofs": 31_000,
+    },
+}
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def load(path=MODEL_PATH):
+    coefficients = {kind: dict(values) for kind, values in COEFFICIENTS.items()}
+    for kind, values in _read(path).items():
+        coefficients.setdefault(kind, {}).update(values)
+    return coefficients
+
+
+_models = {}  # path -> ((mtime, size), coefficients, calibrated kinds)
+
+
+def _model(path):
+    # reloaded whenever `calibrate_gas` rewrites the file, a running keeper picks it up
+    stat = os.stat(path) if os.path.exists(path) else None
+    key = stat and (stat.st_mtime_ns, stat.st_size)
+    if path not in _models or _models[path][0] != key:
+        _models[path] = (key, load(path), frozenset(_read(path)))
+    return _models[path]
+
+
+def calibrated(path=MODEL_PATH):
+    """
+    Kinds with coefficients fitted by `calibrate_gas` in the model at `path`.
+    """
+    return _model(path)[2]
+
+
+def save(fitted, path=MODEL_PATH):
+    """
+    Write the coefficients of the kinds in `fitted` to the model at `path`, keeping the other
+    kinds calibrated before. Only fitted kinds are written, a kind in the file counts as
+    calibrated.
+    """
+    model = {**_read(path), **fitted}
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(model, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp, path)
+    return model
+
+
+def calldata_gas(calldata):
+    calldata = HexBytes(calldata)
+    return calldata_gas_by_size(len(calldata), calldata.count(0))
+
+
+def calldata_gas_by_size(length, zeros):
+    return TX_BASE_GAS + 4 * zeros + 16 * (length - zeros)
+
+
+def apply_features(committers):
+    return {"const": 1, "committers": len(committers)}
+
+
+def proof_features(header_rlp, proof_rlp):
+    proofs = split_list(bytes(proof_rlp))
+    nodes = sum(len(split_list(proof)) for proof in proofs)
+    words = (len(header_rlp) + len(proof_rlp) + 31) // 32
+    return {
+        "const": 1,
+        "header_bytes": len(header_rlp),
+        "proof_nodes": nodes,
+        "proof_bytes": len(proof_rlp),
+        # memory expansion grows with words ** 2 / 512, decoded nodes are copied again
+        "proof_words_sq": (2 * words) ** 2 // 512,
+        "storage_proofs": len(proofs) - 1,
+    }
+
+
+def execution_gas(kind, features, coefficients=None):
+    coefficients = (coefficients or _model(MODEL_PATH)[1])[kind]
+    return int(sum(coefficients.get(name, 0) * value for name, value in features.items()))
+
+
+def predict(kind, calldata, features, coefficients=None):
+    return calldata_gas(calldata) + execution_gas(kind, features, coefficients)
+
+
+def estimate(func, kind, features, margin=MARGIN, coefficients=None):
+    """
+    Gas limit for a contract call predicted from its payload instead of `eth_estimateGas`.
+    Returns None unless `kind` is calibrated (or `coefficients` are given), which leaves the
+    call to `func.estimate_gas` in `TransactionSender.submit`.
+    """
+    if coefficients is None and kind not in calibrated(MODEL_PATH):
+        return None
+    return int(margin * predict(kind, func._encode_transaction_data(), features, coefficients))
+
+
+def fit(samples):
+    """
+    Least squares fit of execution gas against features, `samples` being a list of
+    (features, execution_gas) pairs. Returns the coefficients by feature name.
+    """
+    names = sorted({name for features, _ in samples for name in features})
+    n = len(names)
+    # normal equations (X^T X) b = X^T y, solved by Gaussian elimination
+    matrix = [[0.0] * (n + 1) for _ in range(n)]
+    for features, gas in samples:
+        row = [features.get(name, 0) for name in names]
+        for i in range(n):
+            for j in range(n):
+                matrix[i][j] += row[i] * row[j]
+            matrix[i][n] += row[i] * gas
+
+    for col in range(n):
+        pivot = max(range(col, n), key=lambda r: abs(matrix[r][col]))
+        if matrix[pivot][col] == 0:
+            continue  # feature never varies, leave its coefficient at 0
+        matrix[col], matrix[pivot] = matrix[pivot], matrix[col]
+        for r in range(n):
+            if r != col and matrix[r][col] != 0:
+                factor = matrix[r][col] / matrix[col][col]
+                matrix[r] = [a - factor * b for a, b in zip(matrix[r], matrix[col])]
+
+    return {
+        name: (matrix[i][n] / matrix[i][i] if matrix[i][i] else 0.0) for i, name in enumerate(names)
+    }
@@ -0,0 +1,181 @@
+import bisect
+import os
+
+from eth_utils import keccak
+from web3 import HTTPProvider, Web3
+
+from scripts.log_scanner import LogScanner
+from scripts.mpt_verifier import ProofError, parse_block_header
+from scripts.proof_cache import ProofCache
+from scripts.registry import registry
+from scripts.rlp_encoding import encode_raw_list, payload, serialize_block, split_list
+
+ETH_NETWORK = (  # ALTER
+    "https://eth-mainnet.alchemyapi.io/v2/"
+    f"{os.environ.get('WEB3_ETHEREUM_MAINNET_ALCHEMY_API_KEY')}"
+)
+CHAIN = "avalanche"  # ALTER: a network of `deployments/`
+NETWORK = registry.rpc(CHAIN)
+BLOCK_HASH_ORACLE = registry.address(CHAIN, "block_hash_oracle")
+CHECKPOINT = f"anchors-{BLOCK_HASH_ORACLE}.json"  # ALTER: local store of applied block hashes
+
+# every header in a chain costs ~600 bytes of calldata, past this many headers it is cheaper to
+# transmit a fresh block hash than to prove down from an applied one
+MAX_LENGTH = 128  # ALTER
+LOOKBACK = 7 * 86400 // 2  # sidechain blocks to look back for applied block hashes
+
+HEADER_PARENT_HASH_INDEX = 0
+
+BLOCK_HASH_ORACLE_ABI = registry.abi("BlockHashOracle")
+
+
+def candidates(block_number, anchors, max_length=MAX_LENGTH):
+    """
+    The applied block numbers at most `max_length` headers above `block_number`, shortest
+    chain first. `anchors` is a sorted list of applied block numbers.
+    """
+    lo = bisect.bisect_left(anchors, block_number)
+    hi = bisect.bisect_left(anchors, block_number + max_length, lo)
+    return anchors[lo:hi]
+
+
+def best_anchor(block_number, anchors, max_length=MAX_LENGTH):
+    # the first candidate, None when every anchor is further than `max_length` headers away
+    found = candidates(block_number, anchors, max_length)
+    return found[0] if found else None
+
+
+def plan(block_numbers, anchors, max_length=MAX_LENGTH):
+    # block number -> candidate anchors, targets sharing an anchor share the headers fetched
+    anchors = sorted(anchors)
+    return {number: candidates(number, anchors, max_length) for number in block_numbers}
+
+
+def verify_chain(chain_rlp, anchor_hash):
+    """
+    Walk a chain produced by `HeaderChainProver.prove` from the trusted anchor down, checking
+    each `parentHash` link. Returns the header of the oldest block, the one being proven.
+    """
+    headers = split_list(bytes(chain_rlp))
+    if len(headers) == 0:
+        raise ValueError("Empty header chain")
+
+    expected, number = anchor_hash, None
+    for header in headers:
+        if keccak(header) != expected:
+            raise ValueError(f"Broken header chain below block {number}")
+        parsed = parse_block_header(header)
+        if number is not None and parsed["number"] != number - 1:
+            raise ValueError(f"Header {parsed['number']} does not follow {number}")
+        number = parsed["number"]
+        expected = payload(split_list(header)[HEADER_PARENT_HASH_INDEX])
+    return headers[-1]
+
+
+class HeaderChainProver:
+    """
+    Link an Ethereum block to a block hash already applied on the sidechain oracle through
+    the chain of headers between them, so a proof does not have to wait for its own block
+    hash to be transmitted.
+
+    Applied hashes are followed through `ApplyBlockHash` logs (resuming from `checkpoint`).
+    Headers come in concurrent batches through the on-disk `ProofCache`, so chains to the
+    same anchor, or overlapping ones, fetch every header once.
+    """
+
+    def __init__(
+        self,
+        eth_web3,
+        web3,
+        oracle=BLOCK_HASH_ORACLE,
+        checkpoint=CHECKPOINT,
+        max_length=MAX_LENGTH,
+        cache=None,
+    ):
+        if isinstance(oracle, str):
+            oracle = web3.eth.contract(address=oracle, abi=BLOCK_HASH_ORACLE_ABI)
+        self.eth_web3 = eth_web3
+        self.oracle = oracle
+        self.max_length = max_length
+        self.cache = cache or ProofCache()
+        self.eth_chain_id = eth_web3.eth.chain_id
+        self.scanner = LogScanner(
+            web3,
+            lambda lo, hi: oracle.events.ApplyBlockHash().get_logs(from_block=lo, to_block=hi),
+            lambda log: {"number": log["args"]["number"], "hash": Web3.to_hex(log["args"]["hash"])},
+            checkpoint,
+            lookback=LOOKBACK,
+        )
+        self.applied = {}
+
+    def anchors(self):
+        # a hash set again through `set_block_hash` fails the chain check, see `_chains`
+        self.applied = {r["number"]: bytes.fromhex(r["hash"][2:]) for r in self.scanner.scan()}
+        return self.applied
+
+    def _chains(self, targets):
+        """
+        Verified chains for `targets`, block number -> candidate anchors. An anchor whose chain
+        fails the check is dropped for every target, which fall back to their next candidate.
+        """
+        chains, bad = {}, set()
+        while True:
+            targets = {
+                number: [anchor for anchor in anchors if anchor not in bad]
+                for number, anchors in targets.items()
+                if number not in chains
+            }
+            targets = {number: anchors for number, anchors in targets.items() if anchors}
+            if not targets:
+                return chains
+
+            # every header of every chain in one bulk fetch, the cache keeps them for retries
+            numbers = sorted(
+                {n for number, anchors in targets.items() for n in range(number, anchors[0] + 1)}
+            )
+            fetched = self.cache.headers(self.eth_web3, self.eth_chain_id, numbers, serialize_block)
+            headers = dict(zip(numbers, fetched))
+
+            for number, anchors in targets.items():
+                anchor = anchors[0]
+                if anchor in bad:
+                    continue
+                chain_rlp = encode_raw_list([headers[n] for n in range(anchor, number - 1, -1)])
+                try:
+                    verify_chain(chain_rlp, self.applied[anchor])
+                except (ValueError, ProofError):
+                    bad.add(anchor)
+                    continue
+                chains[number] = (anchor, chain_rlp)
+
+    def prove(self, block_numbers, refresh=True):
+        """
+        Header chains for `block_numbers`, each from its best applied anchor down to the
+        block. Returns block number -> (anchor, chain_rlp), or None when no applied hash is
+        within `max_length` headers.
+        """
+        if refresh or not self.applied:
+            self.anchors()
+        chains = self._chains(plan(block_numbers, self.applied, self.max_length))
+        return {number: chains.get(number) for number in block_numbers}
+
+    def header(self, block_number):
+        # the proven header, for the state proofs built against it
+        anchor, chain_rlp = self.prove([block_number])[block_number] or (None, None)
+        if anchor is None:
+            return None
+        return verify_chain(chain_rlp, self.applied[anchor])
+
+
+if __name__ == "__main__":
+    eth_web3 = Web3(HTTPProvider(ETH_NETWORK))
+    web3 = Web3(HTTPProvider(NETWORK))
+    prover = HeaderChainProver(eth_web3, web3)
+    head = eth_web3.eth.block_number
+    for number, chain in prover.prove([head - 256]).items():
+        if chain is None:
+            print(f"{number}: no applied block hash within {prover.max_length} blocks")
+        else:
+            anchor, headers_rlp = chain
+            length = len(split_list(headers_rlp))
+            print(f"{number}: {length} headers to {anchor}, {len(headers_rlp)} bytes")
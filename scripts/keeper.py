@@ -0,0 +1,273 @@
+import signal
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from web3 import Web3
+from web3.middleware import ExtraDataToPOAMiddleware
+
+from scripts import gas_model, metrics
+from scripts.apply_blockhash import (
+    BLOCKHASH_ORACLE,
+    BLOCKHASH_ORACLE_ABI,
+    CHECKPOINT,
+    NETWORK,
+    POA,
+    _decode_commit,
+    account_load_pkey,
+)
+from scripts.log_scanner import LogScanner
+from scripts.status_query import oracle_status
+from scripts.tx_sender import TransactionSender
+
+MAX_COMMITTERS = 32
+LOOKBACK = 86400 // 12  # assume 12sec block is max, look over last day
+
+
+def connect(network=NETWORK, poa=POA, pool_size=8):
+    # one keep-alive session for the whole process, sized for the concurrent log scans
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    web3 = Web3(Web3.HTTPProvider(network, session=session, request_kwargs={"timeout": 30}))
+    if poa:
+        web3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    return metrics.instrument(web3)
+
+
+class BlockHashKeeper:
+    """
+    Resident counterpart of `apply_blockhash`: follow the oracle block by block and apply a
+    block hash as soon as enough committers agree on it.
+
+    The last day of commits is scanned once on start (resuming from `checkpoint`), after that
+    every new block costs a single `eth_getLogs` over the oracle. Commits, applications and
+    threshold changes are tracked in memory; the checkpoint is written every `save_interval`
+    seconds so a restart only rescans what it missed. Block numbers stay pending until an
+    apply of them went out, one failing apply does not hold back the others or the block
+    cursor, and a reorg below the last polled block rescans from the checkpoint.
+    """
+
+    def __init__(
+        self,
+        web3,
+        signer,
+        oracle=BLOCKHASH_ORACLE,
+        checkpoint=CHECKPOINT,
+        poll_interval=2,
+        save_interval=60,
+        confirmations=0,
+        log=False,
+    ):
+        if isinstance(oracle, str):
+            oracle = web3.eth.contract(address=oracle, abi=BLOCKHASH_ORACLE_ABI)
+        self.web3 = web3
+        self.oracle = oracle
+        self.poll_interval = poll_interval
+        self.save_interval = save_interval
+        self.confirmations = confirmations
+        self.log = log
+
+        self.scanner = LogScanner(
+            web3,
+            lambda lo, hi: oracle.events.CommitBlockHash().get_logs(from_block=lo, to_block=hi),
+            _decode_commit,
+            checkpoint,
+            lookback=LOOKBACK,
+        )
+        self.sender = TransactionSender(web3, signer)
+        events = (
+            oracle.events.CommitBlockHash,
+            oracle.events.ApplyBlockHash,
+            oracle.events.SetThreshold,
+        )
+        self.events = {event.topic: event for event in events}
+
+        self.block = None
+        self.block_hash = None
+        self.records = []
+        self.seen = set()  # (block, committer, number, hash) of every record
+        self.pending = set()  # numbers with new commits or a new threshold, not tried yet
+        self.commitments = {}  # number -> {committer: hash}, the latest commit of each committer
+        self.threshold = None
+        self.applied = set()
+        self.submitted = {}  # nonce -> (number, hash)
+        self.saved = time.time()
+        self.running = False
+
+    def _print(self, message):
+        if self.log:
+            print(message, flush=True)
+
+    def _commit(self, record):
+        key = (record["block"], record["committer"], record["number"], record["hash"])
+        if key not in self.seen:
+            # logs of a poll which failed half way are fetched again by the next one
+            self.seen.add(key)
+            self.records.append(record)
+        self.commitments.setdefault(record["number"], {})[record["committer"]] = record["hash"]
+        return record["number"]
+
+    def _apply_pending(self):
+        for number in sorted(self.pending):
+            try:
+                self.try_apply(number)
+            except Exception as e:
+                # stays pending for the next poll, the numbers after it are still tried
+                self._print(f"Apply of {number} failed: {e!r}")
+                metrics.inc("apply_failures_total")
+                continue
+            self.pending.discard(number)
+
+    def bootstrap(self, head=None):
+        if head is None:
+            head = max(self.web3.eth.block_number - self.confirmations, 0)
+        self.records, self.seen, self.commitments = [], set(), {}
+        for record in self.scanner.scan(head):
+            self._commit(record)
+        block_hash = self.web3.eth.get_block(head)["hash"]
+
+        self.threshold, _, applied = oracle_status(self.web3, self.oracle, list(self.commitments))
+        self.applied = {number for number, is_applied in applied.items() if is_applied}
+        # only a complete bootstrap moves the cursor, a failed one is run again by the next poll
+        self.block, self.block_hash = head, block_hash
+        commits, threshold = len(self.records), self.threshold
+        self._print(f"Bootstrapped at {head}: {commits} commits, threshold {threshold}")
+        self.pending = set(self.commitments)
+        self._apply_pending()
+
+    def save(self):
+        oldest = self.block - self.scanner.lookback
+        self.records = [r for r in self.records if r["block"] >= oldest]
+        self.seen = {(r["block"], r["committer"], r["number"], r["hash"]) for r in self.records}
+        self.commitments = {}
+        for record in self.records:
+            self.commitments.setdefault(record["number"], {})[record["committer"]] = record["hash"]
+        self.applied = {number for number in self.applied if number in self.commitments}
+        self.scanner.save({"block": self.block, "records": self.records})
+        self.saved = time.time()
+
+    def _handle(self, log):
+        event = self.events.get(Web3.to_hex(log["topics"][0])) if log["topics"] else None
+        if event is None:
+            return None
+        log = event().process_log(log)
+        if log["event"] == "CommitBlockHash":
+            record = _decode_commit(log)
+            record["block"] = log["blockNumber"]
+            return self._commit(record)
+        if log["event"] == "ApplyBlockHash":
+            self.applied.add(log["args"]["number"])
+        elif log["event"] == "SetThreshold":
+            self.threshold = log["args"]["threshold"]
+            return list(self.commitments)
+        return None
+
+    def try_apply(self, number):
+        in_flight = {n for n, _ in self.submitted.values()}
+        if number in self.applied or number in in_flight:
+            return None
+
+        by_hash = {}
+        for committer, block_hash in self.commitments.get(number, {}).items():
+            by_hash.setdefault(block_hash, []).append(committer)
+        for block_hash, committers in by_hash.items():
+            if len(committers) < self.threshold:
+                continue
+            committers = sorted(committers, key=lambda s: int(s, 16))[:MAX_COMMITTERS]
+            func = self.oracle.functions.apply(number, block_hash, committers)
+            gas = gas_model.estimate(func, "apply", gas_model.apply_features(committers))
+            self.sender.submit(func, gas=gas)
+            self.submitted[self.sender.nonce - 1] = (number, block_hash)
+            self._print(f"Applying {number}: {block_hash} by {len(committers)} committers")
+            return block_hash
+        return None
+
+    def _check_receipts(self):
+        self.sender.poll()
+        for nonce in [nonce for nonce in self.submitted if nonce in self.sender.receipts]:
+            number, block_hash = self.submitted.pop(nonce)
+            receipt = self.sender.receipts[nonce]
+            if receipt["status"] == 1:
+                self.applied.add(number)
+                if metrics.enabled():
+                    # the commits may have been pruned from the records by now
+                    blocks = [r["block"] for r in self.records if r["number"] == number]
+                    if blocks:
+                        delay = receipt["blockNumber"] - min(blocks)
+                        metrics.observe("commit_to_apply_blocks", delay, metrics.BLOCKS)
+                    metrics.observe("apply_gas_used", receipt["gasUsed"], metrics.GAS)
+            else:
+                # most likely raced by another keeper, otherwise it is tried again
+                tx_hash = Web3.to_hex(receipt["transactionHash"])
+                self._print(f"Apply of {number}: {block_hash} reverted in {tx_hash}")
+                self.pending.add(number)
+
+    def _reorged(self, head_block):
+        # one new block, the common case, needs no extra request
+        if head_block["number"] == self.block + 1:
+            return head_block["parentHash"] != self.block_hash
+        return self.web3.eth.get_block(self.block)["hash"] != self.block_hash
+
+    def poll(self):
+        head = self.web3.eth.block_number - self.confirmations
+        if head > self.block + self.scanner.window:
+            # fell behind (or was suspended), catch up through the concurrent scanner
+            self.save()
+            self.bootstrap(head)
+        elif head > self.block:
+            head_block = self.web3.eth.get_block(head)
+            if self._reorged(head_block):
+                # the scanner rescans the last `reorg_margin` blocks of the checkpoint
+                self._print(f"Block {self.block} was reorged, rescanning")
+                self.save()
+                self.bootstrap(head)
+            else:
+                logs = self.web3.eth.get_logs(
+                    {"address": self.oracle.address, "fromBlock": self.block + 1, "toBlock": head}
+                )
+                for log in logs:
+                    numbers = self._handle(log)
+                    if numbers is not None:
+                        self.pending.update(numbers if isinstance(numbers, list) else [numbers])
+                # failed applies stay pending, the logs are not fetched again for them
+                self.block, self.block_hash = head, head_block["hash"]
+                self._apply_pending()
+        else:
+            self._apply_pending()
+
+        self._check_receipts()
+        if time.time() - self.saved > self.save_interval:
+            self.save()
+
+    def stop(self, *args):
+        self.running = False
+
+    def run(self):
+        self.running = True
+        signal.signal(signal.SIGINT, self.stop)
+        signal.signal(signal.SIGTERM, self.stop)
+
+        while self.running:
+            started = time.time()
+            try:
+                if self.block is None:
+                    self.bootstrap()
+                else:
+                    self.poll()
+            except Exception as e:
+                # transient RPC failures should not kill the daemon, the next poll retries
+                self._print(f"Poll failed at {self.block}: {e!r}")
+            time.sleep(max(0, self.poll_interval - (time.time() - started)))
+
+        if self.block is not None:
+            self.save()
+        self._print(f"Stopped at {self.block}, sender stats: {self.sender.stats()}")
+
+
+if __name__ == "__main__":
+    metrics.enable_from_env()
+    web3 = connect()
+    signer = account_load_pkey("keeper")  # ALTER
+    BlockHashKeeper(web3, signer, log=True).run()
@@ -0,0 +1,117 @@
+import json
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+# substrings providers use when a `get_logs` range returns too much data
+TOO_MANY_RESULTS = (
+    "too many",
+    "limit exceeded",
+    "more than",
+    "response size",
+    "block range",
+    "query timeout",
+)
+
+
+def _is_too_many_results(exc):
+    message = str(exc).lower()
+    return any(s in message for s in TOO_MANY_RESULTS)
+
+
+class LogScanner:
+    """
+    Scan a block range for logs in concurrent windows and keep a checkpoint on disk.
+
+    `fetch(from_block, to_block)` returns the logs of an inclusive range and `decode(log)`
+    turns a log into a JSON-serializable dict (or None to drop it). Every stored record
+    carries the number of the block it was emitted in, so records from the last
+    `reorg_margin` blocks can be dropped and scanned again on the next run.
+    """
+
+    def __init__(
+        self,
+        web3,
+        fetch,
+        decode,
+        path,
+        lookback=86400 // 12,
+        window=1024,
+        min_window=16,
+        max_in_flight=4,
+        reorg_margin=64,
+    ):
+        self.web3 = web3
+        self.fetch = fetch
+        self.decode = decode
+        self.path = path
+        self.lookback = lookback
+        self.window = window
+        self.min_window = min_window
+        self.max_in_flight = max_in_flight
+        self.reorg_margin = reorg_margin
+
+    def load(self):
+        if self.path is None or not os.path.exists(self.path):
+            return {"block": None, "records": []}
+        with open(self.path) as f:
+            return json.load(f)
+
+    def save(self, state):
+        if self.path is None:
+            return
+        tmp = f"{self.path}.tmp"
+        with open(tmp, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp, self.path)
+
+    def _fetch_range(self, from_block, to_block):
+        try:
+            logs = self.fetch(from_block, to_block)
+        except Exception as e:
+            if not _is_too_many_results(e) or to_block - from_block + 1 <= self.min_window:
+                raise
+            # split this range in half and shrink the window for ranges not requested yet
+            middle = (from_block + to_block) // 2
+            self.window = max(self.min_window, min(self.window, middle - from_block + 1))
+            return self._fetch_range(from_block, middle) + self._fetch_range(middle + 1, to_block)
+
+        records = []
+        for log in logs:
+            record = self.decode(log)
+            if record is not None:
+                record["block"] = log["blockNumber"]
+                records.append(record)
+        return records
+
+    def scan(self, head=None):
+        if head is None:
+            head = self.web3.eth.block_number
+        state = self.load()
+
+        oldest = max(head - self.lookback, 0)
+        start = oldest
+        if state["block"] is not None:
+            start = max(state["block"] + 1 - self.reorg_margin, oldest)
+
+        # drop records which fell out of the lookback or are about to be scanned again
+        records = [r for r in state["records"] if oldest <= r["block"] < start]
+
+        # ranges are cut as they are submitted, so a window shrunk by a range which returned
+        # too many results applies to every range not requested yet
+        chunks = {}
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            in_flight = {}
+            lo = start
+            while lo <= head or in_flight:
+                while lo <= head and len(in_flight) < self.max_in_flight:
+                    hi = min(lo + self.window - 1, head)
+                    in_flight[executor.submit(self._fetch_range, lo, hi)] = lo
+                    lo = hi + 1
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    chunks[in_flight.pop(future)] = future.result()
+        for key in sorted(chunks):
+            records.extend(chunks[key])
+
+        self.save({"block": head, "records": records})
+        return records
@@ -0,0 +1,231 @@
+import atexit
+import functools
+import json
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT_ENV = "XDAO_METRICS_PORT"  # serve Prometheus metrics on this local port
+SUMMARY_ENV = "XDAO_METRICS_SUMMARY"  # write a JSON summary to this path on exit
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+GAS = (50_000, 100_000, 200_000, 400_000, 800_000, 1_600_000, 3_200_000, 6_400_000)
+BLOCKS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+
+class Registry:
+    """
+    Counters and histograms keyed by (name, labels), rendered in the Prometheus text format.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.counters = {}
+        self.histograms = {}  # key -> [buckets, counts, sum, count]
+
+    def inc(self, name, value, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, value, buckets, labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [buckets, [0] * len(buckets), 0, 0]
+            for i, bound in enumerate(histogram[0]):
+                if value <= bound:
+                    histogram[1][i] += 1
+            histogram[2] += value
+            histogram[3] += 1
+
+    def render(self):
+        def fmt(labels, **extra):
+            pairs = [*labels, *extra.items()]
+            return "{" + ",".join(f'{k}="{v}"' for k, v in pairs) + "}" if pairs else ""
+
+        lines = []
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                lines.append(f"xdao_{name}{fmt(labels)} {value}")
+            for (name, labels), (buckets, counts, total, count) in sorted(self.histograms.items()):
+                for bound, bucket_count in zip(buckets, counts):
+                    lines.append(f"xdao_{name}_bucket{fmt(labels, le=bound)} {bucket_count}")
+                lines.append(f"xdao_{name}_bucket{fmt(labels, le='+Inf')} {count}")
+                lines.append(f"xdao_{name}_sum{fmt(labels)} {total}")
+                lines.append(f"xdao_{name}_count{fmt(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        def key(name, labels):
+            return name + "".join(f",{k}={v}" for k, v in labels)
+
+        with self.lock:
+            return {
+                "elapsed": time.time() - self.started,
+                "counters": {key(*k): v for k, v in sorted(self.counters.items())},
+                "histograms": {
+                    key(*k): {"count": count, "sum": total, "mean": total / count if count else 0}
+                    for k, (_, _, total, count) in sorted(self.histograms.items())
+                },
+            }
+
+
+_registry = None  # None while disabled, every hook checks this once and returns
+
+
+def enabled():
+    return _registry is not None
+
+
+def inc(name, value=1, **labels):
+    if _registry is not None:
+        _registry.inc(name, value, labels)
+
+
+def observe(name, value, buckets=SECONDS, **labels):
+    if _registry is not None:
+        _registry.observe(name, value, buckets, labels)
+
+
+class _Span:
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        observe(f"{self.name}_seconds", time.perf_counter() - self.started, **self.labels)
+
+
+_NOOP = nullcontext()
+
+
+def span(name, **labels):
+    return _NOOP if _registry is None else _Span(name, labels)
+
+
+def timed(name=None):
+    """
+    Time every call of the decorated function as a `<name>_seconds` histogram.
+    """
+
+    def decorator(func):
+        span_name = name or func.__name__.lstrip("_")
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _registry is None:
+                return func(*args, **kwargs)
+            with _Span(span_name, {}):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument(web3):
+    """
+    Count the RPC calls of `web3` by method, with their latency and bytes on the wire.
+    Leaves the provider untouched while metrics are disabled, and instruments it only once.
+    """
+    provider = web3.provider
+    if _registry is None or getattr(provider, "_instrumented", False):
+        return web3
+    make_request, make_batch_request = provider.make_request, provider.make_batch_request
+    encode, encode_batch = provider.encode_rpc_request, provider.encode_batch_rpc_request
+    decode = provider.decode_rpc_response
+    batching = threading.local()
+
+    def instrumented_make_request(method, params):
+        inc("rpc_requests_total", method=method)
+        with _Span("rpc", {"method": method}):
+            return make_request(method, params)
+
+    def instrumented_make_batch_request(batch_requests):
+        for method, _ in batch_requests:
+            inc("rpc_requests_total", method=method)
+        with _Span("rpc", {"method": "batch"}):
+            return make_batch_request(batch_requests)
+
+    def instrumented_encode(method, params):
+        request = encode(method, params)
+        if not getattr(batching, "active", False):
+            inc("rpc_sent_bytes_total", len(request))
+        return request
+
+    def instrumented_encode_batch(requests):
+        # the whole body is counted once, whether or not it is built from `encode_rpc_request`
+        batching.active = True
+        try:
+            request = encode_batch(requests)
+        finally:
+            batching.active = False
+        inc("rpc_sent_bytes_total", len(request))
+        return request
+
+    def instrumented_decode(raw_response):
+        inc("rpc_received_bytes_total", len(raw_response))
+        return decode(raw_response)
+
+    provider.make_request = instrumented_make_request
+    provider.make_batch_request = instrumented_make_batch_request
+    provider.encode_rpc_request = instrumented_encode
+    provider.encode_batch_rpc_request = instrumented_encode_batch
+    provider.decode_rpc_response = instrumented_decode
+    provider._instrumented = True
+    return web3
+
+
+def write_summary(path):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(_registry.summary(), f, indent=2)
+    os.replace(tmp, path)
+
+
+def serve(port, host="127.0.0.1"):
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            body = _registry.render().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def enable(port=None, summary=None):
+    """
+    Start collecting, optionally serving `/metrics` on a local `port` and writing a JSON
+    run summary to `summary` on exit.
+    """
+    global _registry
+    if _registry is None:
+        _registry = Registry()
+    if port is not None:
+        serve(port)
+    if summary is not None:
+        atexit.register(write_summary, summary)
+    return _registry
+
+
+def enable_from_env():
+    port, summary = os.environ.get(PORT_ENV), os.environ.get(SUMMARY_ENV)
+    if port or summary:
+        enable(int(port) if port else None, summary)
@@ -0,0 +1,106 @@
+from eth_utils import keccak
+
+from scripts.mpt_verifier import EMPTY_TRIE_ROOT, _compact_decode
+from scripts.rlp_encoding import (
+    encode_list,
+    encode_raw_list,
+    encode_string,
+    is_list,
+    payload,
+    split_list,
+)
+
+
+def _compact_encode(nibbles, is_leaf):
+    flag = 2 if is_leaf else 0
+    if len(nibbles) % 2:
+        return bytes([(flag + 1) << 4 | int(nibbles[0], 16)]) + bytes.fromhex(nibbles[1:])
+    return bytes([flag << 4]) + bytes.fromhex(nibbles)
+
+
+class Trie:
+    """
+    In-memory Merkle-Patricia trie of `(key, value)` byte pairs.
+
+    The trie is built once from the sorted keys, every node hashed exactly once, and kept
+    as a hash -> node map. A proof is then a walk from the root, so proving every key costs
+    O(n log n) instead of rebuilding the trie for each one. Keys may be prefixes of other
+    keys (their values sit in branch nodes), values must not be empty.
+    """
+
+    def __init__(self, items):
+        self.nodes = {}
+        items = sorted((bytes(key).hex(), bytes(value)) for key, value in items)
+        if items:
+            root = self._build(items, 0, len(items), 0)
+            self.root = keccak(root)
+            self.nodes[self.root] = root
+        else:
+            self.root = EMPTY_TRIE_ROOT
+
+    def _ref(self, node):
+        # nodes shorter than a hash are embedded into their parent
+        if len(node) < 32:
+            return node
+        node_hash = keccak(node)
+        self.nodes[node_hash] = node
+        return encode_string(node_hash)
+
+    def _build(self, items, lo, hi, depth):
+        if hi - lo == 1:
+            key, value = items[lo]
+            return encode_list([_compact_encode(key[depth:], True), value])
+
+        # keys are sorted, the first and the last share the prefix of all of them
+        first, last = items[lo][0], items[hi - 1][0]
+        end = depth
+        while end < len(first) and end < len(last) and first[end] == last[end]:
+            end += 1
+        if end > depth:
+            branch = self._build(items, lo, hi, end)
+            return encode_raw_list(
+                [encode_string(_compact_encode(first[depth:end], False)), self._ref(branch)]
+            )
+
+        children = [b"\x80"] * 16
+        value = b""
+        if len(items[lo][0]) == depth:
+            value = items[lo][1]
+            lo += 1
+        while lo < hi:
+            nibble = items[lo][0][depth]
+            end = lo
+            while end < hi and items[end][0][depth] == nibble:
+                end += 1
+            children[int(nibble, 16)] = self._ref(self._build(items, lo, end, depth + 1))
+            lo = end
+        return encode_raw_list([*children, encode_string(value)])
+
+    def _resolve(self, reference):
+        return reference if is_list(reference) else self.nodes[payload(reference)]
+
+    def proof(self, key):
+        """
+        Nodes from the root down to `key`, the stack `extractProofValue` expects. For a key
+        not in the trie it is a proof of exclusion.
+        """
+        if self.root == EMPTY_TRIE_ROOT:
+            return []
+        path = bytes(key).hex()
+        offset = 0
+        node = self.nodes[self.root]
+        stack = [node]
+        while True:
+            fields = split_list(node)
+            if len(fields) == 17:
+                if offset == len(path) or fields[int(path[offset], 16)] == b"\x80":
+                    return stack
+                node = self._resolve(fields[int(path[offset], 16)])
+                offset += 1
+            else:
+                is_leaf, node_key = _compact_decode(payload(fields[0]))
+                if is_leaf or path[offset : offset + len(node_key)] != node_key:
+                    return stack
+                node = self._resolve(fields[1])
+                offset += len(node_key)
+            stack.append(node)
@@ -0,0 +1,297 @@
+from collections import namedtuple
+
+from eth_utils import keccak
+
+from scripts.rlp_encoding import is_list, payload, split_list, to_bytes
+
+# keccak256(0x80)
+EMPTY_TRIE_ROOT = bytes.fromhex("56e81f171bcc55a6ff8345e692c0f86e5b48e01b996cadc001622fb5e363b421")
+
+HEADER_STATE_ROOT_INDEX = 3
+HEADER_NUMBER_INDEX = 8
+HEADER_TIMESTAMP_INDEX = 11
+
+Account = namedtuple("Account", ["exists", "nonce", "balance", "storage_root", "code_hash"])
+SlotValue = namedtuple("SlotValue", ["exists", "value"])
+
+
+# errors of `MerklePatriciaProofVerifier.sol` and `StateProofVerifier.sol`
+class ProofError(Exception):
+    pass
+
+
+class BadEmptyRootHash(ProofError):
+    pass
+
+
+class BadRootHash(ProofError):
+    pass
+
+
+class BadNodeHash(ProofError):
+    pass
+
+
+class DivergentNode(ProofError):
+    pass
+
+
+class LeafNode(ProofError):
+    pass
+
+
+class NotNibble(ProofError):
+    pass
+
+
+class ExtensionAtLastLevel(ProofError):
+    pass
+
+
+class NotLastLevel(ProofError):
+    pass
+
+
+class NoChild(ProofError):
+    pass
+
+
+class EmptyInput(ProofError):
+    pass
+
+
+class BadSkipNibbles(ProofError):
+    pass
+
+
+class Unreachable(ProofError):
+    pass
+
+
+class BadAccount(ProofError):
+    pass
+
+
+class BlockhashMismatch(ProofError):
+    pass
+
+
+class HeaderTooShort(BlockhashMismatch):
+    # declared by StateProofVerifier, but parseBlockHeader reverts with BlockhashMismatch for a
+    # short header, so it is raised as a subclass of the error the contract reverts with
+    pass
+
+
+def _decode_nibbles(compact, skip_nibbles):
+    # nibbles are kept as a string of hex digits
+    if len(compact) == 0:
+        raise EmptyInput()
+    if skip_nibbles > len(compact) * 2:
+        raise BadSkipNibbles()
+    return compact.hex()[skip_nibbles:]
+
+
+def _compact_decode(compact):
+    if len(compact) == 0:
+        raise EmptyInput()
+    first_nibble = compact[0] >> 4
+    if first_nibble > 3:
+        raise Unreachable()
+    # 0: extension, even length; 1: extension, odd; 2: leaf, even; 3: leaf, odd
+    return first_nibble >= 2, _decode_nibbles(compact, 2 - (first_nibble & 1))
+
+
+def _shared_prefix_length(offset, xs, ys):
+    i = 0
+    while i + offset < len(xs) and i < len(ys):
+        if xs[i + offset] != ys[i]:
+            return i
+        i += 1
+    return i
+
+
+def _to_uint(item):
+    # RLPReader.toUint
+    if len(item) == 0 or len(item) > 33:
+        raise ValueError("Invalid RLP uint")
+    return int.from_bytes(payload(item), "big")
+
+
+class ProofVerifier:
+    """
+    Python port of `MerklePatriciaProofVerifier.extractProofValue` and the account and slot
+    helpers of `StateProofVerifier`, raising the same errors.
+
+    Node hashes and decoded nodes are memoized, so checking many proofs against one storage
+    root only hashes and decodes the nodes they share once.
+    """
+
+    def __init__(self):
+        self._hashes = {}
+        self._nodes = {}
+
+    def _keccak(self, data):
+        data = bytes(data)
+        digest = self._hashes.get(data)
+        if digest is None:
+            digest = self._hashes[data] = keccak(data)
+        return digest
+
+    def _mpt_hash_hash(self, item):
+        if len(item) < 32:
+            return self._keccak(item)
+        return keccak(self._keccak(item))
+
+    def _node(self, item):
+        node = self._nodes.get(item)
+        if node is None:
+            node = self._nodes[item] = split_list(item)
+        return node
+
+    def _child_hash_hash(self, child):
+        if not is_list(child):
+            # rlp(child) was at least 32 bytes, the reference holds keccak256(rlp(child))
+            return self._keccak(payload(child))
+        # rlp(child) was less than 32 bytes and is embedded as is
+        return self._keccak(child)
+
+    def extract_proof_value(self, root_hash, path, stack):
+        """
+        Return the value `stack` proves for `path`, or b"" for a proof of exclusion.
+        """
+        mpt_key = _decode_nibbles(path, 0)
+        mpt_key_offset = 0
+        node_hash_hash = None
+
+        if len(stack) == 0:
+            if root_hash != EMPTY_TRIE_ROOT:
+                raise BadEmptyRootHash()
+            return b""
+
+        last = len(stack) - 1
+        for i, item in enumerate(stack):
+            item = bytes(item)
+            if i == 0 and root_hash != self._keccak(item):
+                raise BadRootHash()
+            if i != 0 and node_hash_hash != self._mpt_hash_hash(item):
+                raise BadNodeHash()
+
+            node = self._node(item)
+            if len(node) == 2:
+                is_leaf, node_key = _compact_decode(payload(node[0]))
+
+                prefix_length = _shared_prefix_length(mpt_key_offset, mpt_key, node_key)
+                mpt_key_offset += prefix_length
+
+                if prefix_length < len(node_key):
+                    # divergent extension or leaf, only valid as the last node of an exclusion
+                    if i < last:
+                        raise DivergentNode()
+                    return b""
+
+                if is_leaf:
+                    if i < last:
+                        raise LeafNode()
+                    if mpt_key_offset < len(mpt_key):
+                        return b""
+                    return payload(node[1])
+
+                if i == last:
+                    raise ExtensionAtLastLevel()
+                node_hash_hash = self._child_hash_hash(node[1])
+
+            elif len(node) == 17:
+                if mpt_key_offset != len(mpt_key):
+                    nibble = int(mpt_key[mpt_key_offset], 16)
+                    mpt_key_offset += 1
+
+                    if node[nibble] == b"\x80":
+                        if i != last:
+                            raise LeafNode()
+                        return b""
+                    node_hash_hash = self._child_hash_hash(node[nibble])
+
+                    if i == last:
+                        raise NoChild()
+                else:
+                    if i != last:
+                        raise NotLastLevel()
+                    return payload(node[16])
+
+        raise Unreachable()
+
+    def extract_account(self, address_hash, state_root, proof):
+        account_rlp = self.extract_proof_value(state_root, address_hash, proof)
+        if len(account_rlp) == 0:
+            return Account(False, 0, 0, b"\x00" * 32, b"\x00" * 32)
+
+        fields = split_list(account_rlp)
+        if len(fields) != 4:
+            raise BadAccount()
+        return Account(
+            True,
+            _to_uint(fields[0]),
+            _to_uint(fields[1]),
+            _to_uint(fields[2]).to_bytes(32, "big"),
+            _to_uint(fields[3]).to_bytes(32, "big"),
+        )
+
+    def extract_slot_value(self, slot_hash, storage_root, proof):
+        value_rlp = self.extract_proof_value(storage_root, slot_hash, proof)
+        if len(value_rlp) == 0:
+            return SlotValue(False, 0)
+        return SlotValue(True, _to_uint(value_rlp))
+
+    def extract_slot_values(self, storage_root, proofs):
+        """
+        Check many `(slot_hash, proof)` pairs against one storage root.
+        """
+        return [
+            self.extract_slot_value(slot_hash, storage_root, proof) for slot_hash, proof in proofs
+        ]
+
+
+def parse_block_header(header_rlp):
+    fields = split_list(header_rlp)
+    if len(fields) <= HEADER_TIMESTAMP_INDEX:
+        raise HeaderTooShort()
+    return {
+        "hash": keccak(header_rlp),
+        "state_root": _to_uint(fields[HEADER_STATE_ROOT_INDEX]).to_bytes(32, "big"),
+        "number": _to_uint(fields[HEADER_NUMBER_INDEX]),
+        "timestamp": _to_uint(fields[HEADER_TIMESTAMP_INDEX]),
+    }
+
+
+def verify_block_header(header_rlp, block_hash):
+    # StateProofVerifier.verifyBlockHeader against a known hash instead of `blockhash`
+    header = parse_block_header(header_rlp)
+    if header["hash"] != bytes(block_hash):
+        raise BlockhashMismatch()
+    return header
+
+
+def verify_proof_rlp(header_rlp, proof_rlp, account, slots, verifier=None):
+    """
+    Check a (header, proof) pair produced by `serialize_block`/`serialize_proofs` the way the
+    on-chain verifiers do: the account proof against the header state root, then every
+    storage proof against the account storage root. `slots` are the storage keys passed to
+    `eth_getProof`. Returns the account and one `SlotValue` per slot.
+    """
+    verifier = verifier or ProofVerifier()
+    header_rlp, proof_rlp = bytes(header_rlp), bytes(proof_rlp)
+    state_root = parse_block_header(header_rlp)["state_root"]
+
+    proofs = split_list(proof_rlp)
+    if len(proofs) != len(slots) + 1:
+        raise ProofError("Invalid number of proofs")
+
+    account = verifier.extract_account(keccak(to_bytes(account)), state_root, split_list(proofs[0]))
+    if not account.exists:
+        raise BadAccount()
+
+    slot_values = verifier.extract_slot_values(
+        account.storage_root,
+        [(keccak(to_bytes(slot)), split_list(proof)) for slot, proof in zip(slots, proofs[1:])],
+    )
+    return account, slot_values
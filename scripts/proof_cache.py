@@ -0,0 +1,201 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from web3 import Web3
+
+CACHE_PATH = os.path.expanduser(os.path.join("~", ".cache", "curve-xdao", "proofs"))
+MAX_BYTES = 1 << 30
+CONFIRMATIONS = 64  # ALTER: depth below the head before a block is cached, reorgs stay above
+
+
+def _to_hex32(key):
+    if isinstance(key, int):
+        key = key.to_bytes(32, "big")
+    elif isinstance(key, str):
+        key = bytes.fromhex(key.removeprefix("0x"))
+    return "0x" + bytes(key).rjust(32, b"\x00").hex()
+
+
+def _is_number(block_identifier):
+    return isinstance(block_identifier, int) and not isinstance(block_identifier, bool)
+
+
+def _block_number(web3, block_identifier):
+    # entries are keyed by block number: tags and hashes are resolved to the block they point
+    # to now, "pending" changes with every transaction and can not be cached
+    if _is_number(block_identifier):
+        return block_identifier
+    if block_identifier == "pending":
+        raise ValueError("The pending block can not be cached")
+    if isinstance(block_identifier, str) and len(block_identifier) < 66:
+        if block_identifier.startswith("0x"):
+            return int(block_identifier, 16)
+    return web3.eth.get_block(block_identifier)["number"]
+
+
+class ProofCache:
+    """
+    Content-addressed on-disk cache of block headers and `eth_getProof` results.
+
+    Headers are keyed by (chain, block), account proofs by (chain, block, account) and
+    storage proofs by (chain, block, account, slot), so a request for new slots of an
+    already seen account only fetches the missing storage proofs. Files are evicted least
+    recently used first once the cache grows over `max_bytes`. Blocks may be given as
+    numbers, tags or hashes, the latter two are resolved to a number first. Only blocks at
+    least `confirmations` deep are cached, shallower ones may still be reorged and are
+    fetched every time.
+    """
+
+    def __init__(self, path=CACHE_PATH, max_bytes=MAX_BYTES, confirmations=CONFIRMATIONS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.confirmations = confirmations
+        self._deep = {}  # chain id -> highest block known to be `confirmations` deep
+        self._size = None
+        self.hits = 0
+        self.misses = 0
+
+    def _file(self, *parts):
+        digest = hashlib.sha256(json.dumps(parts).encode()).hexdigest()
+        return os.path.join(self.path, digest[:2], digest)
+
+    def _read(self, *parts):
+        path = self._file(*parts)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        os.utime(path)  # mark as recently used
+        self.hits += 1
+        return value
+
+    def _write(self, value, *parts):
+        path = self._file(*parts)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = json.dumps(value)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        if self._size is None:
+            self._size = sum(size for _, _, size in self._files())
+        else:
+            self._size += len(data)
+        if self._size > self.max_bytes:
+            self._evict()
+
+    def _files(self):
+        for root, _, names in os.walk(self.path):
+            for name in names:
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                yield stat.st_mtime, path, stat.st_size
+
+    def _evict(self):
+        files = sorted(self._files())
+        self._size = sum(size for _, _, size in files)
+        for _, path, size in files:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            os.remove(path)
+            self._size -= size
+
+    def _deep_until(self, web3, chain_id, block_number):
+        # the highest block at least `confirmations` deep, the head only moves up so it is
+        # read again only for blocks above the last known one
+        if self.confirmations == 0:
+            return block_number
+        if block_number > self._deep.get(chain_id, -1):
+            self._deep[chain_id] = web3.eth.block_number - self.confirmations
+        return self._deep[chain_id]
+
+    def header(self, web3, chain_id, block_identifier, serialize):
+        block = None
+        if _is_number(block_identifier) or block_identifier == "pending":
+            block_number = _block_number(web3, block_identifier)
+        else:
+            # the block is needed anyway if its header is not cached yet
+            block = web3.eth.get_block(block_identifier)
+            block_number = block["number"]
+
+        if block_number > self._deep_until(web3, chain_id, block_number):
+            return serialize(block or web3.eth.get_block(block_number))
+        cached = self._read("header", chain_id, block_number)
+        if cached is not None:
+            return bytes.fromhex(cached[2:])
+
+        header = serialize(block or web3.eth.get_block(block_number))
+        self._write(Web3.to_hex(header), "header", chain_id, block_number)
+        return header
+
+    def headers(self, web3, chain_id, block_numbers, serialize, batch_size=100, max_in_flight=4):
+        """
+        Headers of many blocks by number. Cached ones are read from disk, the rest are
+        fetched as raw `eth_getBlockByNumber` batches, `max_in_flight` batches at a time.
+        """
+        block_numbers = [_block_number(web3, block_number) for block_number in block_numbers]
+        deep = self._deep_until(web3, chain_id, max(block_numbers, default=0))
+        headers = {}
+        for block_number in block_numbers:
+            if block_number > deep:
+                continue
+            cached = self._read("header", chain_id, block_number)
+            if cached is not None:
+                headers[block_number] = bytes.fromhex(cached[2:])
+
+        def fetch(batch):
+            responses = web3.provider.make_batch_request(
+                [("eth_getBlockByNumber", [hex(block_number), False]) for block_number in batch]
+            )
+            if not isinstance(responses, list):
+                raise ValueError(responses.get("error", responses))
+            blocks = []
+            for block_number, response in zip(batch, responses):
+                if response.get("error") or response.get("result") is None:
+                    raise ValueError(f"Block {block_number}: {response.get('error', 'not found')}")
+                blocks.append(response["result"])
+            return blocks
+
+        missing = sorted(set(block_numbers) - set(headers))
+        batches = [missing[i : i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            for batch, blocks in zip(batches, executor.map(fetch, batches)):
+                for block_number, block in zip(batch, blocks):
+                    header = serialize(block)
+                    if block_number <= deep:
+                        self._write(Web3.to_hex(header), "header", chain_id, block_number)
+                    headers[block_number] = header
+        return [headers[block_number] for block_number in block_numbers]
+
+    def proof(self, web3, chain_id, account, keys, block_identifier):
+        block_number = _block_number(web3, block_identifier)
+        account = Web3.to_checksum_address(account)
+        keys = [_to_hex32(key) for key in keys]
+        if block_number > self._deep_until(web3, chain_id, block_number):
+            return json.loads(Web3.to_json(web3.eth.get_proof(account, keys, block_number)))
+
+        result = self._read("account", chain_id, block_number, account)
+        storage = {}
+        for key in keys:
+            cached = self._read("storage", chain_id, block_number, account, key)
+            if cached is not None:
+                storage[key] = cached
+
+        missing = list(dict.fromkeys(key for key in keys if key not in storage))
+        if result is None or missing:
+            response = json.loads(Web3.to_json(web3.eth.get_proof(account, missing, block_number)))
+            storage_proofs = response.pop("storageProof")
+            if result is None:
+                result = response
+                self._write(result, "account", chain_id, block_number, account)
+            # storage proofs are returned in the order of the requested keys
+            for key, storage_proof in zip(missing, storage_proofs):
+                storage[key] = storage_proof
+                self._write(storage_proof, "storage", chain_id, block_number, account, key)
+
+        return {**result, "storageProof": [storage[key] for key in keys]}
@@ -0,0 +1,145 @@
+from scripts.mpt_trie import Trie
+from scripts.mpt_verifier import ProofVerifier
+from scripts.rlp_encoding import (
+    encode_list,
+    encode_raw_list,
+    encode_string,
+    serialize_block,
+    split_list,
+    to_bytes,
+)
+
+BATCH_SIZE = 100  # `eth_getTransactionReceipt` calls per batch without `eth_getBlockReceipts`
+
+
+def _quantity(value):
+    return to_bytes(value, True)
+
+
+def encode_receipt(receipt):
+    """
+    Consensus encoding of a receipt returned by `eth_getTransactionReceipt`, either formatted
+    by web3 or as the raw JSON response: `type || rlp([status, cumulativeGasUsed, logsBloom,
+    logs])`, without the type byte for legacy receipts.
+    """
+    logs = [
+        encode_raw_list(
+            [
+                encode_string(to_bytes(log["address"])),
+                encode_list([to_bytes(topic) for topic in log["topics"]]),
+                encode_string(to_bytes(log["data"])),
+            ]
+        )
+        for log in receipt["logs"]
+    ]
+    # receipts before byzantium commit to the post state root instead of a status
+    status = to_bytes(receipt["root"]) if receipt.get("root") else _quantity(receipt["status"])
+    encoded = encode_raw_list(
+        [
+            encode_string(status),
+            encode_string(_quantity(receipt["cumulativeGasUsed"])),
+            encode_string(to_bytes(receipt["logsBloom"])),
+            encode_raw_list(logs),
+        ]
+    )
+    tx_type = int.from_bytes(_quantity(receipt.get("type", 0)), "big")
+    return encoded if tx_type == 0 else bytes([tx_type]) + encoded
+
+
+def receipt_key(index):
+    # receipts are keyed by rlp(transaction index)
+    return encode_string(to_bytes(index))
+
+
+class ReceiptTrie(Trie):
+    """
+    Merkle-Patricia trie of the receipts of one block, keyed by rlp(transaction index).
+    """
+
+    def __init__(self, receipts):
+        super().__init__((receipt_key(i), encode_receipt(r)) for i, r in enumerate(receipts))
+
+    def proof(self, index):
+        """
+        Nodes from the root down to the receipt at `index`, the stack `extractProofValue`
+        expects. For an index out of range it is a proof of exclusion.
+        """
+        return super().proof(receipt_key(index))
+
+
+def _request(web3, method, params):
+    response = web3.provider.make_request(method, params)
+    if response.get("error"):
+        raise ValueError(response["error"])
+    return response["result"]
+
+
+def fetch_receipts(web3, block, batch_size=BATCH_SIZE):
+    """
+    Raw receipts of a raw `eth_getBlockByNumber` block in one `eth_getBlockReceipts` call,
+    falling back to batches of `eth_getTransactionReceipt` for nodes without it.
+    """
+    try:
+        receipts = _request(web3, "eth_getBlockReceipts", [block["number"]])
+    except ValueError:
+        receipts = None
+    if receipts is None:
+        receipts = []
+        hashes = [tx if isinstance(tx, str) else tx["hash"] for tx in block["transactions"]]
+        for i in range(0, len(hashes), batch_size):
+            batch = [
+                ("eth_getTransactionReceipt", [tx_hash]) for tx_hash in hashes[i : i + batch_size]
+            ]
+            responses = web3.provider.make_batch_request(batch)
+            if not isinstance(responses, list):
+                raise ValueError(responses.get("error", responses))
+            for response in responses:
+                if response.get("error") or response.get("result") is None:
+                    raise ValueError(response.get("error", "Missing receipt"))
+                receipts.append(response["result"])
+    return sorted(receipts, key=lambda r: int(r["transactionIndex"], 16))
+
+
+class ReceiptProver:
+    """
+    Receipt proofs for `ReceiptProofVerifier.extractReceiptFromProof` of one block.
+
+    All receipts are fetched and the trie built on construction; the root is checked against
+    `receiptsRoot` of the header so a bad node response fails before any proof goes out.
+    """
+
+    def __init__(self, web3, block_number):
+        block = _request(web3, "eth_getBlockByNumber", [hex(block_number), False])
+        self.block_number = block_number
+        self.header_rlp = serialize_block(block)
+        self.receipts = fetch_receipts(web3, block)
+        if len(self.receipts) != len(block["transactions"]):
+            raise ValueError(
+                f"Got {len(self.receipts)} receipts for {len(block['transactions'])} transactions"
+            )
+
+        self.trie = ReceiptTrie(self.receipts)
+        if self.trie.root != to_bytes(block["receiptsRoot"]):
+            raise ValueError(f"Receipts root mismatch at block {block_number}")
+
+    def proof(self, index):
+        return encode_raw_list(self.trie.proof(index))
+
+    def proofs(self, indices):
+        return {index: self.proof(index) for index in indices}
+
+
+def verify_receipt_proof(receipts_root, index, proof_rlp, verifier=None):
+    """
+    Check a receipt proof the way `extractReceiptFromProof` does, returning the encoded
+    receipt (b"" for a proof of exclusion).
+    """
+    verifier = verifier or ProofVerifier()
+    return verifier.extract_proof_value(
+        receipts_root, receipt_key(index), split_list(bytes(proof_rlp))
+    )
+
+
+def generate_proofs(web3, block_number, indices):
+    prover = ReceiptProver(web3, block_number)
+    return prover.header_rlp, prover.proofs(indices)
@@ -0,0 +1,226 @@
+import glob
+import json
+import os
+import pickle
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEPLOYMENTS = os.path.join(ROOT, "deployments")
+ABIS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "abis")
+BUILD = os.path.join(ROOT, "build", "contracts")  # brownie artifacts, used when compiled
+# `REGISTRY_CACHE` moves the cache, an empty value keeps everything in memory
+CACHE_DIR = os.environ.get(
+    "REGISTRY_CACHE", os.path.expanduser(os.path.join("~", ".cache", "curve-xdao"))
+)
+CACHE_PATH = os.path.join(CACHE_DIR, "registry.pickle") if CACHE_DIR else None
+BLOCKS_PATH = os.path.join(CACHE_DIR, "deployment_blocks.json") if CACHE_DIR else None
+
+# deployments/<network>.json carry their own "chain_id" and "rpc", "mainnet" sections
+# describe the Ethereum side of the network
+ETHEREUM = 1
+ETHEREUM_NAMES = ("ethereum", "mainnet")
+
+# deployment key -> contract (ABI) name
+CONTRACT_TYPES = {
+    "token": "Token",
+    "block_hash_oracle": "BlockHashOracle",
+    "gauge_type_oracle": "GaugeTypeOracle",
+    "gauge_type_prover": "GaugeTypeVerifier",
+    "message_digest_prover": "MessageDigestProver",
+    "minter": "Minter",
+    "bridge": "LayerZeroBridgeCRV",
+    "receiver": "LayerZeroReceiver",
+    "sender": "LayerZeroSender",
+}
+
+
+def _sources(deployments, abis, build):
+    return sorted(
+        glob.glob(os.path.join(deployments, "*.json"))
+        + glob.glob(os.path.join(abis, "*.json"))
+        + glob.glob(os.path.join(build, "*.json"))
+    )
+
+
+def _build_index(deployments, abis, build):
+    addresses, networks, rpcs = {}, {}, {}
+    for path in sorted(glob.glob(os.path.join(deployments, "*.json"))):
+        network = os.path.splitext(os.path.basename(path))[0]
+        with open(path) as f:
+            sections = json.load(f)
+        if "chain_id" not in sections:
+            raise ValueError(f"{path} has no chain_id")
+        chain_id = networks[network] = sections.pop("chain_id")
+        if "rpc" in sections:
+            rpcs[chain_id] = sections.pop("rpc")
+        for section, contracts in sections.items():
+            for name, address in contracts.items():
+                if section.startswith("mainnet"):
+                    # one Ethereum side per network, e.g. ("ethereum", "avalanche.sender")
+                    addresses[(1, f"{network}.{name}")] = address
+                else:
+                    addresses[(chain_id, name)] = address
+
+    contract_abis = {}
+    for path in sorted(glob.glob(os.path.join(abis, "*.json"))):
+        with open(path) as f:
+            contract_abis[os.path.splitext(os.path.basename(path))[0]] = json.load(f)
+    # compiled artifacts win over the checked in copies
+    for path in sorted(glob.glob(os.path.join(build, "*.json"))):
+        with open(path) as f:
+            artifact = json.load(f)
+        if artifact.get("abi"):
+            name = artifact.get("contractName", os.path.splitext(os.path.basename(path))[0])
+            contract_abis[name] = artifact["abi"]
+
+    return {"addresses": addresses, "networks": networks, "rpcs": rpcs, "abis": contract_abis}
+
+
+class Registry:
+    """
+    Addresses of `deployments/*.json` and contract ABIs addressable by chain and name.
+
+    Everything is parsed once into a pickle at `cache`, keyed by the mtimes of the source
+    files, so a process start only unpickles it. With `cache=None` the index is rebuilt per
+    process and nothing is written. Contract handles are created on first use.
+    """
+
+    def __init__(
+        self, deployments=DEPLOYMENTS, abis=ABIS, build=BUILD, cache=CACHE_PATH, blocks=BLOCKS_PATH
+    ):
+        self.deployments = deployments
+        self.abis = abis
+        self.build = build
+        self.cache = cache
+        self.blocks = blocks
+        self._index = None
+        self._contracts = {}
+        self._blocks = None
+
+    def _key(self):
+        return [
+            (path, os.stat(path).st_mtime_ns)
+            for path in _sources(self.deployments, self.abis, self.build)
+        ]
+
+    @property
+    def index(self):
+        if self._index is None and self.cache is None:
+            self._index = _build_index(self.deployments, self.abis, self.build)
+        if self._index is None:
+            key = self._key()
+            try:
+                with open(self.cache, "rb") as f:
+                    cached_key, index = pickle.load(f)
+                if cached_key == key:
+                    self._index = index
+                    return index
+            except (OSError, EOFError, pickle.UnpicklingError):
+                pass
+
+            self._index = _build_index(self.deployments, self.abis, self.build)
+            os.makedirs(os.path.dirname(self.cache), exist_ok=True)
+            tmp = f"{self.cache}.{os.getpid()}.tmp"
+            with open(tmp, "wb") as f:
+                pickle.dump((key, self._index), f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, self.cache)
+        return self._index
+
+    def chain_id(self, network):
+        if isinstance(network, int):
+            return network
+        if network in ETHEREUM_NAMES:
+            return ETHEREUM
+        return self.index["networks"][network]
+
+    def rpc(self, network):
+        """
+        Public RPC endpoint of a sidechain, from the "rpc" of its deployment file.
+        """
+        return self.index["rpcs"][self.chain_id(network)]
+
+    def rpcs(self):
+        return dict(self.index["rpcs"])
+
+    def address(self, network, name):
+        return self.index["addresses"][(self.chain_id(network), name)]
+
+    def addresses(self, name):
+        """
+        Every deployment of `name` as chain id -> address.
+        """
+        return {
+            chain_id: address
+            for (chain_id, key), address in self.index["addresses"].items()
+            if key == name
+        }
+
+    def abi(self, name):
+        return self.index["abis"][name]
+
+    def contract(self, web3, network, name, abi=None):
+        key = (id(web3), self.chain_id(network), name)
+        if key not in self._contracts:
+            abi = abi or self.abi(CONTRACT_TYPES[name.rsplit(".", 1)[-1]])
+            self._contracts[key] = web3.eth.contract(address=self.address(network, name), abi=abi)
+        return self._contracts[key]
+
+    def deployment_block(self, web3, address):
+        """
+        Block `address` was deployed in, bisected through `eth_getCode` at past blocks (an
+        archive node) once and remembered in `blocks` across runs.
+        """
+        if self._blocks is None and self.blocks is None:
+            self._blocks = {}
+        if self._blocks is None:
+            try:
+                with open(self.blocks) as f:
+                    self._blocks = json.load(f)
+            except (OSError, ValueError):
+                self._blocks = {}
+
+        key = f"{web3.eth.chain_id}:{address}"
+        if key not in self._blocks:
+            lo, hi = 0, web3.eth.block_number
+            if not web3.eth.get_code(address, hi):
+                raise ValueError(f"No contract at {address}")
+            while lo < hi:
+                middle = (lo + hi) // 2
+                if web3.eth.get_code(address, middle):
+                    hi = middle
+                else:
+                    lo = middle + 1
+            self._blocks[key] = lo
+            if self.blocks is not None:
+                os.makedirs(os.path.dirname(self.blocks), exist_ok=True)
+                tmp = f"{self.blocks}.{os.getpid()}.tmp"
+                with open(tmp, "w") as f:
+                    json.dump(self._blocks, f)
+                os.replace(tmp, self.blocks)
+        return self._blocks[key]
+
+    def chain(self, web3, network):
+        return Chain(self, web3, network)
+
+
+class Chain:
+    """
+    Contracts of one network as attributes, `registry.chain(web3, "bsc").block_hash_oracle`.
+    """
+
+    def __init__(self, registry, web3, network):
+        self._registry = registry
+        self._web3 = web3
+        self._network = network
+
+    def __getattr__(self, name):
+        if name.startswith("_"):
+            raise AttributeError(name)
+        contract = self._registry.contract(self._web3, self._network, name)
+        setattr(self, name, contract)
+        return contract
+
+    def __getitem__(self, name):
+        return self._registry.contract(self._web3, self._network, name)
+
+
+registry = Registry()
@@ -0,0 +1,269 @@
+import json
+import os
+import time
+from getpass import getpass
+
+import eth_abi
+from eth_account import Account, account
+from eth_utils import keccak
+from web3 import Web3
+
+from scripts.log_scanner import LogScanner
+from scripts.registry import registry
+from scripts.status_query import aggregate, block_timestamps
+from scripts.tx_sender import TransactionSender
+
+NETWORK = "https://api.avax.network/ext/bc/C/rpc"  # ALTER
+BRIDGE = registry.address("avalanche", "bridge")  # ALTER: avax CRV bridge
+KIND = "crv"  # ALTER: "crv" for LayerZeroBridgeCRV, "crvusd" for the crvUSD bridges
+# ALTER: first block to scan, delayed transfers never expire. None looks up the deployment
+# block of the bridge through the registry
+START_BLOCK = None
+CHECKPOINT = f"delayed-{BRIDGE}.json"  # ALTER: local store of scanned Delayed logs
+
+CACHE_SLOT = 1  # LayerZeroBridgeCRV: [last timestamp uint64][last available uint192]
+
+CRV_BRIDGE_ABI = registry.abi("LayerZeroBridgeCRV")
+CRVUSD_BRIDGE_ABI = registry.abi("CRVUSDLayerZeroBridge")
+
+
+def regenerate(cache_ts, available, limit, period, now):
+    # LayerZeroBridgeCRV.available() at `now`, in the same integer math
+    if period <= now - cache_ts:
+        return limit
+    return min(available + limit * (now - cache_ts) // period, limit)
+
+
+class CRVLimiter:
+    """
+    Local copy of the LayerZeroBridgeCRV rate limit. `consume` mirrors `retry`: whatever
+    exceeds the available amount is delayed again under the original timestamp.
+    """
+
+    def __init__(self, cache_ts, available, limit, period):
+        self.cache_ts = cache_ts
+        self.available = available
+        self.limit = limit
+        self.period = period
+
+    @classmethod
+    def read(cls, web3, bridge, block_identifier="latest"):
+        cache = int.from_bytes(
+            web3.eth.get_storage_at(bridge.address, CACHE_SLOT, block_identifier), "big"
+        )
+        limit, period = aggregate(
+            web3, [bridge.functions.limit(), bridge.functions.period()], block_identifier
+        )
+        return cls(cache >> 192, cache & (2**192 - 1), limit, period)
+
+    def ready_at(self, transfer):
+        return transfer["timestamp"] + self.period
+
+    def available_at(self, now):
+        return regenerate(self.cache_ts, self.available, self.limit, self.period, now)
+
+    def consume(self, amount, now):
+        available = self.available_at(now)
+        minted = min(amount, available)
+        self.cache_ts, self.available = now, available - minted
+        return minted
+
+    def next_capacity(self, amount, now):
+        # first timestamp at which `amount` (capped by the limit) is available again
+        target = min(amount, self.limit)
+        if self.available_at(now) >= target:
+            return now
+        if self.limit == 0:
+            return None
+        missing = target - self.available
+        return self.cache_ts + min(-(-missing * self.period // self.limit), self.period)
+
+
+class CRVUSDLimiter:
+    """
+    The crvUSD bridges do not limit `retry` at all, a delayed transfer only waits `delay`.
+    """
+
+    def __init__(self, delay):
+        self.delay = delay
+
+    @classmethod
+    def read(cls, web3, bridge, block_identifier="latest"):
+        return cls(bridge.functions.delay().call(block_identifier=block_identifier))
+
+    def ready_at(self, transfer):
+        return transfer["timestamp"] + self.delay + 1  # strict inequality in `retry`
+
+    def available_at(self, now):
+        return None
+
+    def consume(self, amount, now):
+        return amount
+
+    def next_capacity(self, amount, now):
+        return now
+
+
+LIMITERS = {"crv": (CRVLimiter, CRV_BRIDGE_ABI), "crvusd": (CRVUSDLimiter, CRVUSD_BRIDGE_ABI)}
+
+
+def preimage(kind, transfer):
+    if kind == "crv":
+        encoded = eth_abi.encode(
+            ["uint256", "address", "uint256"],
+            [transfer["timestamp"], transfer["receiver"], transfer["amount"]],
+        )
+    else:
+        payload = eth_abi.encode(["address", "uint256"], [transfer["receiver"], transfer["amount"]])
+        encoded = eth_abi.encode(["uint256", "bytes"], [transfer["timestamp"], payload])
+    return keccak(encoded)
+
+
+class DelayedIndexer:
+    """
+    Rebuild the set of pending delayed transfers of a bridge from its `Delayed` logs.
+
+    A `Delayed` log for a nonce seen before is a remainder re-delayed by `retry`, which keeps
+    the original timestamp. Every candidate is checked against `delayed(nonce)` so transfers
+    retried by anyone else (or fully drained) drop out.
+    """
+
+    def __init__(self, web3, bridge, kind=KIND, start_block=START_BLOCK, checkpoint=CHECKPOINT):
+        self.web3 = web3
+        self.bridge = bridge
+        self.kind = kind
+        self.start_block = start_block
+        self.checkpoint = checkpoint
+        self.timestamps = {}
+
+    def _fetch(self, from_block, to_block):
+        logs = self.bridge.events.Delayed().get_logs(from_block=from_block, to_block=to_block)
+        # the timestamps of a window in one batch, not a `get_block` per log
+        missing = {log["blockNumber"] for log in logs} - set(self.timestamps)
+        self.timestamps.update(block_timestamps(self.web3, missing))
+        return logs
+
+    def _decode(self, log):
+        return {
+            "nonce": log["args"]["nonce"],
+            "receiver": log["args"]["receiver"],
+            "amount": log["args"]["amount"],
+            "timestamp": self.timestamps[log["blockNumber"]],
+        }
+
+    def pending(self, head=None):
+        if head is None:
+            head = self.web3.eth.block_number
+        if self.start_block is None:
+            self.start_block = registry.deployment_block(self.web3, self.bridge.address)
+        scanner = LogScanner(
+            self.web3,
+            self._fetch,
+            self._decode,
+            self.checkpoint,
+            lookback=head - self.start_block,
+        )
+
+        transfers = {}
+        for record in sorted(scanner.scan(head), key=lambda r: r["block"]):
+            previous = transfers.get(record["nonce"])
+            if previous is not None and self.kind == "crv":
+                record = {**record, "timestamp": previous["timestamp"]}
+            transfers[record["nonce"]] = record
+
+        transfers = list(transfers.values())
+        stored = aggregate(
+            self.web3, [self.bridge.functions.delayed(t["nonce"]) for t in transfers], head
+        )
+        return [t for t, h in zip(transfers, stored) if h == preimage(self.kind, t)]
+
+
+def plan(limiter, transfers, now):
+    """
+    Order the retries which can go out at `now` so every transaction drains as much volume
+    as possible: largest ready transfer first, stopping once the limiter runs dry. Returns
+    the retries as (transfer, expected minted amount) and the timestamp worth waking up at.
+    """
+    ready = sorted(
+        (t for t in transfers if limiter.ready_at(t) <= now),
+        key=lambda t: (-t["amount"], t["nonce"]),
+    )
+    waiting = [limiter.ready_at(t) for t in transfers if limiter.ready_at(t) > now]
+
+    retries = []
+    for transfer in ready:
+        if limiter.available_at(now) == 0:
+            break
+        retries.append((transfer, limiter.consume(transfer["amount"], now)))
+
+    wake = min(waiting, default=None)
+    left = ready[len(retries) :] + [
+        {**t, "amount": t["amount"] - minted} for t, minted in retries if minted < t["amount"]
+    ]
+    if left:
+        # capacity for the largest leftover, a partial retry of it would waste a transaction
+        capacity = limiter.next_capacity(max(t["amount"] for t in left), now + 1)
+        if capacity is not None:
+            wake = capacity if wake is None else min(wake, capacity)
+    return retries, wake
+
+
+def retry_delayed(web3, signer, bridge=BRIDGE, kind=KIND, sender=None, indexer=None, log=False):
+    limiter_cls, abi = LIMITERS[kind]
+    if isinstance(bridge, str):
+        bridge = web3.eth.contract(address=bridge, abi=abi)
+    indexer = indexer or DelayedIndexer(web3, bridge, kind)
+    sender = sender or TransactionSender(web3, signer)
+
+    if bridge.functions.is_killed().call():
+        if log:
+            print("Bridge is killed, nothing to retry")
+        return [], None
+
+    block = web3.eth.get_block("latest")
+    transfers = indexer.pending(block["number"])
+    limiter = limiter_cls.read(web3, bridge, block["number"])
+    retries, wake = plan(limiter, transfers, block["timestamp"])
+    if log:
+        total = sum(t["amount"] for t in transfers)
+        print(f"{len(transfers)} delayed transfers ({total}), retrying {len(retries)}")
+        for transfer, minted in retries:
+            print(
+                f"  {transfer['nonce']}: {minted} of {transfer['amount']} to {transfer['receiver']}"
+            )
+
+    # one sender for every retry, they go out back to back and are mined in order
+    for transfer, _ in retries:
+        func = bridge.functions.retry(
+            transfer["nonce"], transfer["timestamp"], transfer["receiver"], transfer["amount"]
+        )
+        sender.submit(func)
+    receipts = sender.wait()
+    return receipts, wake
+
+
+def run(web3, signer, bridge=BRIDGE, kind=KIND, max_sleep=3600, log=False):
+    limiter_cls, abi = LIMITERS[kind]
+    bridge = web3.eth.contract(address=bridge, abi=abi)
+    indexer = DelayedIndexer(web3, bridge, kind)
+    sender = TransactionSender(web3, signer)
+    while True:
+        _, wake = retry_delayed(web3, signer, bridge, kind, sender, indexer, log)
+        now = web3.eth.get_block("latest")["timestamp"]
+        sleep = max_sleep if wake is None else min(max(wake - now, 1), max_sleep)
+        if log:
+            print(f"Sleeping {sleep}s, sender stats: {sender.stats()}", flush=True)
+        time.sleep(sleep)
+
+
+def account_load_pkey(fname):
+    path = os.path.expanduser(os.path.join("~", ".brownie", "accounts", fname + ".json"))
+    with open(path, "r") as f:
+        pkey = account.decode_keyfile_json(json.load(f), getpass())
+        return Account.from_key(pkey)
+
+
+if __name__ == "__main__":
+    web3 = Web3(Web3.HTTPProvider(NETWORK))
+    signer = account_load_pkey("keeper")  # ALTER
+    run(web3, signer, log=True)
@@ -0,0 +1,209 @@
+from scripts import metrics
+
+# https://github.com/ethereum/go-ethereum/blob/master/core/types/block.go#L69
+BLOCK_HEADER = (
+    "parentHash",
+    "sha3Uncles",
+    "miner",
+    "stateRoot",
+    "transactionsRoot",
+    "receiptsRoot",
+    "logsBloom",
+    "difficulty",
+    "number",
+    "gasLimit",
+    "gasUsed",
+    "timestamp",
+    "extraData",
+    "mixHash",
+    "nonce",
+    "baseFeePerGas",  # added by EIP-1559 and is ignored in legacy headers
+    "withdrawalsRoot",  # added by EIP-4895 and is ignored in legacy headers
+    "blobGasUsed",  # added by EIP-4844 and is ignored in legacy headers
+    "excessBlobGas",  # added by EIP-4844 and is ignored in legacy headers
+    "parentBeaconBlockRoot",  # added by EIP-4788 and is ignored in legacy headers
+    "requestsHash",  # added by EIP-7685 and is ignored in legacy headers
+)
+
+# fields which raw JSON-RPC responses return as hex quantities rather than byte strings
+QUANTITIES = frozenset(
+    (
+        "difficulty",
+        "number",
+        "gasLimit",
+        "gasUsed",
+        "timestamp",
+        "baseFeePerGas",
+        "blobGasUsed",
+        "excessBlobGas",
+    )
+)
+
+
+def to_bytes(value, quantity=False):
+    if isinstance(value, str):
+        if quantity:
+            value = int(value, 16)
+        else:
+            return bytes.fromhex(value[2:] if value[:2] in ("0x", "0X") else value)
+    if isinstance(value, int):
+        return value.to_bytes((value.bit_length() + 7) // 8, "big")
+    return value  # bytes, HexBytes and memoryviews are written as is
+
+
+def _length_prefix_size(length):
+    return 1 if length < 56 else 1 + (length.bit_length() + 7) // 8
+
+
+def _write_length_prefix(buffer, offset, length, short):
+    # `short` is 0x80 for strings and 0xc0 for lists, long forms start 55 further
+    if length < 56:
+        buffer[offset] = short + length
+        return offset + 1
+    size = (length.bit_length() + 7) // 8
+    buffer[offset] = short + 55 + size
+    buffer[offset + 1 : offset + 1 + size] = length.to_bytes(size, "big")
+    return offset + 1 + size
+
+
+def list_prefix(length):
+    """
+    RLP prefix of a list whose encoded items take `length` bytes.
+    """
+    buffer = bytearray(_length_prefix_size(length))
+    _write_length_prefix(buffer, 0, length, 0xC0)
+    return bytes(buffer)
+
+
+def _string_size(value):
+    length = len(value)
+    if length == 1 and value[0] < 0x80:
+        return 1
+    return _length_prefix_size(length) + length
+
+
+def encode_string(value):
+    """
+    RLP encode a single byte string.
+    """
+    length = len(value)
+    if length == 1 and value[0] < 0x80:
+        return bytes(value)
+    buffer = bytearray(_length_prefix_size(length) + length)
+    offset = _write_length_prefix(buffer, 0, length, 0x80)
+    buffer[offset:] = value
+    return bytes(buffer)
+
+
+def encode_list(items):
+    """
+    RLP encode a list of byte strings into a single preallocated buffer.
+    """
+    size = 0
+    for item in items:
+        size += _string_size(item)
+
+    buffer = bytearray(_length_prefix_size(size) + size)
+    view = memoryview(buffer)
+    offset = _write_length_prefix(view, 0, size, 0xC0)
+    for item in items:
+        length = len(item)
+        if not (length == 1 and item[0] < 0x80):
+            offset = _write_length_prefix(view, offset, length, 0x80)
+        view[offset : offset + length] = item
+        offset += length
+    return bytes(buffer)
+
+
+def encode_raw_list(encoded_items):
+    """
+    Wrap items which are already RLP encoded into an RLP list.
+    """
+    size = 0
+    for item in encoded_items:
+        size += len(item)
+
+    buffer = bytearray(_length_prefix_size(size) + size)
+    view = memoryview(buffer)
+    offset = _write_length_prefix(view, 0, size, 0xC0)
+    for item in encoded_items:
+        view[offset : offset + len(item)] = item
+        offset += len(item)
+    return bytes(buffer)
+
+
+@metrics.timed()
+def serialize_block(block):
+    """
+    RLP encode the header of a block returned by `eth_getBlockByNumber`, either formatted by
+    web3 or as the raw JSON response. Only the fields present in the block are encoded, which
+    covers every header variant from legacy through the fork which introduced the last field.
+    """
+    return encode_list(
+        [to_bytes(block[key], key in QUANTITIES) for key in BLOCK_HEADER if key in block]
+    )
+
+
+@metrics.timed()
+def serialize_proofs(proofs):
+    """
+    RLP encode the account proof followed by every storage proof of an `eth_getProof` response.
+    Proof nodes are already RLP encoded, so they are copied into the output without decoding.
+    """
+    account_proof = encode_raw_list([to_bytes(node) for node in proofs["accountProof"]])
+    storage_proofs = [
+        encode_raw_list([to_bytes(node) for node in proof["proof"]])
+        for proof in proofs["storageProof"]
+    ]
+    return encode_raw_list([account_proof, *storage_proofs])
+
+
+def decode_item(data, offset=0):
+    """
+    Locate the RLP item starting at `offset`, returning (is_list, payload_start, end).
+    """
+    prefix = data[offset]
+    if prefix < 0x80:
+        return False, offset, offset + 1
+    if prefix < 0xB8:
+        start, length, is_list = offset + 1, prefix - 0x80, False
+    elif prefix < 0xC0:
+        size = prefix - 0xB7
+        start, is_list = offset + 1 + size, False
+        length = int.from_bytes(data[offset + 1 : start], "big")
+    elif prefix < 0xF8:
+        start, length, is_list = offset + 1, prefix - 0xC0, True
+    else:
+        size = prefix - 0xF7
+        start, is_list = offset + 1 + size, True
+        length = int.from_bytes(data[offset + 1 : start], "big")
+
+    if start + length > len(data):
+        raise ValueError("RLP item exceeds input")
+    return is_list, start, start + length
+
+
+def payload(item):
+    _, start, end = decode_item(item)
+    return item[start:end]
+
+
+def is_list(item):
+    return item[0] >= 0xC0
+
+
+def split_list(item):
+    """
+    Split an RLP encoded list into the encodings of its items.
+    """
+    item_is_list, offset, end = decode_item(item)
+    if not item_is_list:
+        raise ValueError("RLP item is not a list")
+    items = []
+    while offset < end:
+        _, _, item_end = decode_item(item, offset)
+        items.append(item[offset:item_end])
+        offset = item_end
+    if offset != end:
+        raise ValueError("RLP list items exceed list payload")
+    return items
@@ -0,0 +1,274 @@
+import atexit
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+
+from web3.providers.base import JSONBaseProvider
+
+# request key, method id, response offset, response length, times the response repeats
+RECORD = struct.Struct(">32sHQII")
+HEADER = struct.Struct(">I")  # length of the JSON header of the index, the method names
+
+
+def _request_key(method, params):
+    encoded = json.dumps([method, params], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode()).digest()
+
+
+def _map(path):
+    # an empty file can not be mapped, nor needs to be
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+class CassetteProvider(JSONBaseProvider):
+    """
+    Record JSON-RPC traffic to an on-disk cassette and replay it without a network.
+
+    Given a `provider` every request is forwarded to it and recorded, without one the
+    cassette is replayed. A cassette is two files: `<path>.data` holding zlib compressed
+    responses, each stored once under its content hash, and `<path>.index` mapping every
+    request to the responses it got in call order. The index is a short JSON header naming
+    the methods followed by fixed-width records sorted by request hash, one per run of equal
+    responses, so a request answered the same way any number of times takes one record.
+    Replays `mmap` both files and bisect the records, so opening a cassette reads nothing and
+    only the records and responses actually requested are paged in. A request repeated more
+    often than recorded gets its last response again.
+
+    Call counts and a latency histogram (power of two microsecond buckets) are kept per
+    method, see `report`. Use it as a context manager, or `close` it, to write the index.
+    """
+
+    def __init__(self, path, provider=None):
+        super().__init__()
+        self.path = path
+        self.provider = provider
+        self.lock = threading.Lock()
+        self.stats = {}  # method -> Counter of latency buckets
+        self.positions = Counter()
+
+        self.closed = False
+        self.requests = {}  # key -> [method, [[offset, length, repeats], ...]] while recording
+        self.blobs = {}  # content hash -> (offset, length) while recording
+        self.runs = {}  # key -> runs of the requests replayed so far
+        index = f"{path}.index"
+        self._open_index(_map(index) if os.path.exists(index) else b"")
+
+        if provider is not None:
+            self._load()
+            self.data = open(f"{path}.data", "ab")
+            self.size = self.data.tell()
+            self.view = None
+        else:
+            self.view = _map(f"{path}.data")
+
+    def _open_index(self, index):
+        self.index, self.methods, self.start, self.records = index, [], 0, 0
+        if index:
+            (length,) = HEADER.unpack_from(index)
+            self.methods = json.loads(bytes(index[HEADER.size : HEADER.size + length]))
+            self.start = HEADER.size + length
+            self.records = (len(index) - self.start) // RECORD.size
+
+    def _record_at(self, i):
+        return RECORD.unpack_from(self.index, self.start + i * RECORD.size)
+
+    def _indexed(self):
+        for i in range(self.records):
+            key, method, offset, length, repeats = self._record_at(i)
+            yield key, self.methods[method], offset, length, repeats
+
+    def _load(self):
+        # appending to a recorded cassette, its responses are not stored again
+        data = _map(f"{self.path}.data") if self.records else b""
+        for key, method, offset, length, repeats in self._indexed():
+            self.requests.setdefault(key, [method, []])[1].append([offset, length, repeats])
+            self.blobs[hashlib.sha256(data[offset : offset + length]).digest()] = (offset, length)
+        for view in (data, self.index):
+            if isinstance(view, mmap.mmap):
+                view.close()
+        self._open_index(b"")
+
+    def _find(self, key):
+        # runs of `key`, its records are contiguous and in call order
+        lo, hi = 0, self.records
+        while lo < hi:
+            middle = (lo + hi) // 2
+            if self._record_at(middle)[0] < key:
+                lo = middle + 1
+            else:
+                hi = middle
+        runs = []
+        for i in range(lo, self.records):
+            record = self._record_at(i)
+            if record[0] != key:
+                break
+            runs.append(record[2:])
+        return runs
+
+    def entries(self):
+        """
+        `(request key, method, offset, length, repeats)` of every run of equal responses,
+        by request key.
+        """
+        if not self.recording:
+            yield from self._indexed()
+            return
+        with self.lock:
+            requests = sorted(
+                (key, method, list(runs)) for key, (method, runs) in self.requests.items()
+            )
+        for key, method, runs in requests:
+            for offset, length, repeats in runs:
+                yield key, method, offset, length, repeats
+
+    @property
+    def recording(self):
+        return self.provider is not None
+
+    def _time(self, method, started):
+        bucket = int((time.perf_counter() - started) * 1e6).bit_length()
+        with self.lock:
+            self.stats.setdefault(method, Counter())[bucket] += 1
+
+    def _record(self, method, params, response):
+        response = {k: v for k, v in response.items() if k not in ("id", "jsonrpc")}
+        blob = zlib.compress(json.dumps(response, separators=(",", ":")).encode(), 1)
+        digest = hashlib.sha256(blob).digest()
+        key = _request_key(method, params)
+        with self.lock:
+            if digest not in self.blobs:
+                self.data.write(blob)
+                self.blobs[digest] = (self.size, len(blob))
+                self.size += len(blob)
+            offset, length = self.blobs[digest]
+            runs = self.requests.setdefault(key, [method, []])[1]
+            if runs and runs[-1][:2] == [offset, length]:
+                runs[-1][2] += 1
+            else:
+                runs.append([offset, length, 1])
+
+    def _replay(self, method, params):
+        key = _request_key(method, params)
+        with self.lock:
+            runs = self.runs.get(key)
+            if runs is None:
+                runs = self.runs[key] = self._find(key)
+            if not runs:
+                raise ValueError(f"No recorded response for {method} {params}")
+            position = self.positions[key]
+            self.positions[key] += 1
+        for offset, length, repeats in runs:
+            # past the recorded calls this stops at the last run, its response is repeated
+            if position < repeats:
+                break
+            position -= repeats
+        response = json.loads(zlib.decompress(self.view[offset : offset + length]))
+        return {"jsonrpc": "2.0", "id": next(self.request_counter), **response}
+
+    def make_request(self, method, params):
+        started = time.perf_counter()
+        if self.recording:
+            response = self.provider.make_request(method, params)
+            self._record(method, params, response)
+        else:
+            response = self._replay(method, params)
+        self._time(method, started)
+        return response
+
+    def make_batch_request(self, batch_requests):
+        started = time.perf_counter()
+        if self.recording:
+            responses = self.provider.make_batch_request(batch_requests)
+            if isinstance(responses, list):
+                for (method, params), response in zip(batch_requests, responses):
+                    self._record(method, params, response)
+        else:
+            responses = [self._replay(method, params) for method, params in batch_requests]
+        for method, _ in batch_requests:
+            self._time(method, started)
+        return responses
+
+    def is_connected(self, show_traceback=False):
+        return self.provider.is_connected(show_traceback) if self.recording else True
+
+    def save(self):
+        if not self.recording:
+            return
+        with self.lock:
+            self.data.flush()
+            methods = sorted({method for method, _ in self.requests.values()})
+            ids = {method: i for i, method in enumerate(methods)}
+            header = json.dumps(methods, separators=(",", ":")).encode()
+            tmp = f"{self.path}.index.tmp"
+            with open(tmp, "wb") as f:
+                f.write(HEADER.pack(len(header)) + header)
+                for key in sorted(self.requests):
+                    method, runs = self.requests[key]
+                    for offset, length, repeats in runs:
+                        f.write(RECORD.pack(key, ids[method], offset, length, repeats))
+            os.replace(tmp, f"{self.path}.index")
+
+    def close(self):
+        if self.closed:
+            return
+        self.save()
+        self.closed = True
+        if self.recording:
+            self.data.close()
+        else:
+            for view in (self.view, self.index):
+                if isinstance(view, mmap.mmap):
+                    view.close()
+        atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def report(self, file=sys.stdout):
+        for method, histogram in sorted(
+            self.stats.items(), key=lambda item: -sum(item[1].values())
+        ):
+            buckets = " ".join(
+                f"<{1 << bucket}us:{count}" for bucket, count in sorted(histogram.items())
+            )
+            print(f"{method:32} {sum(histogram.values()):8}  {buckets}", file=file)
+
+
+def wrap(web3, path, record=False):
+    """
+    Swap the provider of `web3` for a cassette: recording through the current provider, or
+    replaying without touching the network. The cassette is closed, saving the index, when
+    used as a context manager or at interpreter exit, whichever comes first.
+    """
+    web3.provider = CassetteProvider(path, web3.provider if record else None)
+    atexit.register(web3.provider.close)
+    return web3.provider
+
+
+if __name__ == "__main__":
+    cassette = CassetteProvider(sys.argv[1])
+    calls, requests, responses = Counter(), set(), {}
+    for key, method, offset, length, repeats in cassette.entries():
+        calls[method] += repeats
+        requests.add(key)
+        responses[offset] = length
+    stored = sum(responses.values())
+    print(
+        f"{sum(calls.values())} calls, {len(requests)} requests, {len(responses)} responses, "
+        f"{stored} bytes, {cassette.records} index records"
+    )
+    for method, count in calls.most_common():
+        print(f"  {method:32} {count:8}")
@@ -0,0 +1,476 @@
+import json
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import eth_abi
+import numpy as np
+
+from scripts.log_scanner import LogScanner
+from scripts.registry import registry
+from scripts.retry_delayed import regenerate
+from scripts.status_query import block_timestamps
+
+TRAFFIC = "traffic.json"  # ALTER: recorded bridge traffic, see `record_traffic`
+ISSUANCE_INTERVAL = 86400  # crvUSD bridges: `issued` is bucketed per day
+
+# source side event -> bridge ABI
+BRIDGE_ABIS = {
+    "BridgeSent": registry.abi("LayerZeroBridgeCRV"),
+    "Bridged": registry.abi("CRVUSDLayerZeroBridge"),
+}
+
+
+def record_traffic(web3, bridge, from_block, to_block=None, event="BridgeSent", path=TRAFFIC):
+    """
+    Record the transfers sent through the source side of a bridge. Every `bridge` call there
+    is one `lzReceive` on the destination, so this is the arrival stream of the limiter
+    without having to tell retries and arrivals apart. crvUSD bridges log `Bridged`.
+    """
+    bridge = web3.eth.contract(address=bridge, abi=BRIDGE_ABIS[event])
+    timestamps = {}
+
+    def fetch(lo, hi):
+        logs = bridge.events[event]().get_logs(from_block=lo, to_block=hi)
+        # the timestamps of a window in one batch, not a `get_block` per log
+        missing = {log["blockNumber"] for log in logs} - set(timestamps)
+        timestamps.update(block_timestamps(web3, missing))
+        return logs
+
+    def decode(log):
+        return {"timestamp": timestamps[log["blockNumber"]], "amount": str(log["args"]["amount"])}
+
+    if to_block is None:
+        to_block = web3.eth.block_number
+    scanner = LogScanner(
+        web3,
+        fetch,
+        decode,
+        path,
+        lookback=to_block - from_block,
+        reorg_margin=0,
+    )
+    return scanner.scan(to_block)
+
+
+def load_traffic(path=TRAFFIC, relay_delay=0):
+    with open(path) as f:
+        records = sorted(json.load(f)["records"], key=lambda r: (r["timestamp"], r["block"]))
+    timestamps = np.array([r["timestamp"] + relay_delay for r in records], dtype=np.int64)
+    amounts = [int(r["amount"]) for r in records]
+    return timestamps, amounts
+
+
+def _exact(values, bound):
+    # int64 is only exact while every product and running sum stays below 2 ** 63, token
+    # amounts in wei usually need python ints (object arrays) instead
+    return np.array(values, dtype=np.int64 if bound < 2**62 else object)
+
+
+def _scan_crv(timestamps, amounts, limit, period, cache_ts, available):
+    """
+    `available` after each of a run of `lzReceive` calls, assuming none of them is delayed.
+
+    Every call maps the stored amount through f(a) = min(a + regenerated, limit) - amount,
+    and functions of the form min(a + p, q) compose into the same form. The whole run is
+    then a prefix sum plus a running minimum: a_i = min(a_0 + S_i, S_i + min_j(q_j - S_j)).
+    The first negative a_i is the first transfer which does not fit, everything before it
+    matches the contract exactly.
+    """
+    dt = np.diff(timestamps, prepend=cache_ts)
+    regenerated = limit * np.minimum(dt, period) // period
+    steps = np.cumsum(regenerated - amounts)
+    bounds = np.minimum.accumulate(limit - amounts - steps)
+    return np.minimum(available + steps, steps + bounds)
+
+
+def _first_delay(scan, timestamps, amounts, pos, end, window, *args):
+    # scan ahead in growing windows, so a delay right away does not cost a full pass
+    end = min(pos + window, end)
+    values = scan(timestamps[pos:end], amounts[pos:end], *args)
+    delays = np.flatnonzero(values < 0)
+    if len(delays):
+        return int(delays[0]), values, max(window // 2, 64)
+    return end - pos, values, window * 2
+
+
+def _crv_pair(timestamps, amounts, limit, period, trace=None):
+    ts_list, amount_list = timestamps.tolist(), list(amounts)
+    bound = max(limit * period, sum(amount_list) + limit)
+    ts_array = _exact(ts_list, bound)
+    amount_array = _exact(amount_list, bound)
+
+    cache_ts = available = clock = 0
+    queue = deque()  # [arrival index, timestamp, remainder], ready in arrival order
+    stats = {"delayed": 0, "delayed_volume": 0, "latency_sum": 0, "latency_max": 0, "retries": 0}
+
+    def retry_at():
+        # when `retry_delayed` sends the next retry: the head is ready and the limiter holds
+        # its remaining amount, capped at `limit`
+        _, arrived, remainder = queue[0]
+        start = max(arrived + period, cache_ts, clock)
+        target = min(remainder, limit)
+        if regenerate(cache_ts, available, limit, period, start) >= target:
+            return start
+        wait = -(-(target - available) * period // limit)
+        return max(start, cache_ts + min(wait, period))
+
+    def drain(until):
+        nonlocal cache_ts, available
+        while queue and limit and (at := retry_at()) <= until:
+            index, arrived, remainder = queue[0]
+            regenerated = regenerate(cache_ts, available, limit, period, at)
+            minted = min(remainder, regenerated)
+            cache_ts, available = at, regenerated - minted
+            remainder -= minted
+            stats["retries"] += 1
+            if trace is not None:
+                trace.append(("retry", at, index, minted, remainder))
+            if remainder:
+                queue[0][2] = remainder
+                continue
+            queue.popleft()
+            stats["latency_sum"] += at - arrived
+            stats["latency_max"] = max(stats["latency_max"], at - arrived)
+
+    def receive(index):
+        nonlocal cache_ts, available
+        now, amount = ts_list[index], amount_list[index]
+        if amount > limit:
+            # over `limit` is delayed as a whole without touching the cache
+            minted = 0
+        else:
+            regenerated = regenerate(cache_ts, available, limit, period, now)
+            minted = min(regenerated, amount)
+            cache_ts, available = now, regenerated - minted
+        if trace is not None:
+            trace.append(("receive", now, index, minted, amount - minted))
+        if amount > minted:
+            queue.append([index, now, amount - minted])
+            stats["delayed"] += 1
+            stats["delayed_volume"] += amount - minted
+
+    pos, window = 0, 64
+    while pos < len(ts_list):
+        if queue:
+            # backlog: one arrival at a time, with the retries going out before it
+            drain(ts_list[pos])
+            clock = ts_list[pos]
+            receive(pos)
+            pos += 1
+            continue
+
+        count, values, window = _first_delay(
+            _scan_crv,
+            ts_array,
+            amount_array,
+            pos,
+            len(ts_list),
+            window,
+            limit,
+            period,
+            cache_ts,
+            available,
+        )
+        if count:
+            cache_ts, available = ts_list[pos + count - 1], int(values[count - 1])
+            if trace is not None:
+                trace.extend(
+                    ("receive", ts_list[i], i, amount_list[i], 0) for i in range(pos, pos + count)
+                )
+            pos += count
+            clock = cache_ts
+        if pos < len(ts_list) and count < len(values):
+            clock = ts_list[pos]
+            receive(pos)
+            pos += 1
+
+    clock = max(clock, cache_ts)
+    drain(2**256)
+    stats["pending"] = sum(remainder for _, _, remainder in queue)
+    return stats
+
+
+def _crvusd_pair(timestamps, amounts, limit, delay, trace=None):
+    ts_list, amount_list = timestamps.tolist(), list(amounts)
+    amount_array = _exact(amount_list, sum(amount_list) + limit)
+    days = timestamps // ISSUANCE_INTERVAL
+    stats = {"delayed": 0, "delayed_volume": 0, "retries": 0}
+
+    def scan(_, amounts, issued):
+        # issuance within one day, first transfer pushing it over the limit is delayed
+        return limit - issued - np.cumsum(amounts)
+
+    pos, window = 0, 64
+    while pos < len(ts_list):
+        day_end = int(np.searchsorted(days, days[pos], side="right"))
+        issued = 0
+        while pos < day_end:
+            count, values, window = _first_delay(
+                scan, timestamps, amount_array, pos, day_end, window, issued
+            )
+            if trace is not None:
+                trace.extend(
+                    ("receive", ts_list[i], i, amount_list[i], 0) for i in range(pos, pos + count)
+                )
+            if count:
+                issued = limit - int(values[count - 1])
+                pos += count
+            if count < len(values):
+                # delayed in full, `retry` mints it without looking at the limit
+                amount = amount_list[pos]
+                if trace is not None:
+                    trace.append(("receive", ts_list[pos], pos, 0, amount))
+                stats["delayed"] += 1
+                stats["delayed_volume"] += amount
+                pos += 1
+
+    latency = delay + 1  # `_timestamp + delay < block.timestamp`
+    stats["retries"] = stats["delayed"]
+    stats["latency_sum"] = stats["delayed"] * latency
+    stats["latency_max"] = latency if stats["delayed"] else 0
+    stats["pending"] = 0
+    return stats
+
+
+def _simulate(pair, timestamps, amounts, limits, periods, trace=None):
+    results = []
+    for i, (limit, period) in enumerate(zip(limits, periods)):
+        assert period > 0 or pair is _crvusd_pair
+        stats = pair(timestamps, amounts, limit, period, trace if i == 0 else None)
+        stats["latency_mean"] = stats["latency_sum"] / stats["delayed"] if stats["delayed"] else 0
+        results.append(stats)
+    return results
+
+
+def simulate_crv(timestamps, amounts, limits, periods, trace=None):
+    """
+    Replay arrivals through the LayerZeroBridgeCRV limiter for every (limit, period) pair.
+
+    Runs of transfers which all fit are evaluated in one vectorized scan, see `_scan_crv`;
+    once something is delayed the contract is followed call by call until the backlog is
+    gone. Delayed remainders are retried oldest first, each once it is ready and the limiter
+    holds its remaining amount (capped at `limit`), which is when `retry_delayed` wakes up.
+    With a single period per pair transfers become ready in arrival order. When a
+    list is passed as `trace` the calls of the first pair are appended to it as
+    (kind, timestamp, index, minted, remainder) to be replayed against the contract.
+    """
+    return _simulate(_crv_pair, timestamps, amounts, limits, periods, trace)
+
+
+def simulate_crvusd(timestamps, amounts, limits, delays, trace=None):
+    """
+    Replay arrivals through the crvUSD bridge limiter for every (limit, delay) pair. Issuance
+    is capped per day and a delayed transfer is retried in full, without any limit, on the
+    first second `retry` accepts it.
+    """
+    return _simulate(_crvusd_pair, timestamps, amounts, limits, delays, trace)
+
+
+SIMULATORS = {"crv": simulate_crv, "crvusd": simulate_crvusd}
+
+_traffic = None
+
+
+def _load_worker(path, relay_delay):
+    global _traffic
+    _traffic = load_traffic(path, relay_delay)
+
+
+def _simulate_chunk(kind, limits, periods):
+    timestamps, amounts = _traffic
+    return SIMULATORS[kind](timestamps, amounts, limits, periods)
+
+
+def sweep(kind, grid, path=TRAFFIC, relay_delay=0, workers=None, chunk_size=4):
+    """
+    Simulate every (limit, period) pair of `grid` over the recorded traffic, split in chunks
+    across processes which each load the traffic once. Returns one stats dict per pair.
+    """
+    chunks = [grid[i : i + chunk_size] for i in range(0, len(grid), chunk_size)]
+    with ProcessPoolExecutor(
+        workers, initializer=_load_worker, initargs=(path, relay_delay)
+    ) as executor:
+        futures = [
+            executor.submit(_simulate_chunk, kind, [g[0] for g in chunk], [g[1] for g in chunk])
+            for chunk in chunks
+        ]
+        results = []
+        for chunk, future in zip(chunks, futures):
+            for (limit, period), stats in zip(chunk, future.result()):
+                results.append({"limit": limit, "period": period, **stats})
+    return results
+
+
+def report(results):
+    print(f"{'limit':>28} {'period':>8} {'delayed':>8} {'volume':>28} {'mean':>10} {'max':>10}")
+    for r in results:
+        print(
+            f"{r['limit']:>28} {r['period']:>8} {r['delayed']:>8} {r['delayed_volume']:>28} "
+            f"{r['latency_mean']:>10.0f} {r['latency_max']:>10}"
+        )
+
+
+def synthetic_traffic(n, start=1_700_000_000, mean_gap=60, mean_amount=10**21, seed=0):
+    rng = random.Random(seed)
+    timestamps, now = [], start
+    for _ in range(n):
+        now += int(rng.expovariate(1 / mean_gap))
+        timestamps.append(now)
+    amounts = [int(rng.paretovariate(1.5) * mean_amount / 3) for _ in range(n)]
+    return np.array(timestamps, dtype=np.int64), amounts
+
+
+def _replay(web3, timestamp, calls):
+    # calls sharing a timestamp have to land in the same block, in order
+    web3.provider.make_request("evm_setNextBlockTimestamp", [timestamp])
+    web3.provider.make_request("evm_setAutomine", [False])
+    try:
+        txs = [call() for call in calls]
+        web3.provider.make_request("evm_mine", [])
+    finally:
+        web3.provider.make_request("evm_setAutomine", [True])
+    for tx in txs:
+        tx.wait(1)
+    return txs
+
+
+def _amount(tx, event):
+    return sum(e["amount"] for e in tx.events[event]) if event in tx.events else 0
+
+
+def differential(n=200, seed=1):
+    """
+    Replay the trace of the simulator against the Vyper contracts on the local hardhat
+    network and compare every minted and delayed amount.
+    """
+    from brownie import (
+        CRVUSDLayerZeroBridge,
+        GaugeTypeOracle,
+        LayerZeroBridgeCRV,
+        Minter,
+        MinterProxy,
+        Token,
+        accounts,
+        chain,
+        web3,
+    )
+
+    deployer, endpoint = accounts[0], accounts[1]
+    receiver = accounts[2].address
+    tx_params = {"from": endpoint, "gas_limit": 1_000_000, "required_confs": 0}
+    mismatches = 0
+
+    # CRV: the bridge mints through Minter, which wants a gauge type for it
+    timestamps, amounts = synthetic_traffic(
+        n, start=chain[-1].timestamp + 1000, mean_gap=600, seed=seed
+    )
+    limit, period = int(np.median(amounts) * 3), 6 * 3600
+    token = Token.deploy("Curve DAO Token", "CRV", 18, {"from": deployer})
+    oracle = GaugeTypeOracle.deploy({"from": deployer})
+    minter = Minter.deploy(token, oracle, 1, {"from": deployer})
+    token.set_minter(minter, {"from": deployer})
+    oracle.set_gauge_type(
+        deployer.get_deployment_address(deployer.nonce + 1), 1, {"from": deployer}
+    )
+    bridge = LayerZeroBridgeCRV.deploy(
+        period, limit, 500_000, token, minter, endpoint, accounts[3], 101, {"from": deployer}
+    )
+    lz_address = bytes.fromhex(bridge.address[2:] * 2)
+
+    trace = []
+    simulate_crv(timestamps, amounts, [limit], [period], trace=trace)
+    groups = {}
+    for step in trace:
+        groups.setdefault(step[1], []).append(step)
+
+    arrivals, pending = {}, {}
+    for timestamp in sorted(groups):
+        calls = []
+        for kind, _, index, _, _ in groups[timestamp]:
+            if kind == "receive":
+                arrivals[index] = timestamp
+                payload = eth_abi.encode(["address", "uint256"], [receiver, amounts[index]])
+                calls.append(
+                    lambda i=index, p=payload: bridge.lzReceive(101, lz_address, i, p, tx_params)
+                )
+            else:
+                calls.append(
+                    lambda i=index: bridge.retry(i, arrivals[i], receiver, pending[i], tx_params)
+                )
+        txs = _replay(web3, timestamp, calls)
+        for (kind, _, index, minted, remainder), tx in zip(groups[timestamp], txs):
+            contract = (_amount(tx, "BridgeReceived"), _amount(tx, "Delayed"))
+            if contract != (minted, remainder):
+                mismatches += 1
+                model = (minted, remainder)
+                print(f"  crv {kind} {index} at {timestamp}: contract {contract}, model {model}")
+            pending[index] = remainder
+    print(f"crv: {len(trace)} calls replayed")
+
+    # crvUSD: daily issuance buckets, retries are not limited so only arrivals are compared
+    timestamps, amounts = synthetic_traffic(
+        n, start=chain[-1].timestamp + 1000, mean_gap=600, seed=seed
+    )
+    crvusd = Token.deploy("Curve.fi USD Stablecoin", "crvUSD", 18, {"from": deployer})
+    proxy = MinterProxy.deploy(crvusd, {"from": deployer})
+    crvusd.set_minter(proxy, {"from": deployer})
+    bridge = CRVUSDLayerZeroBridge.deploy(
+        period, limit, 101, endpoint, crvusd, proxy, {"from": deployer}
+    )
+    proxy.set_minter(bridge, True, {"from": deployer})
+    lz_address = bytes.fromhex(bridge.address[2:] * 2)
+
+    trace = []
+    simulate_crvusd(timestamps, amounts, [limit], [period], trace=trace)
+    for kind, timestamp, index, minted, remainder in trace:
+        payload = eth_abi.encode(["address", "uint256"], [receiver, amounts[index]])
+        (tx,) = _replay(
+            web3, timestamp, [lambda: bridge.lzReceive(101, lz_address, index, payload, tx_params)]
+        )
+        contract = (_amount(tx, "Issued"), _amount(tx, "Delayed"))
+        if contract != (minted, remainder):
+            mismatches += 1
+            model = (minted, remainder)
+            print(f"  crvusd {kind} {index} at {timestamp}: contract {contract}, model {model}")
+    print(f"crvusd: {len(trace)} calls replayed")
+
+    assert mismatches == 0, f"{mismatches} mismatches between the simulator and the contracts"
+
+
+def benchmark(n=1_000_000, grid_size=64, workers=None):
+    timestamps, amounts = synthetic_traffic(n)
+    limits = [int(x) for x in np.geomspace(1e22, 1e25, 8)]
+    periods = [3600 * h for h in (1, 2, 4, 6, 12, 24, 48, 96)][: max(1, grid_size // len(limits))]
+    grid = [(limit, period) for limit in limits for period in periods]
+
+    path = "synthetic_traffic.json"
+    with open(path, "w") as f:
+        json.dump(
+            {
+                "block": 0,
+                "records": [
+                    {"timestamp": int(t), "amount": str(a), "block": 0}
+                    for t, a in zip(timestamps, amounts)
+                ],
+            },
+            f,
+        )
+    try:
+        start = time.perf_counter()
+        results = sweep("crv", grid, path, workers=workers)
+        elapsed = time.perf_counter() - start
+    finally:
+        os.remove(path)
+    report(results)
+    print(f"{n} transfers x {len(grid)} pairs in {elapsed:.1f}s")
+
+
+def main(kind="crv", path=TRAFFIC):
+    differential()
+    if os.path.exists(path):
+        limits = [int(x) for x in np.geomspace(1e22, 1e25, 8)]
+        periods = [3600 * h for h in (1, 6, 24, 96)]
+        report(sweep(kind, [(limit, period) for limit in limits for period in periods], path))
@@ -0,0 +1,96 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from hexbytes import HexBytes
+from web3 import Web3
+
+from scripts.registry import registry
+
+MULTICALL3 = "0xcA11bde05977b3631167028862bE2a173976CA11"  # same address on every supported chain
+MULTICALL3_ABI = registry.abi("Multicall3")
+
+MAX_COMMITTERS = 32  # BlockHashOracle.MAX_COMMITTERS
+BATCH_SIZE = 500
+RPC_BATCH_SIZE = 100
+
+
+def aggregate(web3, calls, block_identifier="latest", multicall=MULTICALL3, batch_size=BATCH_SIZE):
+    """
+    Execute contract view calls through Multicall3, one `eth_call` per `batch_size` calls,
+    all of them sent together as JSON-RPC batches. Reverted calls are returned as None.
+    """
+    multicall = web3.eth.contract(address=multicall, abi=MULTICALL3_ABI)
+    if not isinstance(block_identifier, str):
+        block_identifier = Web3.to_hex(block_identifier)
+    batches = [calls[i : i + batch_size] for i in range(0, len(calls), batch_size)]
+    requests = []
+    for batch in batches:
+        data = multicall.functions.aggregate3(
+            [(fn.address, True, fn._encode_transaction_data()) for fn in batch]
+        )._encode_transaction_data()
+        requests.append(("eth_call", [{"to": multicall.address, "data": data}, block_identifier]))
+
+    results = []
+    for batch, raw in zip(batches, batch_request(web3, requests)):
+        (response,) = web3.codec.decode(["(bool,bytes)[]"], HexBytes(raw))
+        for fn, (success, data) in zip(batch, response):
+            if not success or len(data) == 0:
+                results.append(None)
+                continue
+            output_types = [output["type"] for output in fn.abi["outputs"]]
+            decoded = web3.codec.decode(output_types, data)
+            results.append(decoded[0] if len(decoded) == 1 else decoded)
+    return results
+
+
+def batch_request(web3, requests, batch_size=RPC_BATCH_SIZE, max_in_flight=4):
+    """
+    Send raw `(method, params)` requests as JSON-RPC batches of `batch_size`, `max_in_flight`
+    batches at a time. Returns the results in order, raising on any error.
+    """
+
+    def fetch(batch):
+        responses = web3.provider.make_batch_request(batch)
+        if not isinstance(responses, list):
+            raise ValueError(responses.get("error", responses))
+        for response in responses:
+            if response.get("error"):
+                raise ValueError(response["error"])
+        return [response["result"] for response in responses]
+
+    batches = [requests[i : i + batch_size] for i in range(0, len(requests), batch_size)]
+    results = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+        for batch_results in executor.map(fetch, batches):
+            results.extend(batch_results)
+    return results
+
+
+def block_timestamps(web3, block_numbers, batch_size=RPC_BATCH_SIZE, max_in_flight=4):
+    block_numbers = sorted(set(block_numbers))
+    blocks = batch_request(
+        web3,
+        [("eth_getBlockByNumber", [hex(block_number), False]) for block_number in block_numbers],
+        batch_size,
+        max_in_flight,
+    )
+    return {number: int(block["timestamp"], 16) for number, block in zip(block_numbers, blocks)}
+
+
+def oracle_status(web3, oracle, block_numbers, block_identifier="latest", multicall=MULTICALL3):
+    """
+    Query `threshold`, the committer list and which of `block_numbers` already have their
+    block hash applied, in a single round trip for up to `RPC_BATCH_SIZE * BATCH_SIZE` calls.
+    """
+    block_numbers = list(block_numbers)
+    calls = [oracle.functions.threshold(), oracle.functions.committer_count()]
+    # out of range indices revert and come back as None
+    calls += [oracle.functions.get_committer(i) for i in range(MAX_COMMITTERS)]
+    calls += [oracle.functions.get_block_hash(n) for n in block_numbers]
+
+    results = aggregate(web3, calls, block_identifier, multicall)
+    threshold, committer_count = results[:2]
+    committers = results[2 : 2 + committer_count]
+    applied = {
+        n: result is not None for n, result in zip(block_numbers, results[2 + MAX_COMMITTERS :])
+    }
+    return threshold, committers, applied
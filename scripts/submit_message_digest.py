@@ -1,96 +1,90 @@
-import time
-import os
+import itertools
 import json
-import eth_abi
-import rlp
+import os
+from concurrent.futures import ThreadPoolExecutor
+from getpass import getpass
 
-from eth.hash import keccak256
+import eth_abi
 from eth_account import Account, account
+from eth_utils import keccak as keccak256
 from hexbytes import HexBytes
-from getpass import getpass
-from web3 import Web3, HTTPProvider
+from web3 import HTTPProvider, Web3
 from web3.middleware import ExtraDataToPOAMiddleware
 
+from scripts import metrics
+from scripts.mpt_verifier import verify_proof_rlp
+from scripts.proof_cache import ProofCache
+from scripts.registry import registry
+from scripts.rlp_encoding import serialize_block as encode_header
+from scripts.rlp_encoding import serialize_proofs
+from scripts.tx_sender import TransactionSender, send_transaction
 
-ETH_NETWORK = f"https://eth-mainnet.alchemyapi.io/v2/{os.environ['WEB3_ETHEREUM_MAINNET_ALCHEMY_API_KEY']}"  # ALTER
-L1_NETWORK = f"https://bscrpc.com"  # ALTER
+ETH_NETWORK = (  # ALTER
+    "https://eth-mainnet.alchemyapi.io/v2/"
+    f"{os.environ.get('WEB3_ETHEREUM_MAINNET_ALCHEMY_API_KEY')}"
+)
+NETWORKS = registry.rpcs()  # chain id -> RPC, the "rpc" of `deployments/<network>.json`
 
 AGENT = 1  # ALTER
 CHAIN_ID = 56  # ALTER
 NONCE = 2  # ALTER
 MESSAGES = []  # ALTER
+TARGETS = []  # ALTER: [(agent, chain_id, nonce, messages), ...] to prove on several chains at once
 
 BLOCK_NUMBER = 21242400  # ALTER: last applied block number
 
-POA = (CHAIN_ID in (56,))
-PROVER = {
-    43114: "0xd5cF10C83aC5F30Ab27B6156DA9c238Aa63a63d0",  # avax
-    250: "0xAb0ab357a10c0161002A91426912933750082A9d",  # ftm
-    56: "0xbfF1f56c8e48e2F2F52941e16FEecc76C49f1825",  # bsc
-    2222: "0x5373E1B9f2781099f6796DFe5D68DE59ac2F18E3",  # kava
-}[CHAIN_ID]
+POA_CHAINS = (56,)
+PROVERS = registry.addresses("message_digest_prover")
+L1_NETWORK = registry.rpc(CHAIN_ID)
+PROVER = PROVERS[CHAIN_ID]
 
 BROADCASTER = "0x5786696bB5bE7fCDb9997E7f89355d9e97FF8d89"
-MESSAGE_DIGEST_PROVER_ABI = [{'inputs': [{'internalType': 'address', 'name': '_block_hash_oracle', 'type': 'address'}, {'internalType': 'address', 'name': '_relayer', 'type': 'address'}], 'stateMutability': 'nonpayable', 'type': 'constructor'}, {'inputs': [], 'name': 'BLOCK_HASH_ORACLE', 'outputs': [{'internalType': 'address', 'name': '', 'type': 'address'}], 'stateMutability': 'view', 'type': 'function'}, {'inputs': [], 'name': 'RELAYER', 'outputs': [{'internalType': 'address', 'name': '', 'type': 'address'}], 'stateMutability': 'view', 'type': 'function'}, {'inputs': [], 'name': 'nonce', 'outputs': [{'internalType': 'uint256', 'name': '', 'type': 'uint256'}], 'stateMutability': 'view', 'type': 'function'}, {'inputs': [{'internalType': 'uint256', 'name': '_agent', 'type': 'uint256'}, {'components': [{'internalType': 'address', 'name': 'target', 'type': 'address'}, {'internalType': 'bytes', 'name': 'data', 'type': 'bytes'}], 'internalType': 'struct IRelayer.Message[]', 'name': '_messages', 'type': 'tuple[]'}, {'internalType': 'bytes', 'name': '_block_header_rlp', 'type': 'bytes'}, {'internalType': 'bytes', 'name': '_proof_rlp', 'type': 'bytes'}], 'name': 'prove', 'outputs': [], 'stateMutability': 'nonpayable', 'type': 'function'}]
-
-# https://github.com/ethereum/go-ethereum/blob/master/core/types/block.go#L69
-BLOCK_HEADER = (
-    "parentHash",
-    "sha3Uncles",
-    "miner",
-    "stateRoot",
-    "transactionsRoot",
-    "receiptsRoot",
-    "logsBloom",
-    "difficulty",
-    "number",
-    "gasLimit",
-    "gasUsed",
-    "timestamp",
-    "extraData",
-    "mixHash",
-    "nonce",
-    "baseFeePerGas",  # added by EIP-1559 and is ignored in legacy headers
-    "withdrawalsRoot",  # added by EIP-4895 and is ignored in legacy headers
-    "blobGasUsed",  # added by EIP-4844 and is ignored in legacy headers
-    "excessBlobGas",  # added by EIP-4844 and is ignored in legacy headers
-    "parentBeaconBlockRoot",  # added by EIP-4788 and is ignored in legacy headers
-)
+MESSAGE_DIGEST_PROVER_ABI = registry.abi("MessageDigestProver")
 
 
 def serialize_block(block):
-    block_header = [
-        HexBytes("0x") if (isinstance((v := block.get(k, 0)), int) and v == 0) or v == "0x0" else HexBytes(block[k])
-        for k in BLOCK_HEADER
-    ]
-    encoded = rlp.encode(block_header)
+    encoded = encode_header(block)
 
     # Helper: https://blockhash.ardis.lu
     assert keccak256(encoded) == block["hash"], "Badly encoded block"
     return encoded
 
 
-def serialize_proofs(proofs):
-    account_proof = list(map(rlp.decode, map(HexBytes, proofs["accountProof"])))
-    storage_proofs = [
-        list(map(rlp.decode, map(HexBytes, proof["proof"]))) for proof in proofs["storageProof"]
-    ]
-    return rlp.encode([account_proof, *storage_proofs])
-
-
 def hashmap(eth_web3, slot, value, type):
     if isinstance(slot, HexBytes):
         slot = int(slot.hex(), 16)
     return eth_web3.keccak(eth_abi.encode([f"(uint256,{type})"], [[slot, value]]))
 
 
-def generate_proof(eth_web3, agent=AGENT, chain_id=CHAIN_ID, nonce=NONCE, block_number=BLOCK_NUMBER, log=False):
-    block = eth_web3.eth.get_block(block_number)
+def get_message_digest_slot(eth_web3, agent, chain_id, nonce):
+    slot = hashmap(eth_web3, 8, agent, "uint256")
+    slot = hashmap(eth_web3, slot, chain_id, "uint256")
+    return hashmap(eth_web3, slot, nonce, "uint256")
+
+
+@metrics.timed()
+def generate_proof(
+    eth_web3,
+    agent=AGENT,
+    chain_id=CHAIN_ID,
+    nonce=NONCE,
+    block_number=BLOCK_NUMBER,
+    cache=None,
+    log=False,
+):
+    cache = cache or ProofCache()
+    eth_chain_id = eth_web3.eth.chain_id
+    block_header_rlp = cache.header(eth_web3, eth_chain_id, block_number, serialize_block)
     if log:
-        print(f"Generating proof for block {block.number}, {block.hash.hex()}")
-    block_header_rlp = serialize_block(block)
-    message_digest_slot = hashmap(eth_web3, hashmap(eth_web3, hashmap(eth_web3, 8, agent, "uint256"), chain_id, "uint256"), nonce, "uint256")
-    proof_rlp = serialize_proofs(eth_web3.eth.get_proof(BROADCASTER, [message_digest_slot], block_number))
+        print(f"Generating proof for block {block_number}, {keccak256(block_header_rlp).hex()}")
+    message_digest_slot = get_message_digest_slot(eth_web3, agent, chain_id, nonce)
+    proof = cache.proof(eth_web3, eth_chain_id, BROADCASTER, [message_digest_slot], block_number)
+    proof_rlp = serialize_proofs(proof)
+    # check the proof locally the way the prover does before paying for a transaction
+    _, (message_digest,) = verify_proof_rlp(
+        block_header_rlp, proof_rlp, BROADCASTER, [message_digest_slot]
+    )
+    assert message_digest.exists, "Message digest is not set at this block"
 
     with open("header.txt", "w") as f:
         f.write(block_header_rlp.hex())
@@ -100,23 +94,132 @@ def generate_proof(eth_web3, agent=AGENT, chain_id=CHAIN_ID, nonce=NONCE, block_
     return block_header_rlp.hex(), proof_rlp.hex()
 
 
-def send_transaction(web3, signer, func):
-    tx = func.build_transaction(
-        {
-            "from": signer.address,
-            "nonce": web3.eth.get_transaction_count(signer.address),
+@metrics.timed()
+def generate_proofs(eth_web3, targets=TARGETS, block_number=BLOCK_NUMBER, cache=None, log=False):
+    # a single `eth_getProof` of the broadcaster, split into one (header, proof) pair per target
+    cache = cache or ProofCache()
+    eth_chain_id = eth_web3.eth.chain_id
+    block_header_rlp = cache.header(eth_web3, eth_chain_id, block_number, serialize_block)
+    if log:
+        block_hash = keccak256(block_header_rlp).hex()
+        print(f"Generating {len(targets)} proofs for block {block_number}, {block_hash}")
+    slots = [
+        get_message_digest_slot(eth_web3, agent, chain_id, nonce)
+        for agent, chain_id, nonce, _ in targets
+    ]
+    proofs = cache.proof(eth_web3, eth_chain_id, BROADCASTER, slots, block_number)
+
+    proof_rlp = serialize_proofs(proofs)
+    _, message_digests = verify_proof_rlp(block_header_rlp, proof_rlp, BROADCASTER, slots)
+    for target, message_digest in zip(targets, message_digests):
+        assert message_digest.exists, f"Message digest of {target[:3]} is not set at this block"
+
+    return [
+        (
+            block_header_rlp.hex(),
+            serialize_proofs({**proofs, "storageProof": [storage_proof]}).hex(),
+        )
+        for storage_proof in proofs["storageProof"]
+    ]
+
+
+def encode_messages(messages):
+    encoded_messages = []
+    for addr, calldata in messages:
+        if isinstance(calldata, str):
+            encoded_messages.append((addr, bytes.fromhex(calldata)))
+        else:
+            encoded_messages.append((addr, calldata))
+    return encoded_messages
+
+
+def connect(network, chain_id):
+    web3 = Web3(HTTPProvider(network))
+    if chain_id in POA_CHAINS:
+        web3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    return metrics.instrument(web3)
+
+
+def _submit_chain(network, chain_id, prover, signer, jobs):
+    web3 = connect(network, chain_id)
+    prover = web3.eth.contract(address=prover, abi=MESSAGE_DIGEST_PROVER_ABI)
+    sender = TransactionSender(web3, signer)
+
+    # the prover takes the nonces of an agent in order, and `prove` of the next nonce only
+    # estimates once the previous one is mined: every round submits the lowest open nonce of
+    # each agent back to back and waits for them
+    by_agent = {}
+    for job in sorted(jobs, key=lambda job: job[0][2]):
+        by_agent.setdefault(job[0][0], []).append(job)
+    try:
+        for batch in itertools.zip_longest(*by_agent.values()):
+            for (agent, _, _, messages), (block_header_rlp, proof_rlp) in filter(None, batch):
+                func = prover.functions.prove(
+                    agent,
+                    encode_messages(messages),
+                    bytes.fromhex(block_header_rlp),
+                    bytes.fromhex(proof_rlp),
+                )
+                sender.submit(func)
+            receipts = sender.wait()
+            if any(receipt["status"] == 0 for receipt in receipts):
+                raise RuntimeError(f"prove reverted on {chain_id}, later nonces cannot follow")
+    except Exception:
+        # whatever made it to the chain is awaited before giving up on the rest
+        if sender.pending:
+            sender.wait()
+        raise
+    finally:
+        for receipt in sender.receipts.values():
+            metrics.observe(
+                "proof_gas_used", receipt["gasUsed"], metrics.GAS, kind="message_digest"
+            )
+    return sender.stats()
+
+
+def fan_out(
+    eth_web3,
+    signer,
+    targets=TARGETS,
+    block_number=BLOCK_NUMBER,
+    networks=NETWORKS,
+    provers=PROVERS,
+    log=False,
+):
+    """
+    Prove `targets` on their chains at once, one nonce pipeline per chain. A chain that fails
+    does not hold up the others, its stats are {"error": ...}.
+    """
+    proofs = generate_proofs(eth_web3, targets, block_number, log=log)
+
+    jobs = {}
+    for target, proof in zip(targets, proofs):
+        jobs.setdefault(target[1], []).append((target, proof))
+
+    # every destination chain gets its own connection and nonce pipeline
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        futures = {
+            chain_id: executor.submit(
+                _submit_chain, networks[chain_id], chain_id, provers[chain_id], signer, chain_jobs
+            )
+            for chain_id, chain_jobs in jobs.items()
         }
-    )
-    tx["gas"] = int(1.5 * web3.eth.estimate_gas(tx))
+        stats = {}
+        for chain_id, future in futures.items():
+            try:
+                stats[chain_id] = future.result()
+            except Exception as e:
+                stats[chain_id] = {"error": repr(e)}
 
-    signed_tx = web3.eth.account.sign_transaction(tx, private_key=signer.key)
-    tx_hash = web3.eth.send_raw_transaction(signed_tx.raw_transaction)
-    web3.eth.wait_for_transaction_receipt(tx_hash)
-    time.sleep(20)  # wait for tx to propagate to nodes
-    return web3.eth.get_transaction_receipt(tx_hash)
+    if log:
+        for chain_id, chain_stats in stats.items():
+            print(f"  {chain_id}: {chain_stats}")
+    return stats
 
 
-def submit_proof(agent=AGENT, messages=MESSAGES, proofs=None, prover=PROVER, web3=None, signer=None):
+def submit_proof(
+    agent=AGENT, messages=MESSAGES, proofs=None, prover=PROVER, web3=None, signer=None
+):
     if proofs:
         block_header_rlp, proof_rlp = proofs
     else:
@@ -125,36 +228,35 @@ def submit_proof(agent=AGENT, messages=MESSAGES, proofs=None, prover=PROVER, web
         with open("proof.txt") as f:
             proof_rlp = f.read()
 
-    encoded_messages = []
-    for addr, calldata in messages:
-        if isinstance(calldata, str):
-            encoded_messages.append((addr, bytes.fromhex(calldata)))
-        else:
-            encoded_messages.append((addr, calldata))
+    encoded_messages = encode_messages(messages)
 
     if isinstance(prover, str):
         prover = web3.eth.contract(address=prover, abi=MESSAGE_DIGEST_PROVER_ABI)
-        send_transaction(
-            web3,
-            signer,
-            prover.functions.prove(agent, encoded_messages, bytes.fromhex(block_header_rlp), bytes.fromhex(proof_rlp))
+        func = prover.functions.prove(
+            agent, encoded_messages, bytes.fromhex(block_header_rlp), bytes.fromhex(proof_rlp)
         )
+        receipt = send_transaction(web3, signer, func)
+        metrics.observe("proof_gas_used", receipt["gasUsed"], metrics.GAS, kind="message_digest")
     else:
-        prover.prove(agent, encoded_messages, bytes.fromhex(block_header_rlp), bytes.fromhex(proof_rlp))
+        prover.prove(
+            agent, encoded_messages, bytes.fromhex(block_header_rlp), bytes.fromhex(proof_rlp)
+        )
 
 
 def account_load_pkey(fname):
-    path = os.path.expanduser(os.path.join('~', '.brownie', 'accounts', fname + '.json'))
-    with open(path, 'r') as f:
+    path = os.path.expanduser(os.path.join("~", ".brownie", "accounts", fname + ".json"))
+    with open(path, "r") as f:
         pkey = account.decode_keyfile_json(json.load(f), getpass())
         return Account.from_key(pkey)
 
 
 if __name__ == "__main__":
-    eth_web3 = Web3(HTTPProvider(ETH_NETWORK))
-    web3 = Web3(HTTPProvider(L1_NETWORK))
-    if POA:
-        web3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    metrics.enable_from_env()
+    eth_web3 = metrics.instrument(Web3(HTTPProvider(ETH_NETWORK)))
     signer = account_load_pkey("keeper")  # ALTER
-    proofs = generate_proof(eth_web3, log=True)
-    submit_proof(web3=web3, signer=signer, proofs=proofs)
+    if TARGETS:
+        fan_out(eth_web3, signer, log=True)
+    else:
+        web3 = connect(L1_NETWORK, CHAIN_ID)
+        proofs = generate_proof(eth_web3, log=True)
+        submit_proof(web3=web3, signer=signer, proofs=proofs)
@@ -0,0 +1,241 @@
+import json
+import os
+import sys
+from getpass import getpass
+
+import eth_abi
+from eth_account import Account, account
+from eth_utils import keccak
+from web3 import HTTPProvider, Web3
+
+from scripts import gas_model, metrics
+from scripts.mpt_verifier import verify_proof_rlp
+from scripts.proof_cache import ProofCache
+from scripts.registry import registry
+from scripts.rlp_encoding import (
+    encode_raw_list,
+    list_prefix,
+    serialize_block,
+    serialize_proofs,
+    to_bytes,
+)
+from scripts.status_query import aggregate
+from scripts.tx_sender import TransactionSender
+
+ETH_NETWORK = (  # ALTER
+    "https://eth-mainnet.alchemyapi.io/v2/"
+    f"{os.environ.get('WEB3_ETHEREUM_MAINNET_ALCHEMY_API_KEY')}"
+)
+NETWORK = "https://api.avax.network/ext/bc/C/rpc"  # ALTER
+CHAIN = "avalanche"  # ALTER: network of `deployments/` to sync
+
+BLOCK_HASH_ORACLE = registry.address(CHAIN, "block_hash_oracle")
+GAUGE_TYPE_ORACLE = registry.address(CHAIN, "gauge_type_oracle")
+GAUGE_TYPE_VERIFIER = registry.address(CHAIN, "gauge_type_prover")
+
+GAUGE_CONTROLLER = "0x2F50D538606Fa9EDD2B11E2446BEb18C9D5846bB"
+GAUGE_TYPES_SLOT = 8
+
+GAS_BUDGET = 0.5  # fraction of the destination block gas limit a single batch may use
+
+GAUGE_CONTROLLER_ABI = registry.abi("GaugeController")
+GAUGE_TYPE_ORACLE_ABI = registry.abi("GaugeTypeOracle")
+GAUGE_TYPE_VERIFIER_ABI = registry.abi("GaugeTypeVerifier")
+BLOCK_HASH_ORACLE_ABI = registry.abi("BlockHashOracle")
+
+
+def gauge_type_key(gauge):
+    return keccak(eth_abi.encode(["uint256", "address"], [GAUGE_TYPES_SLOT, gauge]))
+
+
+def find_unsynced(eth_web3, web3, block_number, oracle=GAUGE_TYPE_ORACLE):
+    """
+    Diff the gauge types of the mainnet GaugeController at `block_number` against the
+    sidechain oracle, returning the gauges which are missing or hold a different type.
+    """
+    controller = eth_web3.eth.contract(address=GAUGE_CONTROLLER, abi=GAUGE_CONTROLLER_ABI)
+    n_gauges = controller.functions.n_gauges().call(block_identifier=block_number)
+    gauges = aggregate(
+        eth_web3, [controller.functions.gauges(i) for i in range(n_gauges)], block_number
+    )
+    gauge_types = aggregate(
+        eth_web3, [controller.functions.gauge_types(gauge) for gauge in gauges], block_number
+    )
+
+    oracle = web3.eth.contract(address=oracle, abi=GAUGE_TYPE_ORACLE_ABI)
+    # unset gauges revert on the oracle and come back as None
+    synced = aggregate(web3, [oracle.functions.get_gauge_type(gauge) for gauge in gauges])
+
+    return [
+        gauge
+        for gauge, gauge_type, synced_type in zip(gauges, gauge_types, synced)
+        if gauge_type is not None and synced_type != gauge_type
+    ]
+
+
+def _batch_call(verifier, block_header_rlp, proofs, batch):
+    gauges = [gauge for gauge, _ in batch]
+    proof_rlp = serialize_proofs({**proofs, "storageProof": [proof for _, proof in batch]})
+    func = verifier.functions.verifyGaugeTypeByBlockHash(gauges, block_header_rlp, proof_rlp)
+    features = gas_model.proof_features(block_header_rlp, proof_rlp)
+    return func, gas_model.estimate(func, "gauge_type", features)
+
+
+def _padding(length):
+    return -length % 32
+
+
+def _word_zeros(value):
+    return value.to_bytes(32, "big").count(0)
+
+
+class _BatchSize:
+    """
+    Calldata size, zero bytes and proof features of a `verifyGaugeTypeByBlockHash` call,
+    summed up as gauges are added instead of encoding the call again for each one.
+    """
+
+    def __init__(self, block_header_rlp, proofs):
+        self.header = len(block_header_rlp)
+        self.header_zeros = block_header_rlp.count(0) + _padding(self.header)
+        account_proof = encode_raw_list([to_bytes(node) for node in proofs["accountProof"]])
+        self.size, self.zeros = len(account_proof), account_proof.count(0)
+        self.nodes = len(proofs["accountProof"])
+        self.gauges, self.gauge_zeros = 0, 0
+
+    @staticmethod
+    def item(gauge, proof):
+        encoded = encode_raw_list([to_bytes(node) for node in proof["proof"]])
+        # an address word is 12 zero bytes followed by the address
+        return len(encoded), encoded.count(0), len(proof["proof"]), 12 + to_bytes(gauge).count(0)
+
+    def add(self, item):
+        size, zeros, nodes, gauge_zeros = item
+        self.size += size
+        self.zeros += zeros
+        self.nodes += nodes
+        self.gauges += 1
+        self.gauge_zeros += gauge_zeros
+
+    def gas(self):
+        prefix = list_prefix(self.size)
+        proof = len(prefix) + self.size
+        # selector, 3 offsets, then the length prefixed address[], header and proof
+        header_offset = 96 + 32 * (self.gauges + 1)
+        proof_offset = header_offset + 32 + self.header + _padding(self.header)
+        length = 4 + proof_offset + 32 + proof + _padding(proof)
+        zeros = (
+            sum(_word_zeros(word) for word in (96, header_offset, proof_offset))
+            + sum(_word_zeros(word) for word in (self.gauges, self.header, proof))
+            + self.gauge_zeros
+            + self.header_zeros
+            + prefix.count(0)
+            + self.zeros
+            + _padding(proof)
+        )
+        words = (self.header + proof + 31) // 32
+        features = {
+            "const": 1,
+            "header_bytes": self.header,
+            "proof_nodes": self.nodes,
+            "proof_bytes": proof,
+            "proof_words_sq": (2 * words) ** 2 // 512,
+            "storage_proofs": self.gauges,
+        }
+        return int(
+            gas_model.MARGIN
+            * (
+                gas_model.calldata_gas_by_size(length, zeros)
+                + gas_model.execution_gas("gauge_type", features)
+            )
+        )
+
+
+def pack_batches(verifier, gauges, block_header_rlp, proofs, gas_limit):
+    """
+    Greedily split `gauges` into `verifyGaugeTypeByBlockHash` calls, each predicted to use
+    at most `gas_limit`. Returns a list of (func, gas) pairs.
+
+    Every storage proof is encoded once to size it, a call is only built for a full batch.
+    Batches are sized by the gas model even when it is not calibrated, the gas limit of the
+    call itself comes from `gas_model.estimate` or `eth_estimateGas`.
+    """
+    calls, batch, size = [], [], _BatchSize(block_header_rlp, proofs)
+    for gauge, proof in zip(gauges, proofs["storageProof"]):
+        item = size.item(gauge, proof)
+        size.add(item)
+        if batch and size.gas() > gas_limit:
+            calls.append(_batch_call(verifier, block_header_rlp, proofs, batch))
+            batch, size = [], _BatchSize(block_header_rlp, proofs)
+            size.add(item)
+        batch.append((gauge, proof))
+    if batch:
+        calls.append(_batch_call(verifier, block_header_rlp, proofs, batch))
+    return calls
+
+
+@metrics.timed()
+def fetch_proofs(eth_web3, gauges, block_number, cache=None):
+    cache = cache or ProofCache()
+    eth_chain_id = eth_web3.eth.chain_id
+    block_header_rlp = cache.header(eth_web3, eth_chain_id, block_number, serialize_block)
+    keys = [gauge_type_key(gauge) for gauge in gauges]
+    proofs = cache.proof(eth_web3, eth_chain_id, GAUGE_CONTROLLER, keys, block_number)
+
+    proof_rlp = serialize_proofs(proofs)
+    _, gauge_types = verify_proof_rlp(block_header_rlp, proof_rlp, GAUGE_CONTROLLER, keys)
+    for gauge, gauge_type in zip(gauges, gauge_types):
+        assert gauge_type.exists and gauge_type.value != 0, f"Gauge type of {gauge} is not set"
+    return block_header_rlp, proofs
+
+
+def generate_proof(eth_web3, gauges, block_number, cache=None):
+    block_header_rlp, proofs = fetch_proofs(eth_web3, gauges, block_number, cache)
+    return block_header_rlp, serialize_proofs(proofs)
+
+
+def sync(eth_web3, web3, signer, block_number, gas_budget=GAS_BUDGET, cache=None, log=False):
+    oracle = web3.eth.contract(address=BLOCK_HASH_ORACLE, abi=BLOCK_HASH_ORACLE_ABI)
+    verifier = web3.eth.contract(address=GAUGE_TYPE_VERIFIER, abi=GAUGE_TYPE_VERIFIER_ABI)
+
+    gauges = find_unsynced(eth_web3, web3, block_number)
+    if not gauges:
+        if log:
+            print("All gauge types are synced")
+        return []
+
+    # one proof for every gauge, split into batches by predicted gas
+    block_header_rlp, proofs = fetch_proofs(eth_web3, gauges, block_number, cache)
+    block_hash = oracle.functions.get_block_hash(block_number).call()
+    assert keccak(block_header_rlp) == block_hash, "Block hash mismatch with the oracle"
+    gas_limit = int(web3.eth.get_block("latest")["gasLimit"] * gas_budget)
+    calls = pack_batches(verifier, gauges, block_header_rlp, proofs, gas_limit)
+    if log:
+        print(f"{len(gauges)} gauges to sync in {len(calls)} batches")
+
+    sender = TransactionSender(web3, signer)
+    for func, gas in calls:
+        sender.submit(func, gas=gas)
+    receipts = sender.wait()
+    for receipt in receipts:
+        metrics.observe("proof_gas_used", receipt["gasUsed"], metrics.GAS, kind="gauge_type")
+
+    if log:
+        print(f"Sender stats: {sender.stats()}")
+    return receipts
+
+
+def account_load_pkey(fname):
+    path = os.path.expanduser(os.path.join("~", ".brownie", "accounts", fname + ".json"))
+    with open(path, "r") as f:
+        pkey = account.decode_keyfile_json(json.load(f), getpass())
+        return Account.from_key(pkey)
+
+
+if __name__ == "__main__":
+    metrics.enable_from_env()
+    eth_web3 = metrics.instrument(Web3(HTTPProvider(ETH_NETWORK)))
+    web3 = metrics.instrument(Web3(HTTPProvider(NETWORK)))
+    signer = account_load_pkey("keeper")  # ALTER
+    # an applied block number, `python -m scripts.sync_gauge_types <block number>`
+    sync(eth_web3, web3, signer, int(sys.argv[1]), log=True)
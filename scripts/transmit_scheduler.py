@@ -0,0 +1,308 @@
+import json
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from getpass import getpass
+
+from eth_account import Account, account
+from web3 import HTTPProvider, Web3
+from web3.middleware import ExtraDataToPOAMiddleware
+
+from scripts.log_scanner import LogScanner
+from scripts.registry import registry
+from scripts.status_query import aggregate, batch_request
+from scripts.tx_sender import TransactionSender
+
+ETH_NETWORK = (  # ALTER
+    "https://eth-mainnet.alchemyapi.io/v2/"
+    f"{os.environ.get('WEB3_ETHEREUM_MAINNET_ALCHEMY_API_KEY')}"
+)
+
+# ALTER: block hash senders on Ethereum and the oracles they feed, ccip destinations look like
+# {"kind": "ccip", "sender": CCIP_SENDER, "selector": <selector>, "network": ..., "oracle": ...}
+CCIP_SENDER = "0x51a00F38CB1c055EbbBE380D3bA3D27CAE5d9e61"
+DESTINATIONS = {
+    43114: {
+        "kind": "layerzero",
+        "sender": "0x90fe734080403F9dBDb343478A390B901CF3922C",
+        "network": "https://api.avax.network/ext/bc/C/rpc",
+        "oracle": "0xD823D2a2B5AF77835e972A0D5B77f5F5A9a003A6",
+    },
+    250: {
+        "kind": "layerzero",
+        "sender": "0x9116ED9cfA7f291C3F7c8F855Db065c7ab5723e7",
+        "network": "https://rpc.ftm.tools",
+        "oracle": "0xF179D410C710e3c35A17468B2624dCFCC7DB8267",
+    },
+    56: {
+        "kind": "layerzero",
+        "sender": "0x49cdecc38B4CAf6a07c13558A32820333BC2aB61",
+        "network": "https://bscrpc.com",
+        "oracle": "0x7cDe6Ef7e2e2FD3B6355637F1303586D7262ba37",
+    },
+    2222: {
+        "kind": "layerzero",
+        "sender": "0xbBFE8c07430a2ccc00A12874534Fe7f929914e7D",
+        "network": "https://evm.kava.io",
+        "oracle": "0x05d4E2Ed7216A204e5FB4e3F5187eCfaa5eF3Ef7",
+    },
+}
+POA_CHAINS = (56,)
+
+DIGEST_TARGETS = []  # ALTER: [(agent, chain_id, nonce), ...] waiting for a message digest proof
+GAUGE_TARGETS = []  # ALTER: [(chain_id, gauge), ...] waiting for a gauge type proof
+
+# `transmit` accepts `block.number - 256 <= n < block.number - 64`, the newest block allowed
+# once the transaction is mined is `head - 64`, and it stays valid for another 192 blocks
+TRANSMIT_DELAY = 64
+MAX_WAIT = 120  # ALTER: seconds a proof may wait for others to share its block hash
+APPLY_TIMEOUT = 1800  # ALTER: seconds to wait for a transmitted hash to be applied before resending
+# ALTER: LayerZero refunds whatever the fee does not use to `_refund_address` (the caller), the
+# CCIP sender forwards all of `msg.value` to the router which keeps it, so CCIP is paid exactly
+FEE_BUFFER = 1.1
+LOOKBACK = 7200  # sidechain blocks to look back for applied block hashes
+
+LAYERZERO_SENDER_ABI = registry.abi("LayerZeroSender")
+CCIP_SENDER_ABI = registry.abi("CCIPSender")
+BLOCK_HASH_ORACLE_ABI = registry.abi("BlockHashOracle")
+
+
+def message_digest_job(agent, chain_id, nonce):
+    # the digest is written to the broadcaster, any block after that proves it
+    from scripts.submit_message_digest import BROADCASTER, get_message_digest_slot
+
+    slot = get_message_digest_slot(Web3, agent, chain_id, nonce)
+    return {
+        "chain_id": chain_id,
+        "account": BROADCASTER,
+        "slot": slot,
+        "name": f"digest {agent}/{nonce}",
+    }
+
+
+def gauge_type_job(chain_id, gauge):
+    from scripts.sync_gauge_types import GAUGE_CONTROLLER, gauge_type_key
+
+    return {
+        "chain_id": chain_id,
+        "account": GAUGE_CONTROLLER,
+        "slot": gauge_type_key(gauge),
+        "name": f"gauge {gauge}",
+    }
+
+
+def connect(network, chain_id):
+    web3 = Web3(HTTPProvider(network))
+    if chain_id in POA_CHAINS:
+        web3.middleware_onion.inject(ExtraDataToPOAMiddleware, layer=0)
+    return web3
+
+
+class TransmitScheduler:
+    """
+    Transmit as few block hashes as possible for the proofs waiting on the sidechains.
+
+    A job waits for the hash of any block at which storage `slot` of `account` on Ethereum
+    is set (a message digest, a gauge type). Jobs already covered by the latest applied
+    block hash of their chain are done. The others share one block per round, the newest
+    `transmit` accepts, which is sent to every destination that needs it at once. A job
+    whose slot was only set in the last 64 blocks is not provable yet; jobs on the same
+    chain hold back for it for up to `max_wait` seconds so a single hash covers them all.
+    Once transmitted, a chain is left alone until the hash is applied or `apply_timeout`
+    passes.
+    """
+
+    def __init__(
+        self,
+        eth_web3,
+        signer,
+        destinations=DESTINATIONS,
+        max_wait=MAX_WAIT,
+        apply_timeout=APPLY_TIMEOUT,
+        log=False,
+    ):
+        self.eth_web3 = eth_web3
+        self.destinations = destinations
+        self.max_wait = max_wait
+        self.apply_timeout = apply_timeout
+        self.log = log
+
+        self.sender = TransactionSender(eth_web3, signer)
+        self.jobs = []
+        self.ready_since = {}  # chain id -> time the first job became provable
+        self.transmitted = {}  # chain id -> (block number, time) on its way to the oracle
+        self.quotes = {}  # block number -> {chain id: fee}
+        self.scanners = {}
+
+        self.contracts = {}
+        for chain_id, destination in destinations.items():
+            abi = CCIP_SENDER_ABI if destination["kind"] == "ccip" else LAYERZERO_SENDER_ABI
+            self.contracts[chain_id] = eth_web3.eth.contract(address=destination["sender"], abi=abi)
+
+    def _print(self, message):
+        if self.log:
+            print(message, flush=True)
+
+    def add(self, job):
+        self.jobs.append(job)
+
+    def _scanner(self, chain_id):
+        if chain_id not in self.scanners:
+            destination = self.destinations[chain_id]
+            web3 = connect(destination["network"], chain_id)
+            oracle = web3.eth.contract(address=destination["oracle"], abi=BLOCK_HASH_ORACLE_ABI)
+            self.scanners[chain_id] = LogScanner(
+                web3,
+                lambda lo, hi: oracle.events.ApplyBlockHash().get_logs(from_block=lo, to_block=hi),
+                lambda log: {"number": log["args"]["number"]},
+                f"applied-{chain_id}.json",
+                lookback=LOOKBACK,
+            )
+        return self.scanners[chain_id]
+
+    def latest_applied(self, chain_ids):
+        # every sidechain is scanned concurrently, each from its own checkpoint
+        def latest(chain_id):
+            return max((r["number"] for r in self._scanner(chain_id).scan()), default=None)
+
+        with ThreadPoolExecutor(max_workers=max(len(chain_ids), 1)) as executor:
+            return dict(zip(chain_ids, executor.map(latest, chain_ids)))
+
+    def _is_set(self, reads):
+        # (account, slot, block) -> whether the slot holds anything at that block, every read
+        # of a round goes out in JSON-RPC batches instead of one request each
+        reads = [key for key in dict.fromkeys(reads) if key[2] is not None]
+        values = batch_request(
+            self.eth_web3,
+            [
+                ("eth_getStorageAt", [account, Web3.to_hex(slot), hex(block_number)])
+                for account, slot, block_number in reads
+            ],
+        )
+        is_set = {key: int(value, 16) != 0 for key, value in zip(reads, values)}
+        return defaultdict(bool, is_set)
+
+    def quote(self, chain_ids, head):
+        # fees move with the block, every destination is quoted in one call per block
+        if head not in self.quotes:
+            self.quotes = {head: {}}
+        missing = [chain_id for chain_id in chain_ids if chain_id not in self.quotes[head]]
+        calls = []
+        for chain_id in missing:
+            contract, destination = self.contracts[chain_id], self.destinations[chain_id]
+            if destination["kind"] == "ccip":
+                calls.append(contract.functions.quote(destination["selector"]))
+            else:
+                calls.append(contract.functions.quote())
+        for chain_id, fee in zip(missing, aggregate(self.eth_web3, calls, head)):
+            self.quotes[head][chain_id] = fee
+        return {chain_id: self.quotes[head][chain_id] for chain_id in chain_ids}
+
+    def plan(self, head):
+        """
+        Sort the jobs at `head` into done, provable with a fresh block hash and not yet
+        provable. Returns the block number to transmit and the chains to transmit it to.
+        """
+        block_number = head - TRANSMIT_DELAY
+        now = time.time()
+        self.transmitted = {
+            chain_id: (number, sent)
+            for chain_id, (number, sent) in self.transmitted.items()
+            if now - sent < self.apply_timeout
+        }
+        applied = self.latest_applied(sorted({job["chain_id"] for job in self.jobs}))
+        in_flight = {chain_id: self.transmitted.get(chain_id, (None,))[0] for chain_id in applied}
+
+        reads = []
+        for job in self.jobs:
+            chain_id = job["chain_id"]
+            for number in (applied[chain_id], in_flight[chain_id], block_number, head):
+                reads.append((job["account"], job["slot"], number))
+        is_set = self._is_set(reads)
+
+        jobs, ready, waiting = [], set(), set()
+        for job in self.jobs:
+            chain_id = job["chain_id"]
+            key = (job["account"], job["slot"])
+            if is_set[(*key, applied[chain_id])]:
+                self._print(
+                    f"  {job['name']} on {chain_id}: covered by applied block {applied[chain_id]}"
+                )
+                continue
+            jobs.append(job)
+            if is_set[(*key, in_flight[chain_id])]:
+                continue  # covered by a transmitted hash which is not applied yet
+            if is_set[(*key, block_number)]:
+                ready.add(chain_id)
+            elif is_set[(*key, head)]:
+                waiting.add(chain_id)
+        self.jobs = jobs
+
+        # a chain which is done or waiting on a transmitted hash starts over the next time
+        self.ready_since = {c: t for c, t in self.ready_since.items() if c in ready}
+        chains = []
+        for chain_id in sorted(ready):
+            since = self.ready_since.setdefault(chain_id, now)
+            if chain_id not in waiting or now - since >= self.max_wait:
+                chains.append(chain_id)
+        return block_number, chains
+
+    def transmit(self, block_number, chain_ids, head):
+        fees = self.quote(chain_ids, head)
+        nonces = {}
+        for chain_id in chain_ids:
+            contract, destination = self.contracts[chain_id], self.destinations[chain_id]
+            if destination["kind"] == "ccip":
+                func = contract.functions.transmit(destination["selector"], block_number)
+                value = fees[chain_id]
+            else:
+                func = contract.functions.transmit(block_number)
+                # the quote is taken at `head`, the buffer covers the fee moving until it is
+                # mined and comes back as a refund
+                value = int(fees[chain_id] * FEE_BUFFER)
+            # back to back from one nonce pipeline, nothing waits on the previous destination
+            self.sender.submit(func, params={"value": value})
+            nonces[chain_id] = self.sender.nonce - 1
+            self.ready_since.pop(chain_id, None)
+            self.transmitted[chain_id] = (block_number, time.time())
+            self._print(f"  transmit {block_number} to {chain_id} for {value}")
+        receipts = self.sender.wait()
+        for chain_id, nonce in nonces.items():
+            if self.sender.receipts[nonce]["status"] == 0:
+                # e.g. the CCIP fee rose above the exact quote, try again next round
+                self.transmitted.pop(chain_id, None)
+                self._print(f"  transmit to {chain_id} reverted")
+        return receipts
+
+    def step(self):
+        head = self.eth_web3.eth.block_number
+        block_number, chain_ids = self.plan(head)
+        if chain_ids:
+            self.transmit(block_number, chain_ids, head)
+        return block_number, chain_ids
+
+    def run(self, interval=12):
+        while self.jobs:
+            block_number, chain_ids = self.step()
+            self._print(f"{len(self.jobs)} jobs pending, transmitted {block_number} to {chain_ids}")
+            time.sleep(interval)
+        self._print(f"Sender stats: {self.sender.stats()}")
+
+
+def account_load_pkey(fname):
+    path = os.path.expanduser(os.path.join("~", ".brownie", "accounts", fname + ".json"))
+    with open(path, "r") as f:
+        pkey = account.decode_keyfile_json(json.load(f), getpass())
+        return Account.from_key(pkey)
+
+
+if __name__ == "__main__":
+    eth_web3 = Web3(HTTPProvider(ETH_NETWORK))
+    signer = account_load_pkey("keeper")  # ALTER
+    scheduler = TransmitScheduler(eth_web3, signer, log=True)
+    for target in DIGEST_TARGETS:
+        scheduler.add(message_digest_job(*target))
+    for target in GAUGE_TARGETS:
+        scheduler.add(gauge_type_job(*target))
+    scheduler.run()
@@ -0,0 +1,186 @@
+import math
+import time
+
+from web3.exceptions import TransactionNotFound
+
+from scripts import metrics
+
+GAS_MULTIPLIER = 1.5
+FEE_BUMP = 1.125  # nodes require at least +10% on both fee fields to replace a transaction
+MAX_FEE_MULTIPLIER = 4  # replacements stop at this multiple of the first fee, unless capped
+WAIT_TIMEOUT = 1800
+# rejections of a nonce the chain has already used: geth and its forks, besu, py-evm
+NONCE_TOO_LOW = ("nonce too low", "invalid transaction nonce")
+
+
+def _fee(tx):
+    return tx["maxFeePerGas"] if "maxFeePerGas" in tx else tx["gasPrice"]
+
+
+class TransactionSender:
+    """
+    Broadcast transactions back to back with locally tracked nonces.
+
+    `submit` signs and broadcasts without waiting; `poll` checks every pending nonce once and
+    re-broadcasts the ones stuck for longer than `replace_after` seconds with bumped fees,
+    up to `max_fee` wei per gas (`MAX_FEE_MULTIPLIER` times the first fee by default);
+    `wait` polls until everything is mined.
+    """
+
+    def __init__(
+        self,
+        web3,
+        signer,
+        gas_multiplier=GAS_MULTIPLIER,
+        replace_after=90,
+        poll_interval=2,
+        max_fee=None,
+    ):
+        self.web3 = web3
+        self.signer = signer
+        self.gas_multiplier = gas_multiplier
+        self.replace_after = replace_after
+        self.poll_interval = poll_interval
+        self.max_fee = max_fee
+
+        self.chain_id = web3.eth.chain_id
+        self.nonce = None
+        self.pending = {}  # nonce -> {"tx", "hashes", "submitted", "broadcast"}
+        self.receipts = {}  # nonce -> receipt
+        self.latencies = []
+        self.replaced = 0
+        self.started = None
+
+    def _next_nonce(self):
+        if self.nonce is None:
+            self.nonce = self.web3.eth.get_transaction_count(self.signer.address, "pending")
+        nonce = self.nonce
+        self.nonce += 1
+        return nonce
+
+    def _broadcast(self, entry):
+        signed_tx = self.web3.eth.account.sign_transaction(entry["tx"], private_key=self.signer.key)
+        try:
+            tx_hash = self.web3.eth.send_raw_transaction(signed_tx.raw_transaction)
+        except Exception as e:
+            if "already known" not in str(e).lower():
+                raise
+            tx_hash = signed_tx.hash
+        entry["hashes"].append(tx_hash)
+        entry["broadcast"] = time.time()
+        return tx_hash
+
+    def submit(self, func, gas=None, params=None):
+        if self.started is None:
+            self.started = time.time()
+
+        params = {"from": self.signer.address, "chainId": self.chain_id, **(params or {})}
+        if gas is None:
+            with metrics.span("estimate_gas"):
+                gas = int(self.gas_multiplier * func.estimate_gas(params))
+        params["gas"] = gas
+        params["nonce"] = self._next_nonce()
+
+        try:
+            entry = {
+                "tx": func.build_transaction(params),
+                "hashes": [],
+                "submitted": time.time(),
+            }
+            entry["max_fee"] = self.max_fee or MAX_FEE_MULTIPLIER * _fee(entry["tx"])
+            try:
+                tx_hash = self._broadcast(entry)
+            except Exception as e:
+                if not any(message in str(e).lower() for message in NONCE_TOO_LOW):
+                    raise
+                # the account was used elsewhere, resync with the chain and try once more
+                self.nonce = None
+                entry["tx"]["nonce"] = self._next_nonce()
+                tx_hash = self._broadcast(entry)
+        except Exception:
+            # the nonce may or may not have reached the node, resync on the next submit
+            self.nonce = None
+            raise
+
+        self.pending[entry["tx"]["nonce"]] = entry
+        metrics.inc("transactions_submitted_total")
+        return tx_hash
+
+    def _bump_fees(self, entry):
+        """
+        Bump the fees of a stuck transaction in place, returning False when the bump would
+        take it over `max_fee`.
+        """
+        tx, key = entry["tx"], "maxFeePerGas" if "maxFeePerGas" in entry["tx"] else "gasPrice"
+        if math.ceil(tx[key] * FEE_BUMP) > entry["max_fee"]:
+            return False
+
+        for field in ("maxFeePerGas", "maxPriorityFeePerGas", "gasPrice"):
+            if field in tx:
+                tx[field] = math.ceil(tx[field] * FEE_BUMP)
+        if key == "maxFeePerGas":
+            # keep up with the base fee as well, otherwise the replacement is stuck too
+            base_fee = self.web3.eth.get_block("pending").get("baseFeePerGas", 0)
+            tx[key] = max(tx[key], 2 * base_fee + tx["maxPriorityFeePerGas"])
+        else:
+            tx[key] = max(tx[key], self.web3.eth.gas_price)
+        tx[key] = min(tx[key], entry["max_fee"])
+        if key == "maxFeePerGas":
+            tx["maxPriorityFeePerGas"] = min(tx["maxPriorityFeePerGas"], tx[key])
+        return True
+
+    def poll(self):
+        now = time.time()
+        for nonce, entry in list(self.pending.items()):
+            receipt = None
+            # any of the broadcast versions may be the one that gets mined
+            for tx_hash in entry["hashes"]:
+                try:
+                    receipt = self.web3.eth.get_transaction_receipt(tx_hash)
+                    break
+                except TransactionNotFound:
+                    continue
+
+            if receipt is not None:
+                del self.pending[nonce]
+                self.receipts[nonce] = receipt
+                self.latencies.append(now - entry["submitted"])
+                metrics.observe("transaction_latency_seconds", now - entry["submitted"])
+                metrics.observe("transaction_gas_used", receipt["gasUsed"], metrics.GAS)
+            elif now - entry["broadcast"] > self.replace_after and self._bump_fees(entry):
+                self._broadcast(entry)
+                self.replaced += 1
+                metrics.inc("transactions_replaced_total")
+        return len(self.pending)
+
+    def wait(self, timeout=WAIT_TIMEOUT):
+        deadline = None if timeout is None else time.time() + timeout
+        while self.poll():
+            if deadline is not None and time.time() > deadline:
+                raise TimeoutError(f"{len(self.pending)} transactions still pending")
+            time.sleep(self.poll_interval)
+        return [self.receipts[nonce] for nonce in sorted(self.receipts)]
+
+    def stats(self):
+        elapsed = time.time() - self.started if self.started is not None else 0
+        latencies = sorted(self.latencies)
+        confirmed = len(self.receipts)
+        return {
+            "submitted": confirmed + len(self.pending),
+            "confirmed": confirmed,
+            "failed": sum(1 for r in self.receipts.values() if r["status"] == 0),
+            "replaced": self.replaced,
+            "elapsed": elapsed,
+            "throughput": confirmed / elapsed if elapsed else 0,
+            "latency_mean": sum(latencies) / confirmed if confirmed else 0,
+            "latency_p50": latencies[confirmed // 2] if confirmed else 0,
+            "latency_max": latencies[-1] if confirmed else 0,
+            "gas_used": sum(r["gasUsed"] for r in self.receipts.values()),
+        }
+
+
+@metrics.timed()
+def send_transaction(web3, signer, func, gas=None):
+    sender = TransactionSender(web3, signer)
+    sender.submit(func, gas=gas)
+    return sender.wait()[0]
@@ -0,0 +1,92 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from web3 import Web3
+
+# scripts resolve ABIs through the registry when imported, keep its cache out of ~/.cache
+os.environ["REGISTRY_CACHE"] = ""
+
+
+class RpcStub:
+    """
+    JSON-RPC server on localhost answering from `handlers` (method -> fn(*params)), counting
+    HTTP requests, the calls they carried and the bytes of their bodies.
+    """
+
+    def __init__(self):
+        self.handlers = {"eth_chainId": lambda: "0x1"}
+        self.requests = 0
+        self.calls = []
+        self.request_bytes = self.response_bytes = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                raw = self.rfile.read(int(self.headers["Content-Length"]))
+                body = json.loads(raw)
+                with stub.lock:
+                    stub.requests += 1
+                    stub.request_bytes += len(raw)
+                if isinstance(body, list):
+                    response = [stub._answer(request) for request in body]
+                else:
+                    response = stub._answer(body)
+                data = json.dumps(response).encode()
+                with stub.lock:
+                    stub.response_bytes += len(data)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def _answer(self, request):
+        with self.lock:
+            self.calls.append(request["method"])
+        try:
+            result = self.handlers[request["method"]](*request.get("params", []))
+        except Exception as e:
+            return {
+                "jsonrpc": "2.0",
+                "id": request["id"],
+                "error": {"code": -32000, "message": str(e)},
+            }
+        return {"jsonrpc": "2.0", "id": request["id"], "result": result}
+
+    def count(self, method):
+        return self.calls.count(method)
+
+    def queries(self):
+        # calls other than the `eth_chainId` web3 sends to validate transactions and calls
+        return [method for method in self.calls if method != "eth_chainId"]
+
+    def reset(self):
+        self.requests, self.calls = 0, []
+        self.request_bytes = self.response_bytes = 0
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def rpc():
+    stub = RpcStub()
+    yield stub
+    stub.close()
+
+
+@pytest.fixture
+def web3(rpc):
+    return Web3(Web3.HTTPProvider(rpc.url))
@@ -0,0 +1,58 @@
+import shutil
+
+import pytest
+from eth_account import Account
+from web3 import Web3
+
+from scripts.deploy_pipeline import (
+    SAME_ADDRESS,
+    VYPER,
+    create_address,
+    plan,
+    verify_pipeline,
+    vyper_artifacts,
+)
+
+eth_tester = pytest.importorskip("eth_tester")
+if shutil.which(VYPER) is None:
+    pytest.skip(f"{VYPER} is not installed", allow_module_level=True)
+
+
+def test_create_address():
+    # first deployment of the first hardhat/anvil account
+    sender = "0xf39Fd6e51aad88F6F4ce6aB8827279cffFb92266"
+    assert create_address(sender, 0) == "0x5FbDB2315678afecb367f032d93F642f64180aa3"
+
+
+def test_plan_lanes():
+    steps = plan(8, Account.create().address, 101, owner=Account.create().address)
+    names = [step["name"] for step in steps]
+    assert len(names) == len(set(names))
+    temp = {
+        chain: [s["name"] for s in steps if s["account"] == "temp" and s["chain"] == chain]
+        for chain in ("sidechain", "mainnet")
+    }
+    # the pairs deploy at the same nonce of temp on either chain
+    for a, b in SAME_ADDRESS:
+        assert temp["sidechain"].index(a) == temp["mainnet"].index(b)
+    assert names.index("gauge_type_verifier") < names.index("set_verifier")
+
+    steps = plan(8, Account.create().address, 101, verifier=False)
+    names = [step["name"] for step in steps]
+    assert "gauge_type_verifier" not in names and "set_verifier" not in names
+    # without an owner the sidechain contracts stay with the deployer
+    methods = [s.get("method") for s in steps if s["chain"] == "sidechain"]
+    assert "commit_transfer_ownership" not in methods
+
+
+def test_verify_pipeline(tmp_path):
+    # two in-process chains stand in for the sidechain and mainnet nodes
+    testers = {chain: eth_tester.EthereumTester() for chain in ("sidechain", "mainnet")}
+    web3s = {chain: Web3(Web3.EthereumTesterProvider(t)) for chain, t in testers.items()}
+    key = testers["sidechain"].backend.account_keys[0].to_hex()
+    owner = Account.create().address
+
+    addresses = verify_pipeline(
+        web3s, key, vyper_artifacts, str(tmp_path / "deployments.json"), owner
+    )
+    assert addresses["@block_hash_oracle"] != addresses["@gauge_type_oracle"]
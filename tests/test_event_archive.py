@@ -0,0 +1,167 @@
+from decimal import Decimal
+
+import pyarrow as pa
+import pytest
+
+from scripts.event_archive import (
+    CONFIRMATIONS,
+    WEEK,
+    EventArchive,
+    apply_latency,
+    commit_latency,
+    delayed_volume,
+    gauge_types,
+    schema,
+)
+
+ETH, AVAX = 1, 43114
+A, B = b"\xaa" * 20, b"\xbb" * 20
+BRIDGE = b"\xcc" * 20
+G1, G2, G3 = b"\x01" * 20, b"\x02" * 20, b"\x03" * 20
+
+# event -> chain id -> [(timestamp, fields)], one log per block
+ROWS = {
+    "CommitBlockHash": {
+        ETH: [
+            (1000, {"committer": A, "number": 100}),
+            (1010, {"committer": B, "number": 100}),
+            (2000, {"committer": A, "number": 101}),
+            (2030, {"committer": B, "number": 101}),
+        ],
+        AVAX: [(500, {"committer": A, "number": 5})],
+    },
+    "ApplyBlockHash": {
+        ETH: [(1100, {"number": 100}), (2060, {"number": 101})],
+        AVAX: [(560, {"number": 5})],
+    },
+    "Delayed": {
+        ETH: [
+            (WEEK + 1, {"nonce": 1, "receiver": A, "amount": 5}),
+            (WEEK + 2, {"nonce": 2, "receiver": A, "amount": 7}),
+            (2 * WEEK, {"nonce": 3, "receiver": B, "amount": 11}),
+        ],
+        AVAX: [(10, {"nonce": 1, "receiver": A, "amount": 3})],
+    },
+    "SetGaugeType": {
+        ETH: [
+            (1, {"gauge": G1, "type": 1}),
+            (2, {"gauge": G1, "type": 1}),
+            (3, {"gauge": G2, "type": 2}),
+        ],
+        AVAX: [(WEEK, {"gauge": G3, "type": 1})],
+    },
+}
+
+
+def _table(event, rows):
+    columns = {
+        "block_number": list(range(1, len(rows) + 1)),
+        "log_index": [0] * len(rows),
+        "transaction_hash": [bytes([i]) * 32 for i in range(len(rows))],
+        "address": [BRIDGE] * len(rows),
+        "timestamp": [timestamp for timestamp, _ in rows],
+    }
+    for name in schema(event).names[5:]:
+        values = [fields.get(name, b"\x00" * 32) for _, fields in rows]
+        if schema(event).field(name).type == pa.decimal128(38, 0):
+            values = [Decimal(value) for value in values]
+        columns[name] = values
+    return pa.table(columns, schema=schema(event))
+
+
+@pytest.fixture
+def archive(tmp_path):
+    archive = EventArchive(str(tmp_path))
+    for event, chains in ROWS.items():
+        for chain_id, rows in chains.items():
+            archive._write(event, chain_id, "0x" + BRIDGE.hex(), 0, 100, _table(event, rows))
+    return archive
+
+
+def _rows(table):
+    return sorted(tuple(row.values()) for row in table.to_pylist())
+
+
+def _check(query, archive, expected):
+    assert _rows(query(archive)) == sorted(row for rows in expected.values() for row in rows)
+    for chain_id, rows in expected.items():
+        assert _rows(query(archive, chain_id)) == sorted(rows)
+
+
+def test_commit_latency(archive):
+    _check(
+        commit_latency,
+        archive,
+        {ETH: [(ETH, A, 2, 0.0, 0), (ETH, B, 2, 20.0, 30)], AVAX: [(AVAX, A, 1, 0.0, 0)]},
+    )
+
+
+def test_apply_latency(archive):
+    _check(apply_latency, archive, {ETH: [(ETH, 2, 80.0, 100)], AVAX: [(AVAX, 1, 60.0, 60)]})
+
+
+def test_delayed_volume(archive):
+    _check(
+        delayed_volume,
+        archive,
+        {
+            ETH: [(ETH, BRIDGE, WEEK, 2, Decimal(12)), (ETH, BRIDGE, 2 * WEEK, 1, Decimal(11))],
+            AVAX: [(AVAX, BRIDGE, 0, 1, Decimal(3))],
+        },
+    )
+
+
+def test_gauge_types(archive):
+    _check(
+        gauge_types,
+        archive,
+        {ETH: [(ETH, 0, 1, 2, 1), (ETH, 0, 2, 1, 1)], AVAX: [(AVAX, WEEK, 1, 1, 1)]},
+    )
+
+
+@pytest.mark.parametrize("chain_id", [None, ETH])
+def test_table_columns(archive, chain_id):
+    table = archive.table("ApplyBlockHash", chain_id, ["chain_id", "number"])
+    assert table.column_names == ["chain_id", "number"]
+    assert table["chain_id"].type == pa.int64()
+
+    table = archive.table("ApplyBlockHash", chain_id)
+    assert table.column_names == schema("ApplyBlockHash").names + ["chain_id"]
+
+
+@pytest.mark.parametrize("chain_id", [None, ETH])
+def test_empty_archive(tmp_path, chain_id):
+    archive = EventArchive(str(tmp_path))
+    table = archive.table("Delayed", chain_id, ["chain_id", "amount"])
+    assert table.column_names == ["chain_id", "amount"] and len(table) == 0
+    for query in (commit_latency, apply_latency, delayed_volume, gauge_types):
+        assert len(query(archive, chain_id)) == 0
+
+
+def test_export_starts_at_the_deployment_block(rpc, web3, tmp_path):
+    deployed, head = 1000, 5000
+    ranges = []
+
+    def get_logs(params):
+        ranges.append((int(params["fromBlock"], 16), int(params["toBlock"], 16)))
+        return []
+
+    rpc.handlers.update(
+        {
+            "eth_blockNumber": lambda: hex(head),
+            "eth_getCode": lambda address, block: "0x60" if int(block, 16) >= deployed else "0x",
+            "eth_getLogs": get_logs,
+        }
+    )
+    archive = EventArchive(str(tmp_path))
+    contracts = {"0x" + "dd" * 20: ["ApplyBlockHash"]}
+    archive.export(web3, ETH, contracts, head=head)
+    # windows are fetched concurrently, in any order
+    assert min(ranges)[0] == deployed
+    assert max(ranges)[1] == head - CONFIRMATIONS
+
+    # an explicit start block still wins over the deployment block
+    ranges.clear()
+    archive = EventArchive(str(tmp_path / "other"))
+    archive.export(web3, ETH, contracts, start_block=2000, head=head)
+    assert min(ranges)[0] == 2000
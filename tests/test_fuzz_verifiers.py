@@ -0,0 +1,117 @@
+import json
+import os
+
+import pytest
+import rlp
+from trie import HexaryTrie
+
+from scripts.fuzz_verifiers import (
+    BASELINE,
+    KIND_RECEIPT,
+    KIND_VALUE,
+    LocalHarness,
+    compare,
+    compile_harness,
+    expected,
+    fuzz,
+    generate,
+)
+from scripts.mpt_verifier import ProofVerifier
+from scripts.rlp_encoding import split_list
+
+
+class PythonHarness:
+    # answers `verifyMany` with the Python verifier, gas grows with the proof size
+    def __init__(self, extra_gas=0):
+        self.extra_gas = extra_gas
+        self.verifier = ProofVerifier()
+
+    def verifyMany(self, cases):
+        results = []
+        for kind, key, root, path, proof in cases:
+            stack = split_list(proof)
+            case = {"kind": kind, "key": key, "root": root, "path": path, "stack": stack}
+            success, data = expected(case, self.verifier)
+            gas_used = 1000 + sum(map(len, stack)) + self.extra_gas if success else 0
+            results.append((success, data or b"", gas_used))
+        return results
+
+
+@pytest.fixture(scope="module")
+def cases():
+    return generate()
+
+
+def test_generation_is_deterministic(cases):
+    assert generate() == cases
+
+
+def test_expected_results(cases):
+    verifier = ProofVerifier()
+    for case in cases:
+        success, data = expected(case, verifier)
+        # valid proofs, inclusion or exclusion, verify, every tampered one reverts with an error
+        assert success != case["group"].startswith("tampered"), case["group"]
+        assert data is not None
+
+
+def test_tries_match_py_trie(cases):
+    # the generated proofs are the ones py-trie accepts, so both sides are checked against it,
+    # py-trie assumes keys of one length, the short keys of the inline tries are left out
+    verifier = ProofVerifier()
+    for case in cases:
+        if case["kind"] != KIND_VALUE or case["group"].startswith("tampered"):
+            continue
+        if len(case["path"]) != 32:
+            continue
+        proof = [rlp.decode(node) for node in case["stack"]]
+        value = HexaryTrie.get_from_proof(case["root"], case["path"], proof)
+        assert expected(case, verifier) == (True, value)
+
+
+def test_missing_baseline_fails(tmp_path):
+    path = str(tmp_path / "verifier_gas.json")
+    assert not fuzz(PythonHarness(), baseline_path=path)
+    assert not os.path.exists(path)
+
+    assert fuzz(PythonHarness(), update=True, baseline_path=path)
+    assert fuzz(PythonHarness(), baseline_path=path)
+    # any row spending more gas than its baseline fails the run
+    assert not fuzz(PythonHarness(extra_gas=1), baseline_path=path)
+
+
+def test_compare_flags_regressions():
+    baseline = {"a": {"cases": 1, "mean": 100, "max": 100}}
+    assert compare({"a": {"cases": 1, "mean": 100, "max": 100}}, baseline) == []
+    assert compare({"a": {"cases": 1, "mean": 100, "max": 101}}, baseline) == ["a"]
+    assert compare({"a": {"cases": 1, "mean": 101, "max": 101}}, baseline, 0.05) == []
+    assert compare({"b": {"cases": 1, "mean": 500, "max": 500}}, baseline) == []
+
+
+def _local_harness():
+    # CI installs solc and the Solidity-RLP sources and sets REQUIRE_HARNESS, elsewhere a
+    # missing toolchain skips
+    if os.environ.get("REQUIRE_HARNESS"):
+        return LocalHarness(*compile_harness())
+    exceptions = pytest.importorskip("solcx.exceptions")
+    pytest.importorskip("eth_tester")
+    try:
+        return LocalHarness(*compile_harness())
+    except (OSError, exceptions.SolcError, exceptions.SolcNotInstalled) as e:
+        pytest.skip(f"ProofVerifierHarness cannot be compiled here: {e!r}")
+
+
+def test_harness():
+    # the Solidity libraries against the Python verifier and the committed gas baseline
+    harness = _local_harness()
+    assert os.path.exists(BASELINE), "run `python -m scripts.fuzz_verifiers update` first"
+    with open(BASELINE) as f:
+        assert json.load(f)
+    assert fuzz(harness)
+
+
+def test_receipt_cases_cover_out_of_range_index(cases):
+    receipts = [case for case in cases if case["kind"] == KIND_RECEIPT]
+    verifier = ProofVerifier()
+    # the index past the last receipt proves absence, an empty receipt
+    assert any(expected(case, verifier)[1][:32] == bytes(32) for case in receipts)
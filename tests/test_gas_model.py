@@ -0,0 +1,78 @@
+import json
+import random
+
+import pytest
+from web3 import Web3
+
+from scripts import gas_model
+from scripts.registry import registry
+
+ORACLE = "0x" + "11" * 20
+COMMITTERS = ["0x" + f"{i:040x}" for i in range(1, 6)]
+
+
+@pytest.fixture
+def apply_call():
+    oracle = Web3().eth.contract(address=ORACLE, abi=registry.abi("BlockHashOracle"))
+    return oracle.functions.apply(1, b"\x01" * 32, COMMITTERS)
+
+
+@pytest.fixture
+def model_path(tmp_path, monkeypatch):
+    path = str(tmp_path / "gas_model.json")
+    monkeypatch.setattr(gas_model, "MODEL_PATH", path)
+    return path
+
+
+def test_uncalibrated_kind_falls_back(apply_call, model_path):
+    assert gas_model.estimate(apply_call, "apply", gas_model.apply_features(COMMITTERS)) is None
+    # explicit coefficients are used as given
+    coefficients = {"apply": {"const": 30_000, "committers": 5_000}}
+    gas = gas_model.estimate(
+        apply_call, "apply", gas_model.apply_features(COMMITTERS), coefficients=coefficients
+    )
+    calldata = apply_call._encode_transaction_data()
+    assert gas == int(gas_model.MARGIN * (gas_model.calldata_gas(calldata) + 55_000))
+
+
+def test_calibrated_kind_is_predicted(apply_call, model_path):
+    with open(model_path, "w") as f:
+        json.dump({"apply": {"const": 30_000, "committers": 5_000}}, f)
+    gas = gas_model.estimate(apply_call, "apply", gas_model.apply_features(COMMITTERS))
+    calldata = apply_call._encode_transaction_data()
+    assert gas == int(gas_model.MARGIN * (gas_model.calldata_gas(calldata) + 55_000))
+    assert gas_model.estimate(apply_call, "gauge_type", {"const": 1}) is None
+
+
+def test_fit_recovers_coefficients():
+    rng = random.Random(0)
+    samples = []
+    for _ in range(50):
+        features = {"const": 1, "a": rng.randint(0, 100), "b": rng.randint(0, 1000)}
+        samples.append((features, 20_000 + 300 * features["a"] + 7 * features["b"]))
+    fitted = gas_model.fit(samples)
+    assert fitted == pytest.approx({"const": 20_000, "a": 300, "b": 7})
+
+
+def test_save_writes_only_fitted_kinds(model_path):
+    gas_model.save({"apply": {"const": 30_000, "committers": 5_000}}, model_path)
+    # the default gauge_type coefficients are not written as if they were fitted
+    assert gas_model.calibrated(model_path) == {"apply"}
+
+    gas_model.save({"gauge_type": {"const": 40_000}}, model_path)
+    assert gas_model.calibrated(model_path) == {"apply", "gauge_type"}
+    assert gas_model.load(model_path)["apply"]["const"] == 30_000
+
+
+def test_recalibration_is_picked_up(apply_call, model_path):
+    features = gas_model.apply_features(COMMITTERS)
+    assert gas_model.estimate(apply_call, "apply", features) is None
+
+    # a long running process sees the file written by a later calibration
+    gas_model.save({"apply": {"const": 30_000, "committers": 5_000}}, model_path)
+    first = gas_model.estimate(apply_call, "apply", features)
+    assert first is not None
+    gas_model.save({"apply": {"const": 60_000, "committers": 5_000}}, model_path)
+    assert gas_model.estimate(apply_call, "apply", features) == first + int(
+        gas_model.MARGIN * 30_000
+    )
@@ -0,0 +1,102 @@
+import pytest
+import rlp
+from eth_utils import keccak
+
+from scripts.header_chain import HeaderChainProver, best_anchor, plan, verify_chain
+from scripts.rlp_encoding import encode_raw_list
+
+ORACLE = "0x" + "11" * 20
+
+
+def _headers(first, last):
+    # block number -> header RLP, each linked to the one below through `parentHash`
+    headers, parent = {}, b"\x00" * 32
+    for number in range(first, last + 1):
+        fields = [b"\x00" * 32] * 16
+        fields[0] = parent
+        fields[8] = rlp.sedes.big_endian_int.serialize(number)
+        fields[11] = rlp.sedes.big_endian_int.serialize(number * 12)
+        headers[number] = rlp.encode(fields)
+        parent = keccak(headers[number])
+    return headers
+
+
+def _chain(headers, number, anchor):
+    return encode_raw_list([headers[n] for n in range(anchor, number - 1, -1)])
+
+
+class HeaderCache:
+    # stands in for `ProofCache.headers`, recording the block numbers asked for
+    def __init__(self, headers):
+        self.headers_by_number = headers
+        self.requested = []
+
+    def headers(self, web3, chain_id, block_numbers, serialize):
+        self.requested.append(list(block_numbers))
+        return [self.headers_by_number[number] for number in block_numbers]
+
+
+@pytest.fixture
+def headers():
+    return _headers(90, 130)
+
+
+@pytest.fixture
+def prover(web3, headers, tmp_path):
+    prover = HeaderChainProver(
+        web3,
+        web3,
+        oracle=ORACLE,
+        checkpoint=str(tmp_path / "anchors.json"),
+        max_length=16,
+        cache=HeaderCache(headers),
+    )
+    prover.applied = {n: keccak(headers[n]) for n in (100, 104, 120)}
+    return prover
+
+
+def test_best_anchor_and_plan():
+    anchors = [100, 104, 120]
+    assert best_anchor(100, anchors, 16) == 100
+    assert best_anchor(101, anchors, 16) == 104
+    # the chain from 120 down to 105 is 16 headers long
+    assert best_anchor(105, anchors, 16) == 120 and best_anchor(105, anchors, 15) is None
+    assert best_anchor(104, anchors, 1) == 104 and best_anchor(103, anchors, 1) is None
+    assert best_anchor(121, anchors, 16) is None
+    assert plan([95, 110, 121], [120, 100, 104], 16) == {95: [100, 104], 110: [120], 121: []}
+
+
+def test_verify_chain(headers):
+    chain_rlp = _chain(headers, 95, 100)
+    assert verify_chain(chain_rlp, keccak(headers[100])) == headers[95]
+
+    with pytest.raises(ValueError, match="Broken header chain"):
+        verify_chain(chain_rlp, keccak(headers[99]))
+    # a header swapped for another block breaks the parent link below it
+    swapped = encode_raw_list([headers[100], headers[99], headers[97]])
+    with pytest.raises(ValueError, match="Broken header chain below block 99"):
+        verify_chain(swapped, keccak(headers[100]))
+    with pytest.raises(ValueError, match="Empty header chain"):
+        verify_chain(encode_raw_list([]), keccak(headers[100]))
+
+
+def test_prove(prover, headers):
+    chains = prover.prove([95, 103, 121], refresh=False)
+    assert chains[95] == (100, _chain(headers, 95, 100))
+    assert chains[103] == (104, _chain(headers, 103, 104))
+    assert chains[121] is None
+    # the chains share one fetch
+    assert prover.cache.requested == [list(range(95, 101)) + list(range(103, 105))]
+
+
+def test_bad_anchor_falls_back(prover, headers):
+    # the hash applied at 100 was set again to something else
+    prover.applied[100] = b"\x01" * 32
+    chains = prover.prove([95, 97, 103], refresh=False)
+    assert chains[95] == (104, _chain(headers, 95, 104))
+    assert chains[97] == (104, _chain(headers, 97, 104))
+    assert chains[103] == (104, _chain(headers, 103, 104))
+
+    prover.applied[104] = b"\x01" * 32
+    chains = prover.prove([95, 110], refresh=False)
+    assert chains == {95: None, 110: (120, _chain(headers, 110, 120))}
@@ -0,0 +1,19 @@
+import importlib
+import os
+
+import pytest
+
+SCRIPTS = os.path.join(os.path.dirname(os.path.dirname(__file__)), "scripts")
+MODULES = sorted(name[:-3] for name in os.listdir(SCRIPTS) if name.endswith(".py"))
+
+
+@pytest.mark.parametrize("name", MODULES)
+def test_import(name):
+    # scripts import each other as `scripts.<name>`, the way `brownie run` and
+    # `python -m scripts.<name>` resolve them, never as top level modules
+    try:
+        importlib.import_module(f"scripts.{name}")
+    except ModuleNotFoundError as e:
+        if e.name != "brownie":
+            raise
+        pytest.skip("brownie script")
@@ -0,0 +1,188 @@
+import pytest
+from eth_utils import keccak
+
+from scripts import keeper as keeper_module
+from scripts import metrics
+from scripts.keeper import BlockHashKeeper
+
+ORACLE = "0x" + "11" * 20
+COMMITTERS = ["0x" + f"{i:040x}" for i in range(1, 4)]
+
+
+class FakeChain:
+    def __init__(self, web3, head=100):
+        self.head = head
+        self.fork = {}  # block -> salt, a reorg changes the hash of every block above it
+        self.commits = []  # (block, committer, number, hash)
+        self.topic = None
+        self.web3 = web3
+
+    def block_hash(self, number):
+        salt = max((s for block, s in self.fork.items() if block <= number), default=0)
+        return "0x" + keccak(number.to_bytes(32, "big") + bytes([salt])).hex()
+
+    def get_block(self, block_identifier, full=False):
+        number = self.head if block_identifier == "latest" else int(block_identifier, 16)
+        parent = self.block_hash(number - 1) if number else "0x" + "00" * 32
+        return {"number": hex(number), "hash": self.block_hash(number), "parentHash": parent}
+
+    def get_logs(self, params):
+        lo, hi = int(params["fromBlock"], 16), int(params["toBlock"], 16)
+        return [
+            {
+                "address": ORACLE,
+                "topics": [
+                    self.topic,
+                    "0x" + committer[2:].rjust(64, "0"),
+                    "0x" + f"{number:064x}",
+                ],
+                "data": block_hash,
+                "blockNumber": hex(block),
+                "blockHash": self.block_hash(block),
+                "transactionHash": "0x" + f"{i:064x}",
+                "transactionIndex": "0x0",
+                "logIndex": "0x0",
+                "removed": False,
+            }
+            for i, (block, committer, number, block_hash) in enumerate(self.commits)
+            if lo <= block <= hi
+        ]
+
+
+class FakeSender:
+    def __init__(self):
+        self.nonce = 0
+        self.sent = []
+        self.receipts = {}
+        self.fail = set()  # numbers whose apply raises
+
+    def submit(self, func, gas=None):
+        if func.arguments[0] in self.fail:
+            raise ConnectionError("node unavailable")
+        self.sent.append(func.arguments[:2])
+        self.nonce += 1
+
+    def poll(self):
+        pass
+
+    def stats(self):
+        return {"submitted": self.nonce}
+
+    def mine(self, status=1):
+        for nonce in range(len(self.receipts), self.nonce):
+            self.receipts[nonce] = {
+                "status": status,
+                "blockNumber": 1,
+                "gasUsed": 1,
+                "transactionHash": b"\x00" * 32,
+            }
+
+
+@pytest.fixture
+def chain(rpc, web3):
+    chain = FakeChain(web3)
+    rpc.handlers.update(
+        {
+            "eth_blockNumber": lambda: hex(chain.head),
+            "eth_getBlockByNumber": chain.get_block,
+            "eth_getLogs": chain.get_logs,
+        }
+    )
+    return chain
+
+
+@pytest.fixture
+def keeper(chain, web3, monkeypatch, tmp_path):
+    monkeypatch.setattr(
+        keeper_module,
+        "oracle_status",
+        lambda web3, oracle, numbers: (2, [], dict.fromkeys(numbers, False)),
+    )
+    monkeypatch.setattr(keeper_module, "TransactionSender", lambda web3, signer: FakeSender())
+    keeper = BlockHashKeeper(web3, None, oracle=ORACLE, checkpoint=str(tmp_path / "commits.json"))
+    chain.topic = keeper.oracle.events.CommitBlockHash.topic
+    return keeper
+
+
+def _commit(chain, block, committer, number, salt=0):
+    chain.commits.append(
+        (block, COMMITTERS[committer], number, "0x" + bytes([salt + 1]).hex() * 32)
+    )
+
+
+def test_failed_apply_stays_pending(chain, keeper):
+    _commit(chain, 90, 0, 50)
+    _commit(chain, 90, 0, 60)
+    keeper.bootstrap()
+    assert keeper.sender.sent == []
+
+    _commit(chain, 101, 1, 50)
+    _commit(chain, 101, 1, 60)
+    chain.head = 101
+    keeper.sender.fail = {50}
+    keeper.poll()
+    # the apply after the failed one went out and the cursor moved on
+    assert keeper.block == 101 and keeper.pending == {50}
+    assert [number for number, _ in keeper.sender.sent] == [60]
+
+    keeper.sender.fail = set()
+    keeper.poll()
+    assert keeper.block == 101 and keeper.pending == set()
+    assert [number for number, _ in keeper.sender.sent] == [60, 50]
+    assert len(keeper.records) == 4
+
+
+def test_failed_bootstrap_is_retried(chain, keeper, monkeypatch):
+    calls = []
+    oracle_status = keeper_module.oracle_status
+
+    def flaky_status(*args):
+        calls.append(args)
+        if len(calls) == 1:
+            raise ConnectionError("node unavailable")
+        keeper.stop()
+        return oracle_status(*args)
+
+    monkeypatch.setattr(keeper_module, "oracle_status", flaky_status)
+    monkeypatch.setattr(keeper_module.signal, "signal", lambda signum, handler: None)
+    keeper.poll_interval = 0
+    keeper.run()
+    assert len(calls) == 2 and keeper.block == 100
+
+
+def test_reverted_apply_is_retried(chain, keeper):
+    _commit(chain, 90, 0, 50)
+    _commit(chain, 91, 1, 50)
+    keeper.bootstrap()
+    assert len(keeper.sender.sent) == 1
+
+    keeper.sender.mine(status=0)
+    keeper.poll()
+    assert keeper.pending == {50}
+    keeper.poll()
+    assert len(keeper.sender.sent) == 2
+
+
+def test_receipt_of_pruned_commits(chain, keeper):
+    metrics.enable()
+    try:
+        _commit(chain, 90, 0, 50)
+        _commit(chain, 91, 1, 50)
+        keeper.bootstrap()
+        keeper.records = []
+        keeper.sender.mine()
+        keeper.poll()
+        assert 50 in keeper.applied
+    finally:
+        metrics._registry = None
+
+
+def test_reorg_rescans(chain, keeper):
+    keeper.bootstrap()
+    _commit(chain, 100, 0, 60)
+    _commit(chain, 100, 1, 60)
+    chain.head = 101
+    chain.fork[100] = 1  # block 100 was replaced, the keeper only saw the old one
+    keeper.poll()
+    assert keeper.block == 101 and keeper.block_hash.to_0x_hex() == chain.block_hash(101)
+    assert [number for number, _ in keeper.sender.sent] == [60]
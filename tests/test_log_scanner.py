@@ -0,0 +1,63 @@
+import threading
+
+import pytest
+
+from scripts.log_scanner import LogScanner
+
+
+class FakeChain:
+    def __init__(self, logs_per_block=1, limit=None):
+        self.logs_per_block = logs_per_block
+        self.limit = limit
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def fetch(self, from_block, to_block):
+        with self.lock:
+            self.calls.append((from_block, to_block))
+        if self.limit is not None and to_block - from_block + 1 > self.limit:
+            raise ValueError("query returned more than 10000 results")
+        return [
+            {"blockNumber": block, "index": i}
+            for block in range(from_block, to_block + 1)
+            for i in range(self.logs_per_block)
+        ]
+
+
+def _scanner(chain, path=None, **kwargs):
+    return LogScanner(None, chain.fetch, lambda log: {"index": log["index"]}, path, **kwargs)
+
+
+def test_scan_covers_range_in_order():
+    chain = FakeChain()
+    records = _scanner(chain, lookback=999, window=100).scan(head=999)
+    assert [r["block"] for r in records] == list(range(1000))
+    assert len(chain.calls) == 10
+
+
+def test_shrunk_window_applies_to_remaining_ranges():
+    chain = FakeChain(limit=64)
+    scanner = _scanner(chain, lookback=4095, window=1024, max_in_flight=1)
+    records = scanner.scan(head=4095)
+    assert [r["block"] for r in records] == list(range(4096))
+    assert scanner.window == 64
+    # only the first range had to be split, every later one was cut to the shrunk window
+    failed = [(lo, hi) for lo, hi in chain.calls if hi - lo + 1 > 64]
+    assert len(failed) == 15 and all(hi < 1024 for _, hi in failed)
+    assert len(chain.calls) == 15 + 4096 // 64
+
+
+def test_range_under_min_window_raises():
+    chain = FakeChain(limit=8)
+    with pytest.raises(ValueError):
+        _scanner(chain, lookback=99, window=64, min_window=16).scan(head=99)
+
+
+def test_checkpoint_rescans_reorg_margin(tmp_path):
+    path = str(tmp_path / "logs.json")
+    chain = FakeChain()
+    _scanner(chain, path, lookback=1000, reorg_margin=10).scan(head=100)
+    chain.calls.clear()
+    records = _scanner(chain, path, lookback=1000, reorg_margin=10).scan(head=120)
+    assert chain.calls == [(91, 120)]
+    assert [r["block"] for r in records] == list(range(121))
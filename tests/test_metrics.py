@@ -0,0 +1,85 @@
+import json
+
+import pytest
+
+from scripts import metrics
+
+
+@pytest.fixture
+def registry():
+    registry = metrics.enable()
+    yield registry
+    metrics._registry = None
+
+
+def test_render():
+    registry = metrics.Registry()
+    registry.inc("rpc_requests_total", 2, {"method": "eth_call"})
+    registry.inc("transactions_submitted_total", 1, {})
+    registry.observe("rpc_seconds", 0.02, (0.01, 0.05), {"method": "eth_call"})
+    registry.observe("rpc_seconds", 0.5, (0.01, 0.05), {"method": "eth_call"})
+    assert registry.render() == (
+        'xdao_rpc_requests_total{method="eth_call"} 2\n'
+        "xdao_transactions_submitted_total 1\n"
+        'xdao_rpc_seconds_bucket{method="eth_call",le="0.01"} 0\n'
+        'xdao_rpc_seconds_bucket{method="eth_call",le="0.05"} 1\n'
+        'xdao_rpc_seconds_bucket{method="eth_call",le="+Inf"} 2\n'
+        'xdao_rpc_seconds_sum{method="eth_call"} 0.52\n'
+        'xdao_rpc_seconds_count{method="eth_call"} 2\n'
+    )
+
+
+def test_summary(registry, tmp_path):
+    metrics.inc("rpc_requests_total", method="eth_call")
+    metrics.inc("rpc_requests_total", 2, method="eth_call")
+    metrics.observe("apply_gas_used", 100_000, metrics.GAS)
+    metrics.observe("apply_gas_used", 300_000, metrics.GAS)
+
+    path = str(tmp_path / "summary.json")
+    metrics.write_summary(path)
+    with open(path) as f:
+        summary = json.load(f)
+    assert summary["counters"] == {"rpc_requests_total,method=eth_call": 3}
+    assert summary["histograms"] == {
+        "apply_gas_used": {"count": 2, "sum": 400_000, "mean": 200_000}
+    }
+
+
+def test_disabled_is_a_no_op(web3):
+    assert not metrics.enabled()
+    # the provider keeps its own methods, no wrapper runs per request
+    assert metrics.instrument(web3) is web3
+    assert "make_request" not in vars(web3.provider)
+    # the hooks only check the registry, spans share one context, nothing gets recorded
+    metrics.inc("rpc_requests_total")
+    metrics.observe("rpc_seconds", 1)
+    assert metrics.span("rpc") is metrics.span("apply") is metrics._NOOP
+
+    @metrics.timed()
+    def double(x):
+        return 2 * x
+
+    assert double(2) == 4
+    assert metrics._registry is None
+
+
+def test_instrument_counts_batches_once(rpc, web3, registry):
+    rpc.handlers["eth_blockNumber"] = lambda: "0x10"
+    metrics.instrument(web3)
+    # instrumenting again, e.g. through a second `connect`, does not double count
+    metrics.instrument(web3)
+
+    assert web3.eth.block_number == 16
+    web3.provider.make_batch_request([("eth_blockNumber", [])] * 3)
+    with web3.batch_requests() as batch:
+        batch.add(web3.eth.get_block_number())
+        batch.add(web3.eth.get_block_number())
+        batch.execute()
+
+    counters = registry.summary()["counters"]
+    assert counters["rpc_requests_total,method=eth_blockNumber"] == rpc.count("eth_blockNumber")
+    assert rpc.count("eth_blockNumber") == 6
+    # bytes of every body on the wire, the batch brackets included
+    assert counters["rpc_sent_bytes_total"] == rpc.request_bytes
+    assert counters["rpc_received_bytes_total"] == rpc.response_bytes
+    assert registry.summary()["histograms"]["rpc_seconds,method=batch"]["count"] == 2
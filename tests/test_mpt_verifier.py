@@ -0,0 +1,105 @@
+import random
+
+import pytest
+import rlp
+from eth_utils import keccak
+from trie import HexaryTrie
+
+from scripts.mpt_verifier import (
+    BlockhashMismatch,
+    HeaderTooShort,
+    ProofError,
+    ProofVerifier,
+    parse_block_header,
+    verify_block_header,
+    verify_proof_rlp,
+)
+from scripts.rlp_encoding import serialize_proofs
+
+
+def _trie(items):
+    trie = HexaryTrie({})
+    for key, value in items.items():
+        trie[key] = value
+    return trie
+
+
+def _proof(trie, key):
+    return [rlp.encode(node) for node in trie.get_proof(key)]
+
+
+def _header(state_root, number=1, timestamp=1):
+    fields = [b"\x00" * 32] * 16
+    fields[3] = state_root
+    fields[8] = rlp.sedes.big_endian_int.serialize(number)
+    fields[11] = rlp.sedes.big_endian_int.serialize(timestamp)
+    return rlp.encode(fields)
+
+
+@pytest.mark.parametrize("size", [1, 2, 17, 300])
+def test_extract_proof_value_matches_py_trie(size):
+    rng = random.Random(size)
+    items = {
+        keccak(rng.randbytes(8)): rlp.encode(rng.randbytes(rng.randint(1, 40))) for _ in range(size)
+    }
+    trie = _trie(items)
+    verifier = ProofVerifier()
+    for key, value in items.items():
+        assert verifier.extract_proof_value(trie.root_hash, key, _proof(trie, key)) == value
+    for _ in range(20):
+        key = keccak(rng.randbytes(9))
+        assert verifier.extract_proof_value(trie.root_hash, key, _proof(trie, key)) == b""
+
+
+def test_tampered_proof_raises():
+    items = {keccak(bytes([i])): rlp.encode(i + 1) for i in range(50)}
+    trie = _trie(items)
+    key = next(iter(items))
+    proof = _proof(trie, key)
+    proof[-1] = proof[-1][:-1] + bytes([proof[-1][-1] ^ 1])
+    with pytest.raises(ProofError):
+        ProofVerifier().extract_proof_value(trie.root_hash, key, proof)
+
+
+def test_verify_proof_rlp():
+    slots = [0, 1, 5]
+    storage = _trie({keccak(slot.to_bytes(32, "big")): rlp.encode(slot + 7) for slot in slots})
+    address = bytes.fromhex("12" * 20)
+    state = _trie(
+        {
+            keccak(address): rlp.encode([1, 2, storage.root_hash, keccak(b"")]),
+            keccak(b"\x34" * 20): rlp.encode([0, 0, storage.root_hash, keccak(b"")]),
+        }
+    )
+    queried = slots + [3]
+    proof_rlp = serialize_proofs(
+        {
+            "accountProof": _proof(state, keccak(address)),
+            "storageProof": [
+                {"proof": _proof(storage, keccak(slot.to_bytes(32, "big")))} for slot in queried
+            ],
+        }
+    )
+    account, values = verify_proof_rlp(
+        _header(state.root_hash), proof_rlp, address, [slot.to_bytes(32, "big") for slot in queried]
+    )
+    assert (account.nonce, account.balance, account.storage_root) == (1, 2, storage.root_hash)
+    assert [(value.exists, value.value) for value in values] == [
+        (True, 7),
+        (True, 8),
+        (True, 12),
+        (False, 0),
+    ]
+
+
+def test_block_header_errors():
+    header = _header(b"\x01" * 32, number=10, timestamp=20)
+    parsed = verify_block_header(header, keccak(header))
+    assert (parsed["number"], parsed["timestamp"], parsed["state_root"]) == (10, 20, b"\x01" * 32)
+
+    with pytest.raises(BlockhashMismatch):
+        verify_block_header(header, b"\x00" * 32)
+    # the contract reverts with BlockhashMismatch for a short header as well
+    with pytest.raises(HeaderTooShort) as e:
+        parse_block_header(rlp.encode([b"\x00" * 32] * 11))
+    assert isinstance(e.value, BlockhashMismatch)
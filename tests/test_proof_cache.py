@@ -0,0 +1,109 @@
+import pytest
+
+from scripts.proof_cache import CONFIRMATIONS, ProofCache
+
+HEAD = 4096
+ACCOUNT = "0x" + "11" * 20
+
+
+def _block(number):
+    return {"number": hex(number), "hash": "0x" + f"{number:064x}", "timestamp": hex(number * 12)}
+
+
+@pytest.fixture
+def chain(rpc):
+    def get_block(block_identifier, full):
+        number = HEAD if block_identifier == "latest" else int(block_identifier, 16)
+        return _block(number)
+
+    def get_proof(account, keys, block_identifier):
+        return {
+            "address": account,
+            "accountProof": [block_identifier],
+            "balance": "0x0",
+            "codeHash": "0x" + "00" * 32,
+            "nonce": "0x0",
+            "storageHash": "0x" + "00" * 32,
+            "storageProof": [
+                {"key": key, "value": "0x1", "proof": [block_identifier]} for key in keys
+            ],
+        }
+
+    rpc.handlers.update(
+        {
+            "eth_blockNumber": lambda: hex(HEAD),
+            "eth_getBlockByNumber": get_block,
+            "eth_getProof": get_proof,
+        }
+    )
+
+
+def _serialize(block):
+    # `headers` passes raw JSON-RPC blocks, `header` formatted ones
+    number = block["number"]
+    return (int(number, 16) if isinstance(number, str) else number).to_bytes(8, "big")
+
+
+def test_header_cached(rpc, web3, chain, tmp_path):
+    cache = ProofCache(str(tmp_path))
+    assert cache.header(web3, 1, 100, _serialize) == (100).to_bytes(8, "big")
+    assert cache.header(web3, 1, 100, _serialize) == (100).to_bytes(8, "big")
+    assert rpc.count("eth_getBlockByNumber") == 1
+
+    headers = cache.headers(web3, 1, [99, 100, 101], _serialize)
+    assert headers == [n.to_bytes(8, "big") for n in (99, 100, 101)]
+    assert rpc.count("eth_getBlockByNumber") == 3
+
+
+def test_tags_resolve_to_block_numbers(rpc, web3, chain, tmp_path):
+    cache = ProofCache(str(tmp_path), confirmations=0)
+    assert cache.header(web3, 1, "latest", _serialize) == HEAD.to_bytes(8, "big")
+    # cached under the number "latest" resolved to, not under the tag
+    rpc.reset()
+    assert cache.header(web3, 1, HEAD, _serialize) == HEAD.to_bytes(8, "big")
+    assert rpc.queries() == []
+
+    proof = cache.proof(web3, 1, ACCOUNT, [1], "latest")
+    assert proof["accountProof"] == [hex(HEAD)]
+    rpc.reset()
+    assert cache.proof(web3, 1, ACCOUNT, [1], HEAD) == proof
+    assert rpc.queries() == []
+
+
+def test_pending_rejected(web3, chain, tmp_path):
+    cache = ProofCache(str(tmp_path))
+    with pytest.raises(ValueError):
+        cache.header(web3, 1, "pending", _serialize)
+    with pytest.raises(ValueError):
+        cache.proof(web3, 1, ACCOUNT, [1], "pending")
+
+
+def test_proof_fetches_missing_slots(rpc, web3, chain, tmp_path):
+    cache = ProofCache(str(tmp_path))
+    cache.proof(web3, 1, ACCOUNT, [1, 2], 100)
+    proof = cache.proof(web3, 1, ACCOUNT, [2, 3], 100)
+    assert [p["key"] for p in proof["storageProof"]] == ["0x" + f"{k:064x}" for k in (2, 3)]
+    assert rpc.count("eth_getProof") == 2
+    assert cache.proof(web3, 1, ACCOUNT, [3, 1], 100)["storageProof"][1]["key"].endswith("01")
+    assert rpc.count("eth_getProof") == 2
+
+
+def test_shallow_blocks_pass_through(rpc, web3, chain, tmp_path):
+    cache = ProofCache(str(tmp_path))
+    deep, shallow = HEAD - CONFIRMATIONS, HEAD - CONFIRMATIONS + 1
+    for _ in range(2):
+        assert cache.header(web3, 1, "latest", _serialize) == HEAD.to_bytes(8, "big")
+        proof = cache.proof(web3, 1, ACCOUNT, [1], shallow)
+        assert int(proof["accountProof"][0], 16) == shallow
+    assert rpc.count("eth_getBlockByNumber") == 2 and rpc.count("eth_getProof") == 2
+    assert not tmp_path.exists() or list(tmp_path.iterdir()) == []
+
+    # only the deep one is kept, the head is read again only for blocks above the known depth
+    rpc.reset()
+    cache.headers(web3, 1, [deep, shallow], _serialize)
+    cache.headers(web3, 1, [deep, shallow], _serialize)
+    cache.header(web3, 1, deep - 1, _serialize)
+    assert rpc.count("eth_getBlockByNumber") == 4
+    assert rpc.count("eth_blockNumber") == 2
+    assert cache.header(web3, 1, deep, _serialize) == deep.to_bytes(8, "big")
+    assert rpc.count("eth_getBlockByNumber") == 4
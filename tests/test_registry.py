@@ -0,0 +1,109 @@
+import json
+import os
+
+import pytest
+
+from scripts.registry import Registry, registry
+
+ORACLE = "0x" + "11" * 20
+SENDER = "0x" + "22" * 20
+PROVER = "0x" + "33" * 20
+
+
+def _write(path, data):
+    with open(path, "w") as f:
+        json.dump(data, f)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    deployments, abis = tmp_path / "deployments", tmp_path / "abis"
+    deployments.mkdir()
+    abis.mkdir()
+    # a network unknown to the code, described only by its file
+    _write(
+        deployments / "newchain.json",
+        {
+            "chain_id": 4242,
+            "rpc": "https://rpc.newchain.example",
+            "sidechain": {"block_hash_oracle": ORACLE, "message_digest_prover": PROVER},
+            "mainnet->999": {"sender": SENDER},
+        },
+    )
+    _write(abis / "BlockHashOracle.json", [{"type": "function", "name": "get_block_hash"}])
+    return tmp_path
+
+
+def _registry(sources, cache=None):
+    return Registry(
+        str(sources / "deployments"),
+        str(sources / "abis"),
+        str(sources / "build"),
+        cache=cache,
+        blocks=None,
+    )
+
+
+def test_chain_ids_come_from_the_deployment_files(sources):
+    r = _registry(sources)
+    assert r.chain_id("newchain") == 4242
+    assert r.chain_id("mainnet") == r.chain_id("ethereum") == 1
+    assert r.address("newchain", "block_hash_oracle") == ORACLE
+    assert r.address(1, "newchain.sender") == SENDER
+    assert r.addresses("message_digest_prover") == {4242: PROVER}
+    assert r.rpc("newchain") == r.rpcs()[4242] == "https://rpc.newchain.example"
+    assert r.abi("BlockHashOracle")[0]["name"] == "get_block_hash"
+
+
+def test_missing_chain_id(sources):
+    _write(sources / "deployments" / "broken.json", {"sidechain": {}})
+    with pytest.raises(ValueError, match="broken.json"):
+        _registry(sources).index
+
+
+def test_cache_is_reused_until_a_source_changes(sources, tmp_path):
+    cache = str(tmp_path / "cache" / "registry.pickle")
+    assert _registry(sources, cache).address("newchain", "block_hash_oracle") == ORACLE
+    assert os.path.exists(cache)
+
+    # a second process unpickles the index and leaves the file alone
+    with open(cache, "rb") as f:
+        before = f.read()
+    assert _registry(sources, cache).index["networks"] == {"newchain": 4242}
+    with open(cache, "rb") as f:
+        assert f.read() == before
+
+    path = sources / "deployments" / "newchain.json"
+    data = json.loads(path.read_text())
+    data["sidechain"]["block_hash_oracle"] = SENDER
+    _write(path, data)
+    os.utime(path, ns=(0, os.stat(cache).st_mtime_ns + 1))
+    assert _registry(sources, cache).address("newchain", "block_hash_oracle") == SENDER
+
+
+def test_without_cache_nothing_is_written(sources, tmp_path):
+    before = set(os.listdir(tmp_path))
+    _registry(sources).index
+    assert set(os.listdir(tmp_path)) == before
+    # the suite runs with `REGISTRY_CACHE` cleared, see conftest
+    assert registry.cache is None
+
+
+def test_repository_deployments():
+    for network in ("avalanche", "bsc", "fantom", "kava"):
+        chain_id = registry.chain_id(network)
+        assert registry.rpc(chain_id).startswith("https://")
+        assert registry.address(network, "block_hash_oracle")
+
+
+def test_deployment_block(rpc, web3, sources):
+    deployed = 1234
+    rpc.handlers["eth_blockNumber"] = lambda: hex(5000)
+    rpc.handlers["eth_getCode"] = (
+        lambda address, block: "0x60" if int(block, 16) >= deployed else "0x"
+    )
+    r = _registry(sources)
+    assert r.deployment_block(web3, ORACLE) == deployed
+    calls = rpc.count("eth_getCode")
+    assert r.deployment_block(web3, ORACLE) == deployed
+    assert rpc.count("eth_getCode") == calls
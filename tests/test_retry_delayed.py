@@ -0,0 +1,77 @@
+import pytest
+
+from scripts.registry import Registry
+from scripts.retry_delayed import CRV_BRIDGE_ABI, DelayedIndexer
+
+BRIDGE = "0x" + "11" * 20
+RECEIVER = "0x" + "22" * 20
+
+
+@pytest.fixture
+def bridge(rpc, web3):
+    bridge = web3.eth.contract(address=BRIDGE, abi=CRV_BRIDGE_ABI)
+    topic = bridge.events.Delayed.topic
+
+    def get_logs(params):
+        lo, hi = int(params["fromBlock"], 16), int(params["toBlock"], 16)
+        return [
+            {
+                "address": BRIDGE,
+                "topics": [topic, "0x" + f"{nonce:064x}", "0x" + RECEIVER[2:].rjust(64, "0")],
+                "data": "0x" + f"{nonce * 10:064x}",
+                "blockNumber": hex(block),
+                "blockHash": "0x" + f"{block:064x}",
+                "transactionHash": "0x" + f"{nonce:064x}",
+                "transactionIndex": "0x0",
+                "logIndex": "0x0",
+                "removed": False,
+            }
+            # two logs in every other block
+            for nonce, block in enumerate(range(lo, hi + 1), start=lo)
+            for _ in range(1 + block % 2)
+        ]
+
+    rpc.handlers.update(
+        {
+            "eth_getLogs": get_logs,
+            "eth_getBlockByNumber": lambda block, full: {
+                "number": block,
+                "timestamp": hex(int(block, 16) * 12),
+            },
+        }
+    )
+    return bridge
+
+
+def test_timestamps_batched_per_window(rpc, web3, bridge):
+    indexer = DelayedIndexer(web3, bridge, start_block=0, checkpoint=None)
+    logs = indexer._fetch(100, 149)
+    assert len(logs) == 75
+    records = [indexer._decode(log) for log in logs]
+    assert [r["timestamp"] for r in records[:3]] == [1200, 1212, 1212]
+    # one batch of 50 blocks, not a request per log
+    assert rpc.count("eth_getBlockByNumber") == 50
+    assert rpc.requests - rpc.count("eth_chainId") - rpc.count("eth_getLogs") == 1
+
+    rpc.reset()
+    indexer._fetch(100, 149)
+    assert rpc.count("eth_getBlockByNumber") == 0
+
+
+def test_deployment_block_bisects_once(rpc, web3, tmp_path):
+    rpc.handlers.update(
+        {
+            "eth_blockNumber": lambda: hex(1_000_000),
+            "eth_getCode": lambda address, block: "0x60" if int(block, 16) >= 123_456 else "0x",
+        }
+    )
+    path = str(tmp_path / "blocks.json")
+    registry = Registry(cache=str(tmp_path / "registry.pickle"), blocks=path)
+    assert registry.deployment_block(web3, BRIDGE) == 123_456
+    assert rpc.count("eth_getCode") <= 21
+
+    # remembered across instances
+    rpc.reset()
+    registry = Registry(cache=str(tmp_path / "registry.pickle"), blocks=path)
+    assert registry.deployment_block(web3, BRIDGE) == 123_456
+    assert rpc.count("eth_getCode") == 0
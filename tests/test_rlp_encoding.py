@@ -0,0 +1,128 @@
+import json
+import os
+import random
+
+import pytest
+import rlp
+from eth_utils import keccak
+from hexbytes import HexBytes
+
+from scripts.benchmark_rlp import legacy_serialize_block
+from scripts.rlp_encoding import (
+    BLOCK_HEADER,
+    QUANTITIES,
+    encode_list,
+    encode_raw_list,
+    encode_string,
+    list_prefix,
+    serialize_block,
+    serialize_proofs,
+    split_list,
+)
+
+# header fields of each fork, from legacy through pectra
+FORKS = {"legacy": 15, "london": 16, "shanghai": 17, "dencun": 20, "pectra": 21}
+SIZES = {"miner": 20, "logsBloom": 256, "nonce": 8, "extraData": 32}
+# raw `eth_getBlockByNumber` results of mainnet blocks 1919998 to 1920010, around the DAO fork
+MAINNET_HEADERS = os.path.join(os.path.dirname(__file__), "fixtures", "mainnet_headers.json")
+
+
+def _raw_header(rng, fields):
+    block = {}
+    for key in BLOCK_HEADER[:fields]:
+        if key in QUANTITIES:
+            block[key] = hex(rng.choice([0, 1, rng.getrandbits(rng.randint(1, 64))]))
+        else:
+            block[key] = "0x" + rng.randbytes(SIZES.get(key, 32)).hex()
+    block["hash"] = "0x" + keccak(_rlp_header(block)).hex()
+    return block
+
+
+def _rlp_header(block):
+    return rlp.encode(
+        [
+            int(block[key], 16) if key in QUANTITIES else bytes.fromhex(block[key][2:])
+            for key in BLOCK_HEADER
+            if key in block
+        ]
+    )
+
+
+def _formatted(block):
+    # what web3 returns for the same block
+    return {
+        key: int(value, 16) if key in QUANTITIES else HexBytes(value)
+        for key, value in block.items()
+    }
+
+
+@pytest.fixture(scope="module")
+def mainnet_headers():
+    with open(MAINNET_HEADERS) as f:
+        return json.load(f)
+
+
+@pytest.fixture(scope="module")
+def headers(mainnet_headers):
+    # the recorded mainnet blocks are all legacy headers, the later forks are generated
+    rng = random.Random(0)
+    synthetic = [_raw_header(rng, fields) for fields in FORKS.values() for _ in range(100)]
+    return mainnet_headers * 10 + synthetic
+
+
+@pytest.mark.parametrize("size", [0, 1, 55, 56, 255, 256, 70000])
+def test_encode_matches_pyrlp(size):
+    rng = random.Random(size)
+    value = rng.randbytes(size)
+    assert encode_string(value) == rlp.encode(value)
+    assert encode_string(b"\x7f") == rlp.encode(b"\x7f")
+
+    items = [rng.randbytes(rng.randint(0, 80)) for _ in range(size % 50)] + [value]
+    assert encode_list(items) == rlp.encode(items)
+    encoded = [rlp.encode(item) for item in items]
+    assert encode_raw_list(encoded) == rlp.encode(items)
+    assert split_list(encode_list(items)) == encoded
+    payload_size = sum(map(len, encoded))
+    assert list_prefix(payload_size) + b"".join(encoded) == rlp.encode(items)
+
+
+@pytest.mark.parametrize("fork", FORKS)
+def test_serialize_block_matches_hash(fork):
+    block = _raw_header(random.Random(fork), FORKS[fork])
+    assert "0x" + keccak(serialize_block(block)).hex() == block["hash"]
+    assert serialize_block(_formatted(block)) == serialize_block(block)
+
+
+def test_serialize_mainnet_headers(mainnet_headers):
+    for parent, block in zip([None] + mainnet_headers, mainnet_headers):
+        header = serialize_block(block)
+        assert "0x" + keccak(header).hex() == block["hash"]
+        assert legacy_serialize_block(block) == header
+        if parent is not None:
+            assert block["parentHash"] == parent["hash"]
+
+
+def test_serialize_proofs_matches_pyrlp():
+    rng = random.Random(1)
+    nodes = [[rng.randbytes(32) for _ in range(rng.choice([2, 17]))] for _ in range(20)]
+    proofs = {
+        "accountProof": ["0x" + rlp.encode(node).hex() for node in nodes[:6]],
+        "storageProof": [
+            {"proof": [HexBytes(rlp.encode(node)) for node in nodes[i : i + 4]]}
+            for i in range(6, 20, 4)
+        ],
+    }
+    expected = rlp.encode(
+        [nodes[:6]] + [nodes[i : i + 4] for i in range(6, 20, 4)],
+    )
+    assert serialize_proofs(proofs) == expected
+
+
+@pytest.mark.benchmark(group="serialize_block")
+def test_benchmark_serialize_block(benchmark, headers):
+    benchmark(lambda: [serialize_block(header) for header in headers])
+
+
+@pytest.mark.benchmark(group="serialize_block")
+def test_benchmark_legacy_serialize_block(benchmark, headers):
+    benchmark(lambda: [legacy_serialize_block(header) for header in headers])
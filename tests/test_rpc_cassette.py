@@ -0,0 +1,77 @@
+from types import SimpleNamespace
+
+from web3 import Web3
+
+from scripts.rpc_cassette import HEADER, RECORD, CassetteProvider, wrap
+
+
+def _hooks(monkeypatch):
+    # stands in for `atexit`, which tolerates unregistering a hook it does not hold
+    registered = []
+    hooks = SimpleNamespace(
+        register=registered.append,
+        unregister=lambda hook: registered.remove(hook) if hook in registered else None,
+    )
+    monkeypatch.setattr("scripts.rpc_cassette.atexit", hooks)
+    return registered
+
+
+def test_record_and_replay(rpc, web3, tmp_path, monkeypatch):
+    registered = _hooks(monkeypatch)
+    blocks = iter(range(10, 100))
+    rpc.handlers["eth_blockNumber"] = lambda: hex(next(blocks))
+    path = str(tmp_path / "cassette")
+
+    with wrap(web3, path, record=True) as cassette:
+        assert registered == [cassette.close]
+        recorded = [web3.eth.block_number for _ in range(3)]
+    assert registered == []
+    assert (tmp_path / "cassette.index").exists()
+
+    rpc.close()
+    with CassetteProvider(path) as cassette:
+        replay = Web3(cassette)
+        # a request repeated more often than recorded gets its last response again
+        assert [replay.eth.block_number for _ in range(4)] == recorded + recorded[-1:]
+
+
+def test_wrap_saves_at_exit(rpc, web3, tmp_path, monkeypatch):
+    registered = _hooks(monkeypatch)
+    rpc.handlers["eth_blockNumber"] = lambda: "0x10"
+    path = str(tmp_path / "cassette")
+
+    wrap(web3, path, record=True)
+    web3.eth.block_number
+    assert not (tmp_path / "cassette.index").exists()
+    for hook in list(registered):
+        hook()
+    assert [entry[1] for entry in CassetteProvider(path).entries()] == ["eth_blockNumber"]
+
+
+def test_repeated_calls_share_index_records(rpc, web3, tmp_path, monkeypatch):
+    _hooks(monkeypatch)
+    answers = iter([16] * 50 + [17] * 50 + [16])
+    rpc.handlers["eth_blockNumber"] = lambda: hex(next(answers))
+    rpc.handlers["eth_gasPrice"] = lambda: "0x1"
+    path = str(tmp_path / "cassette")
+
+    with wrap(web3, path, record=True):
+        recorded = [web3.eth.block_number for _ in range(101)]
+        web3.eth.gas_price
+    # one record per run of equal answers, the answers themselves are stored once each
+    assert [entry[4] for entry in CassetteProvider(path).entries()].count(50) == 2
+    header = len(b'["eth_blockNumber","eth_gasPrice"]')
+    assert (tmp_path / "cassette.index").stat().st_size == HEADER.size + header + 4 * RECORD.size
+
+    # recording more into the cassette keeps what it held and reuses the stored answers
+    size = (tmp_path / "cassette.data").stat().st_size
+    rpc.handlers["eth_blockNumber"] = lambda: "0x11"
+    with wrap(Web3(Web3.HTTPProvider(rpc.url)), path, record=True) as cassette:
+        Web3(cassette).eth.block_number
+    assert (tmp_path / "cassette.data").stat().st_size == size
+
+    rpc.close()
+    with CassetteProvider(path) as cassette:
+        replay = Web3(cassette)
+        assert [replay.eth.block_number for _ in range(103)] == recorded + [17, 17]
+        assert replay.eth.gas_price == 1
@@ -0,0 +1,127 @@
+import pytest
+from eth_utils import keccak
+from web3 import Web3
+
+from scripts.retry_delayed import CRVLimiter
+from scripts.simulate_limiter import (
+    ISSUANCE_INTERVAL,
+    record_traffic,
+    simulate_crv,
+    simulate_crvusd,
+    synthetic_traffic,
+)
+
+BRIDGE = Web3.to_checksum_address("0x" + "cc" * 20)
+
+
+def replay_crv(trace, amounts, limit, period):
+    # feed the simulated calls through the limiter model `retry_delayed` uses
+    limiter = CRVLimiter(0, 0, limit, period)
+    arrivals, pending, clock = {}, {}, 0
+    for kind, timestamp, index, minted, remainder in trace:
+        assert timestamp >= clock
+        clock = timestamp
+        if kind == "receive":
+            arrivals[index] = timestamp
+            amount = amounts[index]
+            expected = 0 if amount > limit else limiter.consume(amount, timestamp)
+        else:
+            assert timestamp >= limiter.ready_at({"timestamp": arrivals[index]})
+            amount = pending[index]
+            expected = limiter.consume(amount, timestamp)
+        assert (minted, remainder) == (expected, amount - expected)
+        pending[index] = remainder
+    return pending
+
+
+@pytest.mark.parametrize("scale,period", [(10, 3600), (30, 3600), (60, 6 * 3600), (3, 24 * 3600)])
+def test_crv_matches_limiter_model(scale, period):
+    timestamps, amounts = synthetic_traffic(2000, mean_gap=600, seed=scale)
+    limit = sorted(amounts)[len(amounts) // 2] * scale
+    trace = []
+    (stats,) = simulate_crv(timestamps, amounts, [limit], [period], trace=trace)
+
+    receives = [step for step in trace if step[0] == "receive"]
+    assert [step[2] for step in receives] == list(range(len(amounts)))
+    assert stats["delayed"] == sum(1 for step in receives if step[4])
+    assert stats["retries"] == len(trace) - len(receives)
+    assert stats["delayed"] and stats["retries"] >= stats["delayed"]
+    pending = replay_crv(trace, amounts, limit, period)
+    assert stats["pending"] == sum(pending.values())
+
+
+def test_crv_without_delays():
+    timestamps, amounts = synthetic_traffic(500, seed=7)
+    limit = sum(amounts)
+    trace = []
+    (stats,) = simulate_crv(timestamps, amounts, [limit], [3600], trace=trace)
+
+    assert stats["delayed"] == stats["retries"] == stats["pending"] == 0
+    assert [step[3] for step in trace] == amounts
+    replay_crv(trace, amounts, limit, 3600)
+
+
+def test_crv_pairs_are_independent():
+    timestamps, amounts = synthetic_traffic(1000, mean_gap=600, seed=3)
+    limits, periods = [10**21, 10**22, 10**23], [3600, 6 * 3600, 86400]
+    results = simulate_crv(timestamps, amounts, limits, periods)
+
+    for limit, period, stats in zip(limits, periods, results):
+        assert simulate_crv(timestamps, amounts, [limit], [period]) == [stats]
+
+
+def test_crvusd_matches_daily_issuance():
+    timestamps, amounts = synthetic_traffic(2000, mean_gap=300, seed=5)
+    limit, delay = sorted(amounts)[len(amounts) // 2] * 40, 3600
+    trace = []
+    (stats,) = simulate_crvusd(timestamps, amounts, [limit], [delay], trace=trace)
+
+    issued, day, delayed = 0, None, []
+    for timestamp, amount in zip(timestamps.tolist(), amounts):
+        if timestamp // ISSUANCE_INTERVAL != day:
+            issued, day = 0, timestamp // ISSUANCE_INTERVAL
+        if issued + amount > limit:
+            delayed.append(amount)
+        else:
+            issued += amount
+
+    assert delayed
+    assert [step[4] for step in trace if step[4]] == delayed
+    assert stats["delayed"] == len(delayed)
+    assert stats["delayed_volume"] == sum(delayed)
+    assert stats["latency_max"] == delay + 1
+
+
+def test_record_traffic_batches_timestamps(rpc, web3, tmp_path):
+    sent = [(10, 5), (10, 7), (12, 11)]  # (block, amount)
+    topic = "0x" + keccak(text="BridgeSent(address,uint256)").hex()
+
+    def get_logs(params):
+        lo, hi = int(params["fromBlock"], 16), int(params["toBlock"], 16)
+        return [
+            {
+                "address": BRIDGE,
+                "topics": [topic, "0x" + "00" * 12 + "aa" * 20],
+                "data": "0x" + f"{amount:064x}",
+                "blockNumber": hex(block),
+                "blockHash": "0x" + f"{block:064x}",
+                "transactionHash": "0x" + f"{i:064x}",
+                "transactionIndex": "0x0",
+                "logIndex": hex(i),
+                "removed": False,
+            }
+            for i, (block, amount) in enumerate(sent)
+            if lo <= block <= hi
+        ]
+
+    rpc.handlers.update(
+        {
+            "eth_getLogs": get_logs,
+            "eth_getBlockByNumber": lambda number, full: {"timestamp": hex(int(number, 16) * 12)},
+        }
+    )
+    records = record_traffic(web3, BRIDGE, 0, 20, path=str(tmp_path / "traffic.json"))
+    assert [(r["timestamp"], r["amount"]) for r in records] == [(120, "5"), (120, "7"), (144, "11")]
+    # the timestamps of both blocks come from one batch request
+    assert rpc.count("eth_getBlockByNumber") == 2
+    assert rpc.requests == len(rpc.calls) - 1
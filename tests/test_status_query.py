@@ -0,0 +1,78 @@
+from eth_utils import function_signature_to_4byte_selector
+
+from scripts.registry import registry
+from scripts.status_query import (
+    BATCH_SIZE,
+    MAX_COMMITTERS,
+    MULTICALL3,
+    MULTICALL3_ABI,
+    oracle_status,
+)
+
+ORACLE = "0x" + "11" * 20
+
+
+def _selector(fn):
+    return function_signature_to_4byte_selector(
+        f"{fn['name']}({','.join(i['type'] for i in fn['inputs'])})"
+    )
+
+
+def _serve_oracle(rpc, web3, threshold, committers, hashes):
+    oracle = web3.eth.contract(address=ORACLE, abi=registry.abi("BlockHashOracle"))
+    multicall = web3.eth.contract(address=MULTICALL3, abi=MULTICALL3_ABI)
+    abis = {_selector(fn): fn for fn in oracle.abi if fn.get("type") == "function"}
+
+    def call(fn, args):
+        if fn["name"] == "threshold":
+            return web3.codec.encode(["uint256"], [threshold])
+        if fn["name"] == "committer_count":
+            return web3.codec.encode(["uint256"], [len(committers)])
+        if fn["name"] == "get_committer":
+            if args[0] >= len(committers):
+                return None
+            return web3.codec.encode(["address"], [committers[args[0]]])
+        if fn["name"] == "get_block_hash":
+            if args[0] not in hashes:
+                return None
+            return web3.codec.encode(["bytes32"], [hashes[args[0]]])
+        raise ValueError(fn["name"])
+
+    def eth_call(tx, block):
+        _, params = multicall.decode_function_input(tx["input"] if "input" in tx else tx["data"])
+        results = []
+        for request in params["calls"]:
+            assert request["target"] == ORACLE
+            data = bytes(request["callData"])
+            fn = abis[data[:4]]
+            args = web3.codec.decode([i["type"] for i in fn["inputs"]], data[4:])
+            output = call(fn, args)
+            results.append((output is not None, output or b""))
+        encoded = web3.codec.encode(["(bool,bytes)[]"], [results])
+        return "0x" + encoded.hex()
+
+    rpc.handlers["eth_call"] = eth_call
+    return oracle
+
+
+def test_oracle_status_is_one_request(rpc, web3):
+    committers = ["0x" + f"{i:040x}" for i in range(1, 4)]
+    hashes = {100: b"\x01" * 32, 102: b"\x02" * 32}
+    oracle = _serve_oracle(rpc, web3, 2, committers, hashes)
+
+    threshold, found, applied = oracle_status(web3, oracle, range(100, 110))
+    assert threshold == 2
+    assert [c.lower() for c in found] == committers
+    assert applied == {n: n in hashes for n in range(100, 110)}
+    assert rpc.queries() == ["eth_call"] and rpc.requests == 1
+
+
+def test_oracle_status_with_many_blocks(rpc, web3):
+    oracle = _serve_oracle(rpc, web3, 1, ["0x" + "22" * 20], {5: b"\x03" * 32})
+    numbers = range(1000)
+    _, _, applied = oracle_status(web3, oracle, numbers)
+    assert [n for n, is_applied in applied.items() if is_applied] == [5]
+    # the calls stay in `BATCH_SIZE` chunks, one eth_call each, sent in a single HTTP request
+    calls = MAX_COMMITTERS + 2 + len(numbers)
+    assert rpc.queries() == ["eth_call"] * -(-calls // BATCH_SIZE)
+    assert rpc.requests == 1
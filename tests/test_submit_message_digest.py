@@ -0,0 +1,100 @@
+import pytest
+from eth_account import Account
+from web3 import Web3
+
+from scripts import submit_message_digest
+from scripts.submit_message_digest import fan_out
+
+HEADER, PROOF = "f9", "c0"
+
+
+class Prover:
+    """
+    Message digest nonces of one chain: `prove` of an agent only estimates when every earlier
+    nonce of the agent is mined, the way `eth_estimateGas` against the latest state behaves.
+    """
+
+    def __init__(self):
+        self.unmined = []
+        self.proven = []
+        self.revert = set()  # agents whose next prove reverts on chain
+
+
+class Sender:
+    # stands in for TransactionSender on top of a `Prover`
+    def __init__(self, prover, web3, signer):
+        self.prover = prover
+        self.pending = {}
+        self.receipts = {}
+
+    def submit(self, func):
+        agent = func.args[0]
+        if agent in self.prover.unmined:
+            raise ValueError("execution reverted: message digest of the previous nonce not set")
+        self.prover.unmined.append(agent)
+        self.pending[len(self.pending) + len(self.receipts)] = agent
+
+    def wait(self):
+        for nonce, agent in self.pending.items():
+            status = int(agent not in self.prover.revert)
+            self.receipts[nonce] = {"status": status, "gasUsed": 100_000}
+            if status:
+                self.prover.proven.append(agent)
+        self.prover.unmined, self.pending = [], {}
+        return [self.receipts[nonce] for nonce in sorted(self.receipts)]
+
+    def stats(self):
+        return {"confirmed": len(self.receipts)}
+
+
+@pytest.fixture
+def chains(monkeypatch):
+    chains = {}
+
+    def connect(network, chain_id):
+        web3 = Web3()
+        web3.chain_id = chain_id
+        return web3
+
+    def sender(web3, signer):
+        return Sender(chains.setdefault(web3.chain_id, Prover()), web3, signer)
+
+    monkeypatch.setattr(submit_message_digest, "connect", connect)
+    monkeypatch.setattr(submit_message_digest, "TransactionSender", sender)
+    monkeypatch.setattr(
+        submit_message_digest,
+        "generate_proofs",
+        lambda web3, targets, block_number, log=False: [(HEADER, PROOF)] * len(targets),
+    )
+    return chains
+
+
+def _fan_out(targets):
+    chain_ids = {target[1] for target in targets}
+    return fan_out(
+        None,
+        Account.create(),
+        targets,
+        networks={chain_id: None for chain_id in chain_ids},
+        provers={chain_id: "0x" + "11" * 20 for chain_id in chain_ids},
+    )
+
+
+def test_nonces_of_an_agent_follow_each_other(chains):
+    # two nonces of agent 1 and one of agent 2 on the same chain, out of order
+    targets = [(1, 56, 3, []), (2, 56, 7, []), (1, 56, 2, []), (1, 250, 1, [])]
+    stats = _fan_out(targets)
+
+    assert stats == {56: {"confirmed": 3}, 250: {"confirmed": 1}}
+    assert chains[56].proven == [1, 2, 1]
+
+
+def test_failed_chain_keeps_other_stats(chains):
+    chains[56] = Prover()
+    chains[56].revert.add(1)
+    stats = _fan_out([(1, 56, 2, []), (1, 56, 3, []), (1, 250, 1, [])])
+
+    assert "prove reverted on 56" in stats[56]["error"]
+    assert stats[250] == {"confirmed": 1}
+    # nonce 3 was never sent after nonce 2 reverted
+    assert chains[56].proven == []
@@ -0,0 +1,87 @@
+import random
+
+import rlp
+from eth_utils import keccak, to_checksum_address
+from trie import HexaryTrie
+from web3 import Web3
+
+from scripts import gas_model
+from scripts.rlp_encoding import serialize_proofs
+from scripts.sync_gauge_types import (
+    GAUGE_TYPE_VERIFIER,
+    GAUGE_TYPE_VERIFIER_ABI,
+    _BatchSize,
+    gauge_type_key,
+    pack_batches,
+)
+
+
+def _proofs(n_gauges):
+    rng = random.Random(n_gauges)
+    # some addresses with zero bytes, those are cheaper calldata
+    gauges = [
+        to_checksum_address(bytes(b if rng.random() > 0.2 else 0 for b in rng.randbytes(20)))
+        for _ in range(n_gauges)
+    ]
+    storage = HexaryTrie({})
+    for gauge in gauges:
+        storage[keccak(gauge_type_key(gauge))] = rlp.encode(rng.randint(1, 10))
+    for _ in range(500):
+        storage[keccak(rng.randbytes(32))] = rlp.encode(rng.randbytes(8))
+
+    def proof(trie, key):
+        return [rlp.encode(node) for node in trie.get_proof(key)]
+
+    state = HexaryTrie({})
+    for _ in range(200):
+        state[keccak(rng.randbytes(20))] = rlp.encode([0, 0, b"\x00" * 32, b"\x00" * 32])
+    account_key = keccak(rng.randbytes(20))
+    state[account_key] = rlp.encode([1, 0, storage.root_hash, keccak(b"")])
+    proofs = {
+        "accountProof": proof(state, account_key),
+        "storageProof": [
+            {"proof": proof(storage, keccak(gauge_type_key(gauge)))} for gauge in gauges
+        ],
+    }
+    return gauges, rng.randbytes(540), proofs
+
+
+def _predicted(verifier, gauges, header, proofs):
+    proof_rlp = serialize_proofs({**proofs, "storageProof": proofs["storageProof"][: len(gauges)]})
+    func = verifier.functions.verifyGaugeTypeByBlockHash(gauges, header, proof_rlp)
+    features = gas_model.proof_features(header, proof_rlp)
+    return int(
+        gas_model.MARGIN
+        * gas_model.predict("gauge_type", func._encode_transaction_data(), features)
+    )
+
+
+def test_batch_size_matches_encoded_call():
+    verifier = Web3().eth.contract(address=GAUGE_TYPE_VERIFIER, abi=GAUGE_TYPE_VERIFIER_ABI)
+    gauges, header, proofs = _proofs(40)
+    size = _BatchSize(header, proofs)
+    for i, (gauge, proof) in enumerate(zip(gauges, proofs["storageProof"])):
+        size.add(size.item(gauge, proof))
+        assert size.gas() == _predicted(verifier, gauges[: i + 1], header, proofs)
+
+
+def test_pack_batches_within_limit():
+    verifier = Web3().eth.contract(address=GAUGE_TYPE_VERIFIER, abi=GAUGE_TYPE_VERIFIER_ABI)
+    gauges, header, proofs = _proofs(120)
+    gas_limit = 2_000_000
+    calls = pack_batches(verifier, gauges, header, proofs, gas_limit)
+    assert len(calls) > 1
+
+    packed, offset = [], 0
+    for func, _ in calls:
+        batch = func.arguments[0]
+        assert batch == gauges[offset : offset + len(batch)]
+        batch_proofs = {**proofs, "storageProof": proofs["storageProof"][offset:]}
+        assert _predicted(verifier, batch, header, batch_proofs) <= gas_limit
+        if offset + len(batch) < len(gauges):
+            # greedy: one more gauge would not have fit
+            more = gauges[offset : offset + len(batch) + 1]
+            assert _predicted(verifier, more, header, batch_proofs) > gas_limit
+        packed += batch
+        offset += len(batch)
+    assert packed == gauges
@@ -0,0 +1,120 @@
+import pytest
+from eth_account import Account
+
+from scripts.transmit_scheduler import FEE_BUFFER, TRANSMIT_DELAY, TransmitScheduler
+
+ACCOUNT = "0x" + "22" * 20
+DESTINATIONS = {
+    chain_id: {
+        "kind": "layerzero",
+        "sender": "0x" + f"{chain_id:040x}",
+        "network": None,
+        "oracle": None,
+    }
+    for chain_id in (56, 250)
+}
+HEAD = 1000
+
+
+@pytest.fixture
+def storage(rpc):
+    # slot -> first block at which it is set
+    storage = {}
+
+    def get_storage_at(account, slot, block):
+        set_at = storage.get(int(slot, 16))
+        return "0x" + f"{int(set_at is not None and set_at <= int(block, 16)):064x}"
+
+    rpc.handlers["eth_getStorageAt"] = get_storage_at
+    return storage
+
+
+@pytest.fixture
+def scheduler(web3, storage):
+    scheduler = TransmitScheduler(web3, Account.create(), DESTINATIONS, max_wait=60)
+    scheduler.applied = {}
+    scheduler.latest_applied = lambda chain_ids: {c: scheduler.applied.get(c) for c in chain_ids}
+    return scheduler
+
+
+def _job(chain_id, slot):
+    return {"chain_id": chain_id, "account": ACCOUNT, "slot": slot, "name": f"job {slot}"}
+
+
+def test_storage_reads_are_batched(rpc, scheduler, storage):
+    storage.update({1: 10, 2: 500})
+    reads = [(ACCOUNT, slot, number) for slot in range(1, 40) for number in (None, 20, 600)]
+    rpc.reset()
+    is_set = scheduler._is_set(reads)
+
+    assert rpc.requests == 1
+    assert rpc.count("eth_getStorageAt") == 39 * 2
+    assert is_set[(ACCOUNT, 1, 20)] and is_set[(ACCOUNT, 2, 600)]
+    assert not is_set[(ACCOUNT, 2, 20)] and not is_set[(ACCOUNT, 1, None)]
+
+
+def test_plan_waits_for_jobs_sharing_a_chain(scheduler, storage, monkeypatch):
+    now = 1_700_000_000
+    monkeypatch.setattr("scripts.transmit_scheduler.time.time", lambda: now)
+    storage.update({1: HEAD - 100, 2: HEAD - 10, 3: HEAD - 100})
+    for chain_id, slot in [(56, 1), (56, 2), (250, 3)]:
+        scheduler.add(_job(chain_id, slot))
+
+    # 250 is provable right away, 56 holds back for the job which is not provable yet
+    assert scheduler.plan(HEAD) == (HEAD - TRANSMIT_DELAY, [250])
+    now += 60
+    assert scheduler.plan(HEAD) == (HEAD - TRANSMIT_DELAY, [56, 250])
+
+
+def test_ready_since_is_cleared(scheduler, storage, monkeypatch):
+    now = 1_700_000_000
+    monkeypatch.setattr("scripts.transmit_scheduler.time.time", lambda: now)
+    storage.update({1: HEAD - 100, 2: HEAD - 10})
+    scheduler.add(_job(56, 1))
+    scheduler.add(_job(56, 2))
+    scheduler.plan(HEAD)
+    assert scheduler.ready_since == {56: now}
+
+    # the hash is applied in the meantime, the chain is done
+    scheduler.applied[56] = HEAD - 80
+    now += 30
+    assert scheduler.plan(HEAD) == (HEAD - TRANSMIT_DELAY, [])
+    assert scheduler.ready_since == {}
+
+    # a new job does not inherit the old wait
+    storage[3] = HEAD + 50
+    scheduler.add(_job(56, 3))
+    now += 60
+    assert scheduler.plan(HEAD + 100) == (HEAD + 100 - TRANSMIT_DELAY, [])
+    assert scheduler.ready_since == {56: now}
+
+
+class Sender:
+    # records the value of every transmission, `revert` holds nonces mined with status 0
+    def __init__(self):
+        self.nonce, self.sent, self.receipts, self.revert = 0, [], {}, set()
+
+    def submit(self, func, params):
+        self.sent.append((func.address, params["value"]))
+        self.receipts[self.nonce] = {"status": int(self.nonce not in self.revert)}
+        self.nonce += 1
+
+    def wait(self):
+        return [self.receipts[nonce] for nonce in sorted(self.receipts)]
+
+
+def test_ccip_is_paid_exactly(web3, storage):
+    destinations = {
+        **DESTINATIONS,
+        1: {"kind": "ccip", "sender": "0x" + "33" * 20, "selector": 5, "network": None},
+    }
+    scheduler = TransmitScheduler(web3, Account.create(), destinations)
+    scheduler.sender = Sender()
+    scheduler.quote = lambda chain_ids, head: {chain_id: 1000 for chain_id in chain_ids}
+    scheduler.sender.revert.add(1)
+
+    scheduler.transmit(HEAD - TRANSMIT_DELAY, [56, 1], HEAD)
+    # the deployed CCIP sender hands all of msg.value to the router, LayerZero refunds
+    assert [value for _, value in scheduler.sender.sent] == [int(1000 * FEE_BUFFER), 1000]
+    # the reverted transmission is retried next round instead of waiting to be applied
+    assert list(scheduler.transmitted) == [56]
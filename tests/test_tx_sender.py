@@ -0,0 +1,127 @@
+import pytest
+from eth_account import Account
+from web3 import Web3
+from web3.exceptions import Web3RPCError
+
+from scripts.tx_sender import TransactionSender
+
+GAS_PRICE = 10**9
+
+
+class Func:
+    def estimate_gas(self, params):
+        return 50_000
+
+    def build_transaction(self, params):
+        return {**params, "to": "0x" + "11" * 20, "value": 0, "data": "0x", "gasPrice": GAS_PRICE}
+
+
+class Transfer:
+    # a value transfer behind the interface of a contract function, for a real chain
+    def __init__(self, web3, to):
+        self.web3 = web3
+        self.to = to
+
+    def estimate_gas(self, params):
+        return self.web3.eth.estimate_gas({**params, "to": self.to, "value": 1})
+
+    def build_transaction(self, params):
+        gas_price = self.web3.eth.gas_price
+        return {**params, "to": self.to, "value": 1, "data": "0x", "gasPrice": gas_price}
+
+
+@pytest.fixture
+def chain(rpc):
+    chain = {"count": 5, "sent": [], "fail": [], "mined": set()}
+
+    def send(raw):
+        if chain["fail"]:
+            raise ValueError(chain["fail"].pop(0))
+        chain["sent"].append(raw)
+        return "0x" + f"{len(chain['sent']):064x}"
+
+    def receipt(tx_hash):
+        if tx_hash not in chain["mined"]:
+            return None
+        return {
+            "transactionHash": tx_hash,
+            "blockHash": "0x" + "00" * 32,
+            "blockNumber": "0x1",
+            "transactionIndex": "0x0",
+            "from": "0x" + "22" * 20,
+            "to": "0x" + "11" * 20,
+            "cumulativeGasUsed": "0x1",
+            "gasUsed": "0x1",
+            "contractAddress": None,
+            "logs": [],
+            "logsBloom": "0x" + "00" * 256,
+            "status": "0x1",
+        }
+
+    rpc.handlers.update(
+        {
+            "eth_getTransactionCount": lambda address, block: hex(chain["count"]),
+            "eth_sendRawTransaction": send,
+            "eth_getTransactionReceipt": receipt,
+            "eth_gasPrice": lambda: hex(GAS_PRICE),
+        }
+    )
+    return chain
+
+
+def test_failed_submit_resyncs_nonce(rpc, web3, chain):
+    sender = TransactionSender(web3, Account.create())
+    sender.submit(Func())
+    assert list(sender.pending) == [5]
+
+    chain["fail"].append("insufficient funds for gas * price + value")
+    with pytest.raises(Web3RPCError):
+        sender.submit(Func())
+    # nonce 6 was never used, the next transaction takes it after resyncing with the node
+    chain["count"] = 6
+    sender.submit(Func())
+    assert list(sender.pending) == [5, 6]
+    assert rpc.count("eth_getTransactionCount") == 2
+
+
+def test_replacements_stop_at_max_fee(web3, chain):
+    sender = TransactionSender(web3, Account.create(), replace_after=0, max_fee=GAS_PRICE * 3 // 2)
+    sender.submit(Func())
+    for _ in range(5):
+        sender.poll()
+    # 1e9 -> 1.125e9 -> 1.266e9 -> 1.424e9, one more bump would go over 1.5e9
+    assert sender.replaced == 3
+    assert sender.pending[5]["tx"]["gasPrice"] == 1_423_828_125
+    assert len(chain["sent"]) == 4
+
+
+def test_wait_times_out(web3, chain):
+    sender = TransactionSender(web3, Account.create(), poll_interval=0)
+    sender.submit(Func())
+    with pytest.raises(TimeoutError):
+        sender.wait(timeout=0)
+
+    chain["mined"].add(sender.pending[5]["hashes"][0].to_0x_hex())
+    assert [receipt["status"] for receipt in sender.wait()] == [1]
+
+
+def test_nonce_used_elsewhere_resyncs_on_eth_tester():
+    eth_tester = pytest.importorskip("eth_tester")
+    web3 = Web3(Web3.EthereumTesterProvider(eth_tester.EthereumTester()))
+    signer = Account.create()
+    web3.eth.send_transaction(
+        {"from": web3.eth.accounts[0], "to": signer.address, "value": 10**18}
+    )
+    transfer = Transfer(web3, web3.eth.accounts[1])
+    sender = TransactionSender(web3, signer, poll_interval=0)
+    sender.submit(transfer)
+
+    # another process sends from the same account and takes nonce 1 first
+    params = {"from": signer.address, "chainId": web3.eth.chain_id, "gas": 21_000, "nonce": 1}
+    signed = web3.eth.account.sign_transaction(transfer.build_transaction(params), signer.key)
+    web3.eth.send_raw_transaction(signed.raw_transaction)
+
+    sender.submit(transfer)
+    assert list(sender.pending) == [0, 2]
+    assert [receipt["status"] for receipt in sender.wait()] == [1, 1]
+    assert web3.eth.get_transaction_count(signer.address) == 3